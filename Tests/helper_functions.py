@@ -25,15 +25,11 @@ def create_expected_pdep_ms(converter, field_widths, csv_column_names):
     """
     expected_pdep_ms = ""
 
-    starts_or_ends_file = 0
     for i, fw in enumerate(field_widths):
-        if i == 0 or i == (len(field_widths) - 1):
-            starts_or_ends_file = 1
-        else:
-            starts_or_ends_file = 0
-
+        starts_file = i == 0
+        ends_file = i == len(field_widths) - 1
         preceeding_bpb, following_bpb = converter.get_preceeding_following_bpb(
-            i % converter._num_fields_per_unit, starts_or_ends_file)
+            i % converter._num_fields_per_unit, starts_file, ends_file)
         expected_pdep_ms = ("0" * following_bpb) + ("1" * fw) + \
             ("0" * preceeding_bpb) + expected_pdep_ms
     return expected_pdep_ms
@@ -0,0 +1,64 @@
+"""
+Contains tests for the functions in aggregate.py.
+"""
+import unittest
+import csv
+from collections import Counter
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import aggregate
+
+COLUMNS = ["id", "first_name", "last_name", "email", "gender", "ip_address"]
+CSV_PATH = "Resources/Test/test_multiline_big.csv"
+
+class TestAggregateMethods(unittest.TestCase):
+    """Unit and integration tests for single column aggregation."""
+
+    def setUp(self):
+        with open(CSV_PATH, newline='', encoding='utf-8') as f:
+            self.rows = list(csv.reader(f))
+
+    def test_extract_column_values(self):
+        """Only the selected column is extracted, empty and non-ASCII values included."""
+        values = aggregate.extract_column_values(64, ["a", "b"], "1,é\n2,\n3,x\n", "b")
+        self.assertEqual(values, ["é", "", "x"])
+        with self.assertRaises(ValueError):
+            aggregate.extract_column_values(64, ["a", "b"], "1,x\n", "c")
+
+    def test_count(self):
+        """Counts per value match a plain count, with small chunks and a key function."""
+        counts = aggregate.aggregate_file(64, COLUMNS, CSV_PATH, "gender", chunk_size=100)
+        self.assertEqual(counts.counts, Counter(row[4] for row in self.rows))
+        domains = aggregate.aggregate_file(64, COLUMNS, CSV_PATH, "email",
+                                           key=lambda email: email.split("@")[-1])
+        self.assertEqual(domains.counts, Counter(row[3].split("@")[-1] for row in self.rows))
+
+    def test_distinct_sketch(self):
+        """The distinct estimate is close, and sketches of parts merge into the whole."""
+        sketch = aggregate.aggregate_file(64, COLUMNS, CSV_PATH, "email",
+                                          aggregator=aggregate.DistinctSketch())
+        expected = len(set(row[3] for row in self.rows))
+        self.assertLess(abs(sketch.estimate() - expected), 0.05 * expected)
+
+        large = aggregate.DistinctSketch()
+        large.update(str(i) for i in range(50000))
+        self.assertLess(abs(large.estimate() - 50000), 0.05 * 50000)
+        half = aggregate.DistinctSketch()
+        half.update(str(i) for i in range(25000))
+        other_half = aggregate.DistinctSketch()
+        other_half.update(str(i) for i in range(25000, 50000))
+        half.merge(other_half)
+        self.assertEqual(half.registers, large.registers)
+        with self.assertRaises(ValueError):
+            half.merge(aggregate.DistinctSketch(precision=10))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Contains tests for the functions in async_pipeline.py.
+"""
+import unittest
+import tempfile
+import asyncio
+import gc
+import gzip
+import warnings
+import zlib
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import async_pipeline
+from src import csv_json_transducer
+from src import pablo
+
+class TestAsyncPipelineMethods(unittest.TestCase):
+    """Integration tests for the asyncio driver."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.temp_dir.name, "out.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_small_chunks(self):
+        """Chunks much smaller than a row are carried over and written in order."""
+        columns = ["col A", "gul", "chaava", "dabu"]
+        async_pipeline.transduce_file(64, columns, "Resources/Test/unicode_test_large.csv",
+                                      self.output_path, chunk_size=64, max_pending_chunks=2)
+        expected = csv_json_transducer.main(64, columns, "Resources/Test/unicode_test_large.csv",
+                                            verbose=False)
+        self.assertEqual(pablo.readfile(self.output_path), expected)
+
+    def test_layouts(self):
+        """The layout of the output can be chosen."""
+        columns = ["col A", "gul", "chaava", "dabu"]
+        for layout in ("compact", "minified"):
+            async_pipeline.transduce_file(64, columns, "Resources/Test/unicode_test_large.csv",
+                                          self.output_path, chunk_size=64, layout=layout)
+            self.assertEqual(pablo.readfile(self.output_path),
+                             csv_json_transducer.main(64, columns,
+                                                      "Resources/Test/unicode_test_large.csv",
+                                                      verbose=False, layout=layout))
+        empty_path = os.path.join(self.temp_dir.name, "empty.csv")
+        open(empty_path, 'w').close()
+        async_pipeline.transduce_file(64, ["col1"], empty_path, self.output_path,
+                                      layout="minified")
+        self.assertEqual(pablo.readfile(self.output_path), "[]")
+
+    def test_empty_file(self):
+        """An empty input file produces an empty JSON array."""
+        empty_path = os.path.join(self.temp_dir.name, "empty.csv")
+        open(empty_path, 'w').close()
+        async_pipeline.transduce_file(64, ["col1"], empty_path, self.output_path)
+        self.assertEqual(pablo.readfile(self.output_path), "[\n]")
+
+    def test_malformed_file(self):
+        """Errors raised while transducing a chunk are raised by the driver."""
+        with self.assertRaises(ValueError):
+            async_pipeline.transduce_file(64, ["hehe", "haha", "hoho"],
+                                          "Resources/Test/malformed_rows_multi2.csv",
+                                          self.output_path, chunk_size=4)
+
+    def assert_fails_cleanly(self, error_type, path_to_file, columns):
+        """Assert that transducing path_to_file raises error_type without leaving pending
+        tasks, unretrieved errors or warnings behind."""
+        loop = asyncio.new_event_loop()
+        unhandled = []
+        loop.set_exception_handler(lambda loop, context: unhandled.append(context))
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                with self.assertRaises(error_type):
+                    loop.run_until_complete(async_pipeline.transduce_file_async(
+                        64, columns, path_to_file, self.output_path, chunk_size=16,
+                        max_pending_chunks=1))
+                all_tasks = getattr(asyncio, "all_tasks", None) or asyncio.Task.all_tasks
+                self.assertEqual([task for task in all_tasks(loop) if not task.done()], [])
+                gc.collect()
+        finally:
+            loop.close()
+        self.assertEqual(unhandled, [])
+        self.assertEqual(caught, [])
+
+    def test_failed_run_cleanup(self):
+        """A failed run stops every stage, even one blocked on a full queue."""
+        # The first chunk fails while the rest of the file is still being read
+        malformed_path = os.path.join(self.temp_dir.name, "malformed.csv")
+        with open(malformed_path, 'w') as f:
+            f.write("a,b,c\n" + "x,y\n" * 1000)
+        self.assert_fails_cleanly(ValueError, malformed_path, ["hehe", "haha"])
+
+        data = bytearray(gzip.compress(pablo.readfile(
+            "Resources/Test/unicode_test_large.csv").encode('utf-8')))
+        data[20:60] = bytes(byte ^ 0xFF for byte in data[20:60])
+        corrupt_path = os.path.join(self.temp_dir.name, "corrupt.csv.gz")
+        with open(corrupt_path, 'wb') as f:
+            f.write(data)
+        self.assert_fails_cleanly(zlib.error, corrupt_path, ["col A", "gul", "chaava", "dabu"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Contains tests for the functions in batch.py.
+"""
+import unittest
+import tempfile
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import batch
+from src import csv_json_transducer
+from src import pack_tuning
+from src import pablo
+
+class TestBatchMethods(unittest.TestCase):
+    """Integration tests for the batch driver."""
+
+    def test_batch_matches_main(self):
+        """Every file in the batch should transduce exactly as it does through main."""
+        columns = ["col A", "col B", "col C"]
+        paths = ["Resources/Test/test.csv", "Resources/Test/test.csv"]
+        file_results, aggregate = batch.transduce_batch(64, columns, paths, num_workers=1)
+        expected = csv_json_transducer.main(64, columns, "Resources/Test/test.csv", verbose=False)
+        for result in file_results:
+            self.assertEqual(result["output"], expected)
+            self.assertEqual(result["input_bytes"], 12)
+        self.assertEqual(aggregate["files"], 2)
+        self.assertEqual(aggregate["failed"], 0)
+        self.assertEqual(aggregate["input_bytes"], 24)
+
+    def test_auto_pack_size(self):
+        """The pack size chosen in auto mode and its cost are reported per file."""
+        columns = ["col A", "col B", "col C"]
+        file_results, _ = batch.transduce_batch("auto", columns, ["Resources/Test/test.csv"],
+                                                num_workers=1)
+        self.assertIn(file_results[0]["pack_size"], pack_tuning.CANDIDATE_PACK_SIZES)
+        self.assertGreater(file_results[0]["pack_cost"], 0)
+        self.assertEqual(file_results[0]["output"],
+                         csv_json_transducer.main(64, columns, "Resources/Test/test.csv",
+                                                  verbose=False))
+        self.assertEqual(batch.parse_args(["--columns", "a", "--pack-size", "auto", "x.csv"])
+                         .pack_size, "auto")
+
+    def test_worker_pool(self):
+        """Files spread across worker processes are written to the output directory."""
+        columns = ["col1"]
+        with tempfile.TemporaryDirectory() as output_dir:
+            file_results, aggregate = batch.transduce_batch(
+                64, columns, ["Resources/Test/s2p_test.csv", "Resources/Test/unicode_test.csv"],
+                output_dir, num_workers=2)
+            self.assertEqual(aggregate["failed"], 0)
+            self.assertEqual(pablo.readfile(file_results[0]["output_path"]),
+                             '[\n    {\n        "col1": 123\n    }\n]')
+            self.assertEqual(pablo.readfile(file_results[1]["output_path"]),
+                             '[\n    {\n        "col1": 한\n    }\n]')
+
+    def test_malformed_file(self):
+        """A malformed file is reported without stopping the rest of the batch."""
+        columns = ["hehe", "haha", "hoho"]
+        file_results, aggregate = batch.transduce_batch(
+            64, columns, ["Resources/Test/malformed_rows_multi.csv", "Resources/Test/test.csv"],
+            num_workers=1)
+        self.assertIn("error", file_results[0])
+        self.assertNotIn("error", file_results[1])
+        self.assertEqual(aggregate["failed"], 1)
+
+    def test_expand_paths(self):
+        """Glob patterns are expanded, plain paths are kept."""
+        paths = batch.expand_paths(["Resources/Test/malformed_rows*.csv", "missing.csv"])
+        self.assertEqual(paths, ["Resources/Test/malformed_rows.csv",
+                                 "Resources/Test/malformed_rows_multi.csv",
+                                 "Resources/Test/malformed_rows_multi2.csv",
+                                 "missing.csv"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Contains tests for the functions in checkpoint.py.
+"""
+import unittest
+import tempfile
+import gzip
+from unittest import mock
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import checkpoint
+from src import chunking
+from src import csv_json_transducer
+from src import pablo
+
+COLUMNS = ["col A", "gul", "chaava", "dabu"]
+CSV_PATH = "Resources/Test/unicode_test_large.csv"
+
+class Killed(Exception):
+    """Stands in for the run being killed."""
+
+class TestCheckpointMethods(unittest.TestCase):
+    """Integration tests for checkpointed, resumable transduction."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.temp_dir.name, "out.json")
+        self.checkpoint_path = self.output_path + checkpoint.CHECKPOINT_EXTENSION
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def kill_after(self, num_chunks, *args, **kwargs):
+        """Run checkpoint.transduce_file, killing it while it transduces chunk num_chunks."""
+        transduce_rows = chunking.transduce_rows
+        calls = []
+        def transduce_or_die(*rows_args):
+            calls.append(None)
+            if len(calls) == num_chunks:
+                raise Killed()
+            return transduce_rows(*rows_args)
+        with mock.patch.object(chunking, "transduce_rows", transduce_or_die):
+            with self.assertRaises(Killed):
+                checkpoint.transduce_file(*args, **kwargs)
+
+    def test_resume(self):
+        """A killed run is resumed from its last checkpoint, with the same final output."""
+        csv_bytes = pablo.readfile_bytes(CSV_PATH)
+        for layout in ("pretty", "minified"):
+            expected = csv_json_transducer.main(64, COLUMNS, CSV_PATH, verbose=False,
+                                                layout=layout)
+            self.kill_after(7, 64, COLUMNS, CSV_PATH, self.output_path, chunk_size=50,
+                            checkpoint_interval=2, layout=layout)
+            saved = checkpoint.load_checkpoint(self.checkpoint_path)
+            self.assertEqual(saved.input_offset, 300)
+            self.assertEqual(saved.output_offset, os.path.getsize(self.output_path))
+            self.assertGreater(saved.rows_emitted, 0)
+            self.assertEqual(saved.remainder, csv_bytes[csv_bytes.rfind(b"\n", 0, 300) + 1:300])
+            # Output written after the checkpoint is dropped
+            with open(self.output_path, "ab") as f:
+                f.write(b"half a row")
+            rows = checkpoint.transduce_file(64, COLUMNS, CSV_PATH, self.output_path,
+                                             chunk_size=50, layout=layout)
+            self.assertEqual(pablo.readfile(self.output_path), expected)
+            self.assertEqual(rows, csv_bytes.count(b"\n"))
+            self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_resume_compressed_input(self):
+        """Compressed input is resumed at the checkpointed offset of its decompressed bytes."""
+        input_path = os.path.join(self.temp_dir.name, "in.csv.gz")
+        with open(input_path, "wb") as f:
+            f.write(gzip.compress(pablo.readfile_bytes(CSV_PATH)))
+        self.kill_after(4, 64, COLUMNS, input_path, self.output_path, chunk_size=100,
+                        checkpoint_interval=1)
+        checkpoint.transduce_file(64, COLUMNS, input_path, self.output_path, chunk_size=100)
+        self.assertEqual(pablo.readfile(self.output_path),
+                         csv_json_transducer.main(64, COLUMNS, CSV_PATH, verbose=False))
+
+    def test_mismatched_jobs(self):
+        """A checkpoint is only resumed by the job that saved it."""
+        self.kill_after(3, 64, COLUMNS, CSV_PATH, self.output_path, chunk_size=100,
+                        checkpoint_interval=1)
+        with self.assertRaises(ValueError):
+            checkpoint.transduce_file(64, COLUMNS, CSV_PATH, self.output_path, layout="compact")
+        with self.assertRaises(ValueError):
+            checkpoint.transduce_file(64, COLUMNS[::-1], CSV_PATH, self.output_path)
+        with open(self.output_path, "r+b") as f:
+            f.truncate(1)
+        with self.assertRaises(ValueError):
+            checkpoint.transduce_file(64, COLUMNS, CSV_PATH, self.output_path)
+        with self.assertRaises(ValueError):
+            checkpoint.transduce_file(64, COLUMNS, CSV_PATH, self.output_path + ".gz")
+
+    def test_empty_file(self):
+        """An empty file is transduced to an empty array."""
+        empty_path = os.path.join(self.temp_dir.name, "empty.csv")
+        open(empty_path, "wb").close()
+        self.assertEqual(checkpoint.transduce_file(64, ["col1"], empty_path,
+                                                   self.output_path), 0)
+        self.assertEqual(pablo.readfile(self.output_path), "[\n]")
+
+if __name__ == '__main__':
+    unittest.main()
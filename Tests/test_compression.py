@@ -0,0 +1,132 @@
+"""
+Contains tests for the functions in compression.py.
+"""
+import unittest
+import tempfile
+import gzip
+import bz2
+import lzma
+import zlib
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import compression
+from src import chunking
+from src import async_pipeline
+from src import aggregate
+from src import checkpoint
+from src import csv_json_transducer
+from src import pablo
+
+COLUMNS = ["col A", "gul", "chaava", "dabu"]
+CSV_PATH = "Resources/Test/unicode_test_large.csv"
+COMPRESSORS = {".gz": gzip.compress, ".bz2": bz2.compress, ".xz": lzma.compress}
+
+class TestCompressionMethods(unittest.TestCase):
+    """Unit and integration tests for compressed input and output."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.csv_bytes = pablo.readfile_bytes(CSV_PATH)
+        self.expected = csv_json_transducer.main(64, COLUMNS, CSV_PATH, verbose=False)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_compressed(self, name, extension):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'wb') as f:
+            f.write(COMPRESSORS[extension](self.csv_bytes))
+        return path
+
+    def write_corrupt_gzip(self):
+        """Write a gzip file whose deflate data is corrupt, which raises zlib.error."""
+        data = bytearray(gzip.compress(self.csv_bytes))
+        data[20:60] = bytes(byte ^ 0xFF for byte in data[20:60])
+        path = os.path.join(self.temp_dir.name, "corrupt.csv.gz")
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_detect_codec(self):
+        """Codecs are detected from the extension, or from the magic bytes without one."""
+        for extension, codec in [(".gz", compression.GZIP), (".bz2", compression.BZ2),
+                                 (".xz", compression.XZ)]:
+            self.assertEqual(compression.detect_codec(
+                self.write_compressed("in.csv" + extension, extension)), codec)
+            self.assertEqual(compression.detect_codec(
+                self.write_compressed("in" + extension[1:], extension)), codec)
+        self.assertEqual(compression.detect_codec(CSV_PATH), compression.NONE)
+        with self.assertRaises(ValueError):
+            compression.open_compressed(CSV_PATH, 'rb', "zip")
+
+    def test_main(self):
+        """main transduces compressed files like uncompressed ones."""
+        for extension in COMPRESSORS:
+            path = self.write_compressed("in.csv" + extension, extension)
+            self.assertEqual(csv_json_transducer.main(64, COLUMNS, path, verbose=False),
+                             self.expected)
+
+    def test_chunked_round_trip(self):
+        """Compressed input is transduced a chunk at a time into compressed output."""
+        for extension in COMPRESSORS:
+            input_path = self.write_compressed("in.csv" + extension, extension)
+            output_path = os.path.join(self.temp_dir.name, "out.json" + extension)
+            chunking.transduce_file(64, COLUMNS, input_path, output_path, chunk_size=64,
+                                    max_pending_chunks=2)
+            self.assertEqual(compression.read_file(output_path).decode('utf-8'),
+                             self.expected)
+            async_pipeline.transduce_file(64, COLUMNS, input_path, output_path, chunk_size=64)
+            self.assertEqual(compression.read_file(output_path).decode('utf-8'),
+                             self.expected)
+            csv_json_transducer.transduce_file_to_path(64, COLUMNS, input_path, output_path)
+            self.assertEqual(compression.read_file(output_path).decode('utf-8'),
+                             self.expected)
+
+    def test_chunked_layout(self):
+        """Chunks are joined with the separators of the layout."""
+        output_path = os.path.join(self.temp_dir.name, "out.json.gz")
+        chunking.transduce_file(64, COLUMNS, CSV_PATH, output_path, chunk_size=64,
+                                layout="minified")
+        self.assertEqual(compression.read_file(output_path).decode('utf-8'),
+                         csv_json_transducer.transduce_csv_str(64, COLUMNS, self.csv_bytes,
+                                                               layout="minified"))
+
+    def test_errors(self):
+        """Corrupt input and malformed rows are raised by the chunked driver."""
+        output_path = os.path.join(self.temp_dir.name, "out.json.gz")
+        corrupt_path = os.path.join(self.temp_dir.name, "corrupt.csv.xz")
+        with open(corrupt_path, 'wb') as f:
+            f.write(lzma.compress(self.csv_bytes)[:-20])
+        with self.assertRaises((EOFError, lzma.LZMAError)):
+            chunking.transduce_file(64, COLUMNS, corrupt_path, output_path)
+        with self.assertRaises(zlib.error):
+            chunking.transduce_file(64, COLUMNS, self.write_corrupt_gzip(), output_path)
+        # The partial output is removed rather than finished
+        self.assertFalse(os.path.exists(output_path))
+        with self.assertRaises(zlib.error):
+            async_pipeline.transduce_file(64, COLUMNS, self.write_corrupt_gzip(), output_path)
+        with self.assertRaises(zlib.error):
+            aggregate.aggregate_file(64, COLUMNS, self.write_corrupt_gzip(), "gul")
+        with self.assertRaises(zlib.error):
+            checkpoint.transduce_file(64, COLUMNS, self.write_corrupt_gzip(),
+                                      os.path.join(self.temp_dir.name, "out.json"))
+        with self.assertRaises(ValueError):
+            chunking.transduce_file(64, ["hehe", "haha", "hoho"],
+                                    "Resources/Test/malformed_rows_multi2.csv", output_path,
+                                    chunk_size=4)
+        empty_path = os.path.join(self.temp_dir.name, "empty.csv.bz2")
+        with open(empty_path, 'wb') as f:
+            f.write(bz2.compress(b""))
+        chunking.transduce_file(64, ["col1"], empty_path, output_path)
+        self.assertEqual(compression.read_file(output_path), b"[\n]")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@
 Contains tests for the functions in csv_json_transducer.py.
 """
 import unittest
+import tempfile
+import json
 
 # workaround to get the import statements below working properly. Required
 # if this module can be run as "main". Adds PythonPrototypes directory to sys path
@@ -15,6 +17,7 @@ sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
 from src.transducer_target_enums import TransductionTarget
 from src import pablo
 from src import csv_json_transducer
+from src import kernel_pipeline
 from src import field_width
 from src.json_converter import JSONConverter
 from Tests import helper_functions
@@ -137,6 +140,12 @@ class TestCSVJSONTransducerMethods(unittest.TestCase):
         expected_result = pablo.readfile("Resources/Verified_Output/verfied_unicode_test_large.json")
         self.assertEqual(result, expected_result)
 
+    def test_invalid_utf8(self):
+        """Input that isn't valid UTF-8 is rejected before it's transduced."""
+        with self.assertRaises(ValueError) as context:
+            csv_json_transducer.transduce_csv_str(64, ["col1", "col2"], b"12,ab\xffc\n")
+        self.assertEqual(context.exception.args[1], 5)
+
     def test_main1(self):
         """Integration test for main() == system test."""
         result = csv_json_transducer.main(64, ["col1"], "Resources/Test/s2p_test.csv")
@@ -149,6 +158,82 @@ class TestCSVJSONTransducerMethods(unittest.TestCase):
         self.assertEqual(result,
                          '[\n    {\n        "col A": 12,\n        "col B": abc,\n        "col C": flap\n    }\n]')
 
+    def test_transduce_to_fd(self):
+        """Output written through a file descriptor matches main, byte for byte."""
+        columns = ["col A", "gul", "chaava", "dabu"]
+        path = "Resources/Test/unicode_test_large.csv"
+        expected = csv_json_transducer.main(64, columns, path, verbose=False).encode('utf-8')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, "out.json")
+            written = csv_json_transducer.transduce_file_to_path(64, columns, path, output_path)
+            self.assertEqual(written, len(expected))
+            self.assertEqual(pablo.readfile_bytes(output_path), expected)
+            written = csv_json_transducer.transduce_file_to_path(64, ["a"], "/dev/null",
+                                                                 output_path)
+            self.assertEqual(pablo.readfile_bytes(output_path), b"[\n]")
+            self.assertEqual(written, 3)
+
+    def test_output_length(self):
+        """The output length is counted in bytes, not characters."""
+        columns = ["한국어", "é"]
+        csv_file_as_bytes = "가,b\nc,\u00e9\n".encode('utf-8')
+        prepared = csv_json_transducer.prepare_transduction(64, columns, csv_file_as_bytes)
+        expected = csv_json_transducer.transduce_csv_str(64, columns,
+                                                         csv_file_as_bytes).encode('utf-8')
+        self.assertEqual(prepared.converter.output_length(), len(expected))
+        output_buffer = bytearray(b"#" * (len(expected) + 2))
+        written = prepared.converter.transduce_into(output_buffer, prepared.fields_pext_ms,
+                                                    prepared.csv_stream_set, offset=1)
+        self.assertEqual(written, len(expected))
+        self.assertEqual(bytes(output_buffer), b"#" + expected + b"#")
+
+    def test_layouts(self):
+        """Every layout holds the same JSON. The minified one is the smallest."""
+        columns = ["id", "x", "y"]
+        csv_file_as_str = "1,2.5,-3\n4,5e3,6\n"
+        outputs = {}
+        for layout in ["pretty", "compact", "minified"]:
+            outputs[layout] = csv_json_transducer.transduce_csv_str(64, columns, csv_file_as_str,
+                                                                    layout=layout)
+            self.assertEqual(json.loads(outputs[layout]),
+                             [{"id": 1, "x": 2.5, "y": -3}, {"id": 4, "x": 5e3, "y": 6}])
+            self.assertEqual(bytes(csv_json_transducer.transduce_csv_to_buffer(
+                64, columns, csv_file_as_str, layout=layout)), outputs[layout].encode('utf-8'))
+            self.assertEqual(kernel_pipeline.transduce_segmented(64, columns,
+                                                                 csv_file_as_str.encode('utf-8'),
+                                                                 5, layout),
+                             outputs[layout])
+        self.assertEqual(outputs["minified"], '[{"id":1,"x":2.5,"y":-3},{"id":4,"x":5e3,"y":6}]')
+        self.assertLess(len(outputs["minified"]), len(outputs["compact"]))
+        self.assertLess(len(outputs["compact"]), len(outputs["pretty"]))
+        selected = csv_json_transducer.transduce_csv_str(64, columns, csv_file_as_str,
+                                                         selected_columns=["y"],
+                                                         layout="minified")
+        self.assertEqual(selected, '[{"y":-3},{"y":6}]')
+
+    def test_sparse_marker_streams(self):
+        """Sparse delimiter and PDEP marker streams are transduced from their positions."""
+        wide_fields = "{0},{1}\n{1},{0}\n".format("1" * 200, "2" * 150)
+        columns = ["a", "b"]
+        stream_set = pablo.StreamSet.transpose_in(wide_fields)
+        delimiter_ms, _ = pablo.detect_delimiters(stream_set, [",", "\n"])
+        self.assertTrue(pablo.MarkerStream.from_bits(delimiter_ms, stream_set.length).is_sparse)
+        self.assertEqual(json.loads(csv_json_transducer.transduce_csv_str(64, columns,
+                                                                          wide_fields)),
+                         [{"a": int("1" * 200), "b": int("2" * 150)},
+                          {"a": int("2" * 150), "b": int("1" * 200)}])
+
+        long_names = ["a" * 100, "b" * 100]
+        narrow_fields = "1,2\n3,4\n"
+        prepared = csv_json_transducer.prepare_transduction(64, long_names, narrow_fields)
+        pdep_ms = prepared.converter.create_pdep_stream()
+        self.assertTrue(pablo.MarkerStream.from_bits(
+            pdep_ms, prepared.converter.output_length()).is_sparse)
+        self.assertEqual(json.loads(csv_json_transducer.transduce_csv_str(64, long_names,
+                                                                          narrow_fields)),
+                         [{long_names[0]: 1, long_names[1]: 2},
+                          {long_names[0]: 3, long_names[1]: 4}])
+
     # def test_main3(self):
     #     """Test 250 line CSV file. Takes ~20 minutes on a Ubuntu 16.04 VM with limited resources."""
     #     result = csv_json_transducer.main(64, ["id", "first_name", "last_name", "email",
@@ -0,0 +1,98 @@
+"""
+Contains tests for the functions in daemon.py.
+"""
+import unittest
+import tempfile
+import threading
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import daemon
+from src import csv_json_transducer
+from src import pablo
+from src.output_cache import OutputCache
+
+COLUMNS = ["col A", "gul", "chaava", "dabu"]
+CSV_PATH = "Resources/Test/unicode_test_large.csv"
+
+class TestDaemonMethods(unittest.TestCase):
+    """Integration tests for the transduction daemon."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.temp_dir.name, "transducer.sock")
+        self.server = daemon.TransductionServer(self.socket_path, num_workers=2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def test_transduce(self):
+        """Output is streamed back, or written to the requested path."""
+        expected = csv_json_transducer.main(64, COLUMNS, CSV_PATH, verbose=False)
+        request = {"op": "transduce", "path": CSV_PATH, "columns": COLUMNS}
+        header, payload = daemon.send_request(self.socket_path, request)
+        self.assertEqual(payload.decode('utf-8'), expected)
+        self.assertEqual(header["output_bytes"], len(payload))
+        self.assertEqual(header["stats"]["pack_size"], 64)
+
+        output_path = os.path.join(self.temp_dir.name, "out.json")
+        request.update(output_path=output_path, layout="minified", pack_size="auto")
+        header, payload = daemon.send_request(self.socket_path, request)
+        self.assertEqual(payload, b"")
+        self.assertEqual(pablo.readfile(output_path),
+                         csv_json_transducer.main(64, COLUMNS, CSV_PATH, verbose=False,
+                                                  layout="minified"))
+
+    def test_errors_and_stats(self):
+        """Failed jobs are reported to the client and counted, along with the cache stats."""
+        with self.assertRaises(ValueError):
+            daemon.send_request(self.socket_path, {"op": "transduce", "columns": ["a"],
+                                                   "path": "Resources/Test/missing.csv"})
+        with self.assertRaises(ValueError):
+            daemon.send_request(self.socket_path, {"op": "reload"})
+        corrupt_path = os.path.join(self.temp_dir.name, "corrupt.csv.gz")
+        with open(corrupt_path, 'wb') as f:
+            f.write(b"\x1f\x8b\x08\x00" + bytes(range(256)))  # raises zlib.error
+        with self.assertRaises(ValueError):
+            daemon.send_request(self.socket_path, {"op": "transduce", "columns": COLUMNS,
+                                                   "path": corrupt_path})
+        for _ in range(2):
+            daemon.send_request(self.socket_path, {"op": "transduce", "path": CSV_PATH,
+                                                   "columns": COLUMNS})
+        stats, _ = daemon.send_request(self.socket_path, {"op": "stats"})
+        self.assertEqual(stats["jobs"], 4)
+        self.assertEqual(stats["failed"], 2)
+        self.assertEqual(stats["workers"], 2)
+        self.assertGreater(stats["row_shape_cache"]["hits"], 0)
+        self.assertGreater(stats["field_name_cache"]["hits"], 0)
+
+    def test_output_cache(self):
+        """With an output cache, repeated jobs are served from it unless the request opts out."""
+        self.server.cache = OutputCache(os.path.join(self.temp_dir.name, "cache"))
+        expected = csv_json_transducer.main(64, COLUMNS, CSV_PATH, verbose=False)
+        request = {"op": "transduce", "path": CSV_PATH, "columns": COLUMNS}
+        for cache_hit in (False, True):
+            header, payload = daemon.send_request(self.socket_path, request)
+            self.assertEqual(header["stats"]["cache_hit"], cache_hit)
+            self.assertEqual(payload.decode('utf-8'), expected)
+        request["cache"] = False
+        header, payload = daemon.send_request(self.socket_path, request)
+        self.assertNotIn("cache_hit", header["stats"])
+        stats, _ = daemon.send_request(self.socket_path, {"op": "stats"})
+        self.assertEqual(stats["output_cache"]["hits"], 1)
+        self.assertEqual(stats["output_cache"]["size"], len(payload))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -53,6 +53,26 @@ class TestFieldWidthMethods(unittest.TestCase):
         field_widths = field_width.calculate_field_widths(csv_file_as_str, pack_size)
         self.assertEqual(field_widths, [1, 1, 0, 0])
 
+    def test_empty_file(self):
+        """An empty file contains no fields."""
+        self.assertEqual(field_width.calculate_field_widths("", 64), [])
+
+    def test_sparse_delimiters(self):
+        """Wide fields take the delimiter position path and give the same widths."""
+        csv_file_as_str = "a" * 300 + ",," + "b" * 500 + "\n" + "c" * 200 + ",d,\n"
+        stream_set = pablo.StreamSet.transpose_in(csv_file_as_str)
+        delimiter_ms, _ = pablo.detect_delimiters(stream_set)
+        fields_pext_ms = ~delimiter_ms & ((1 << stream_set.length) - 1)
+        self.assertTrue(pablo.MarkerStream.from_bits(delimiter_ms, stream_set.length).is_sparse)
+        dense_delimiters = pablo.MarkerStream(stream_set.length, bits=delimiter_ms)
+        expected = [300, 0, 500, 200, 1, 0]
+        self.assertEqual(field_width.calculate_field_widths_from_ms(fields_pext_ms,
+                                                                    dense_delimiters, 64),
+                         expected)
+        self.assertEqual(field_width.calculate_field_widths_from_ms(fields_pext_ms,
+                                                                    delimiter_ms, 64),
+                         expected)
+
     def test_multpack(self):
         """Test with multi-pack field_widths_ms and non-standard pack_size."""
         csv_file_as_str = "abs,,asdfasdfasdf\n"
@@ -0,0 +1,81 @@
+"""
+Contains tests for the functions in incremental.py.
+"""
+import unittest
+import tempfile
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import incremental
+from src import csv_json_transducer
+from src import pablo
+
+class TestIncrementalMethods(unittest.TestCase):
+    """Integration tests for incremental transduction of a growing CSV file."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.temp_dir.name, "log.csv")
+        self.json_path = os.path.join(self.temp_dir.name, "log.json")
+        self.columns = ["col A", "col B"]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def append(self, text):
+        with open(self.csv_path, 'ab') as f:
+            f.write(text.encode('utf-8'))
+
+    def run_incremental(self, layout="pretty"):
+        return incremental.transduce_incremental(64, self.columns, self.csv_path,
+                                                 self.json_path, layout=layout)
+
+    def test_append(self):
+        """Output after several appends matches transducing the whole file at once."""
+        self.append("1,abc\n2,한국어\n3,")
+        self.assertEqual(self.run_incremental(), 2)
+        self.append("de\n4,f\n")
+        self.assertEqual(self.run_incremental(), 2)
+        self.assertEqual(self.run_incremental(), 0)
+        self.append("5,\n")
+        self.assertEqual(self.run_incremental(), 1)
+
+        expected = csv_json_transducer.main(64, self.columns, self.csv_path, verbose=False)
+        self.assertEqual(pablo.readfile(self.json_path), expected)
+        checkpoint = incremental.load_checkpoint(self.json_path + ".ckpt")
+        self.assertEqual(checkpoint["rows_emitted"], 5)
+        self.assertEqual(checkpoint["byte_offset"], os.path.getsize(self.csv_path))
+        self.assertEqual(checkpoint["closing_offset"], os.path.getsize(self.json_path) - 2)
+
+    def test_layouts(self):
+        """Appends use the layout's separators, and a new layout starts over."""
+        self.append("1,abc\n")
+        self.assertEqual(self.run_incremental("minified"), 1)
+        self.append("2,de\n")
+        self.assertEqual(self.run_incremental("minified"), 1)
+        self.assertEqual(pablo.readfile(self.json_path),
+                         '[{"col A":1,"col B":abc},{"col A":2,"col B":de}]')
+        self.assertEqual(self.run_incremental("compact"), 2)
+        self.assertEqual(pablo.readfile(self.json_path),
+                         csv_json_transducer.main(64, self.columns, self.csv_path,
+                                                  verbose=False, layout="compact"))
+
+    def test_truncated_input(self):
+        """A file that shrinks (e.g. is rotated) is transduced from the start."""
+        self.append("1,abc\n2,def\n")
+        self.run_incremental()
+        os.remove(self.csv_path)
+        self.append("3,g\n")
+        self.assertEqual(self.run_incremental(), 1)
+        self.assertEqual(pablo.readfile(self.json_path),
+                         '[\n    {\n        "col A": 3,\n        "col B": g\n    }\n]')
+
+if __name__ == '__main__':
+    unittest.main()
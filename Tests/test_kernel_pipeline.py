@@ -0,0 +1,97 @@
+"""
+Contains tests for the functions in kernel_pipeline.py.
+"""
+import unittest
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import kernel_pipeline
+from src import csv_json_transducer
+from src import pablo
+
+class CountingKernel(kernel_pipeline.Kernel):
+    """Counts the bytes seen so far, carrying the count between segments."""
+    inputs = ("bytes",)
+    outputs = ("count",)
+
+    def reset(self):
+        self.count = 0
+
+    def process(self, segment, streams):
+        self.count += len(streams["bytes"])
+        return {"count": self.count}
+
+class TestKernelPipelineMethods(unittest.TestCase):
+    """Unit and integration tests for the segment-at-a-time pipeline."""
+
+    def test_scheduler(self):
+        """Kernels run once per segment, carry state, and are reset between files."""
+        pipeline = kernel_pipeline.Pipeline([CountingKernel()], segment_size=4)
+        self.assertEqual(pipeline.run(b"0123456789", ("count",)), {"count": [4, 8, 10]})
+        self.assertEqual(pipeline.run(b"", ("count",)), {"count": [0]})
+
+    def test_undeclared_streams(self):
+        """Kernels can only read streams produced before them."""
+        with self.assertRaises(ValueError):
+            kernel_pipeline.Pipeline([kernel_pipeline.PextKernel()])
+        pipeline = kernel_pipeline.Pipeline([kernel_pipeline.S2PKernel()])
+        with self.assertRaises(ValueError):
+            pipeline.run(b"abc", ("delimiters",))
+
+    def test_matches_transduce_csv_str(self):
+        """Fields, rows and UTF-8 sequences split across segments are transduced whole."""
+        columns = ["col A", "gul", "chaava", "dabu"]
+        byte_stream = pablo.readfile_bytes("Resources/Test/unicode_test_large.csv")
+        expected = csv_json_transducer.transduce_csv_str(64, columns, byte_stream)
+        for segment_size in [1, 3, 64, 1 << 16]:
+            self.assertEqual(kernel_pipeline.transduce_segmented(64, columns, byte_stream,
+                                                                 segment_size),
+                             expected, segment_size)
+        self.assertEqual(kernel_pipeline.transduce_segmented(64, ["a"], b""), "[\n]")
+        self.assertEqual(kernel_pipeline.transduce_segmented(64, ["a"], b"x", 1),
+                         csv_json_transducer.transduce_csv_str(64, ["a"], b"x"))
+        self.assertEqual(kernel_pipeline.transduce_segmented("auto", columns, byte_stream, 64),
+                         expected)
+
+    def test_errors(self):
+        """Errors report the same offsets and messages as transduce_csv_str."""
+        with self.assertRaises(ValueError) as context:
+            kernel_pipeline.transduce_segmented(64, ["col1", "col2"], b"12,\xc3\xa9b\xc3\n", 5)
+        self.assertEqual(context.exception.args[1], 6)
+        with self.assertRaises(ValueError):
+            kernel_pipeline.transduce_segmented(64, ["hehe", "haha", "hoho"],
+                                                b"a,b,c\nd,e\nf,g,h\n", 4)
+        with self.assertRaises(ValueError):
+            kernel_pipeline.transduce_segmented(3, ["a"], b"x\n")
+
+    def test_abstract_kernel(self):
+        """Kernels must implement process, and validation reuses the basis streams."""
+        class NoProcessKernel(kernel_pipeline.Kernel):
+            outputs = ("nothing",)
+        with self.assertRaises(TypeError):
+            NoProcessKernel()
+        self.assertEqual(kernel_pipeline.UTF8ValidationKernel.inputs, ("basis",))
+        with self.assertRaises(ValueError):
+            kernel_pipeline.Pipeline([kernel_pipeline.UTF8ValidationKernel()])
+        for segment_size in [1, 2, 3, 4, 7]:
+            with self.assertRaises(ValueError) as context:
+                kernel_pipeline.transduce_segmented(64, ["a"], b"ab\xe2\x82\xac\nc\xe2\x82\n",
+                                                    segment_size)
+            self.assertEqual(context.exception.args[1], 7, segment_size)
+
+    def test_incomplete_sequence_length(self):
+        """Only a lead byte without all of its continuation bytes is held back."""
+        self.assertEqual(kernel_pipeline.incomplete_sequence_length(b"a\xe2\x82"), 2)
+        self.assertEqual(kernel_pipeline.incomplete_sequence_length(b"a\xe2\x82\xac"), 0)
+        self.assertEqual(kernel_pipeline.incomplete_sequence_length(b"\xf0"), 1)
+        self.assertEqual(kernel_pipeline.incomplete_sequence_length(b"ab"), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Contains tests for the functions in output_cache.py.
+"""
+import unittest
+import tempfile
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import output_cache
+from src import csv_json_transducer
+from src import pablo
+from src.output_cache import OutputCache
+
+COLUMNS = ["col A", "gul", "chaava", "dabu"]
+CSV_PATH = "Resources/Test/unicode_test_large.csv"
+
+class TestOutputCacheMethods(unittest.TestCase):
+    """Unit and integration tests for the output cache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_cache_key(self):
+        """The key depends on the input and the output options, but not the pack size."""
+        key = output_cache.cache_key(b"a,b\n", ["x", "y"])
+        self.assertEqual(key, output_cache.cache_key(b"a,b\n", ["x", "y"], layout="pretty"))
+        self.assertNotEqual(key, output_cache.cache_key(b"a,c\n", ["x", "y"]))
+        self.assertNotEqual(key, output_cache.cache_key(b"a,b\n", ["x", "z"]))
+        self.assertNotEqual(key, output_cache.cache_key(b"a,b\n", ["x", "y"], layout="compact"))
+        self.assertNotEqual(key, output_cache.cache_key(b"a,b\n", ["x", "y"],
+                                                        selected_columns=["x"]))
+
+    def test_hits_and_misses(self):
+        """A repeated transduction is served from the cache, and written or linked out."""
+        cache = OutputCache(self.cache_dir)
+        expected = csv_json_transducer.main(64, COLUMNS, CSV_PATH, verbose=False)
+        stats = {}
+        result = cache.transduce_file(64, COLUMNS, CSV_PATH, stats=stats)
+        self.assertFalse(result.hit)
+        self.assertEqual(result.payload.decode('utf-8'), expected)
+        self.assertEqual(stats["pack_size"], 64)
+
+        result = cache.transduce_file(128, COLUMNS, CSV_PATH)
+        self.assertTrue(result.hit)
+        self.assertEqual(result.payload.decode('utf-8'), expected)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        output_path = os.path.join(self.temp_dir.name, "out.json")
+        for symlink in (False, True):
+            result = cache.transduce_file(64, COLUMNS, CSV_PATH, output_path, symlink=symlink)
+            self.assertEqual((result.output_length, result.payload, result.hit),
+                             (len(expected.encode('utf-8')), b"", True))
+            self.assertEqual(os.path.islink(output_path), symlink)
+            self.assertEqual(pablo.readfile(output_path), expected)
+
+        result = cache.transduce_file(64, COLUMNS, CSV_PATH, layout="minified")
+        self.assertFalse(result.hit)
+        self.assertEqual(len(cache.entries()), 2)
+        self.assertFalse([name for name in os.listdir(self.cache_dir) if name.endswith(".tmp")])
+
+    def test_eviction(self):
+        """Least recently used entries are evicted to keep the cache under its size limit."""
+        with self.assertRaises(ValueError):
+            OutputCache(self.cache_dir, max_bytes=0)
+        cache = OutputCache(self.cache_dir, max_bytes=10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        os.utime(cache.path_for("a"), (0, 0))
+        os.utime(cache.path_for("b"), (1, 1))
+        self.assertEqual(cache.get("a"), cache.path_for("a"))  # now most recently used
+        cache.put("c", b"cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.size(), 8)
+        cache.put("d", b"d" * 11)  # larger than the whole cache
+        self.assertIsNone(cache.get("d"))
+        cache.clear()
+        self.assertEqual((cache.size(), cache.hits, cache.misses), (0, 0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
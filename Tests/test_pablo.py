@@ -2,6 +2,7 @@
 Contains tests for the functions in pablo.py.
 """
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 # workaround to get the import statements below working properly. Required
 # if this module can be run as "main". Adds PythonPrototypes directory to sys path
@@ -127,5 +128,154 @@ class TestPabloMethods(unittest.TestCase):
 
         self.assertTrue(sink_bit_stream, expected_result)
 
+    def test_stream_set_transpose(self):
+        """StreamSet transposes in and out the same way as serial_to_parallel/inverse_transpose."""
+        byte_stream = "12,한국어,flap\n"
+        csv_bit_streams = [0, 0, 0, 0, 0, 0, 0, 0]
+        pablo.serial_to_parallel(byte_stream, csv_bit_streams)
+        stream_set = pablo.StreamSet.transpose_in(byte_stream)
+        self.assertEqual(list(stream_set), csv_bit_streams)
+        self.assertEqual(stream_set.length, len(byte_stream.encode('utf-8')))
+        self.assertEqual(stream_set.transpose_out(), byte_stream)
+        self.assertEqual(stream_set.transpose_out(2, decode=False), b"12")
+
+    def test_select_bits(self):
+        """select_bits finds the k-th set bit for each rank in a single pass."""
+        strm = int("10110", 2)
+        self.assertEqual(pablo.select_bit(strm, 1), 2)
+        self.assertEqual(pablo.select_bit(strm, 3), -1)
+        self.assertEqual(pablo.select_bit(0, 0), -1)
+        self.assertEqual(pablo.select_bits(strm, [0, 2, 3]), [1, 4, -1])
+        self.assertEqual(pablo.select_bits(strm, []), [])
+        strm = int("1" * 500, 2) << 7
+        self.assertEqual(pablo.select_bits(strm, range(0, 500, 50)),
+                         [7 + k for k in range(0, 500, 50)])
+
+    def test_stream_set_transpose_out_into(self):
+        """transpose_out_into writes the bytes of transpose_out into a buffer, a block at a
+        time."""
+        byte_stream = bytes(range(256)) * (pablo.TRANSPOSE_BLOCK_SIZE // 100)
+        stream_set = pablo.StreamSet.transpose_in(byte_stream)
+        buffer = bytearray(b"#" * (len(byte_stream) + 5))
+        self.assertEqual(stream_set.transpose_out_into(buffer, 3), len(byte_stream))
+        self.assertEqual(buffer, b"###" + byte_stream + b"##")
+
+    def test_stream_set_pext_pdep(self):
+        """pext_all/pdep_all match apply_pext/apply_pdep applied to each stream."""
+        stream_set = pablo.StreamSet.transpose_in('abcd,ff,12345')
+        pext_ms = int('1111101101111', 2)
+        extracted_stream_set = stream_set.pext_all(pext_ms)
+        self.assertEqual(extracted_stream_set.length, 11)
+        self.assertEqual(extracted_stream_set.transpose_out(), 'abcdff12345')
+        self.assertEqual(list(extracted_stream_set),
+                         [pablo.apply_pext(stream, pext_ms) for stream in stream_set])
+
+        bp_stream_set = pablo.StreamSet.transpose_in('[____,__,_____]')
+        bp_stream_set.pdep_all(int('011111011011110', 2), extracted_stream_set)
+        self.assertEqual(bp_stream_set.transpose_out(), '[abcd,ff,12345]')
+
+    def test_stream_set_masked_and(self):
+        """masked_and clears the masked out bits of every stream."""
+        stream_set = pablo.StreamSet.transpose_in('abc')
+        stream_set.masked_and(0b101)
+        self.assertEqual(stream_set.transpose_out(decode=False), b'a\x00c')
+
+    def test_validate_utf8(self):
+        """Valid input gives -1. Invalid input gives the offset bytes.decode would report."""
+        cases = [
+            (b"12,\xed\x95\x9c,\xf0\x9f\x98\x80\n", -1),
+            (b"ab\x80", 2),                 # unexpected continuation byte
+            (b"a\xc3a", 1),                 # missing continuation byte
+            (b"a\xc0\xaf", 1),              # overlong 2 byte sequence
+            (b"\xe0\x80\x80", 0),           # overlong 3 byte sequence
+            (b"ok\xed\xa0\x80", 2),         # surrogate
+            (b"\xf4\x90\x80\x80", 0),       # > U+10FFFF
+            (b"\xf5\x80\x80\x80", 0),       # invalid lead byte
+            (b"abc\xe2\x82", 3),             # truncated by end of stream
+        ]
+        for byte_stream, expected_offset in cases:
+            stream_set = pablo.StreamSet.transpose_in(byte_stream)
+            self.assertEqual(pablo.validate_utf8(stream_set), expected_offset, byte_stream)
+
+    def test_detect_delimiters(self):
+        """Delimiters are detected from the same basis streams that are validated."""
+        stream_set = pablo.StreamSet.transpose_in(b"abc,123\n")
+        self.assertEqual(pablo.detect_delimiters(stream_set), (int("10001000", 2), -1))
+
+    def test_stream_context(self):
+        """Context primitives match the global ones and don't interfere across threads."""
+        def scan_fields(byte_stream):
+            context = pablo.StreamContext.from_stream_set(pablo.StreamSet.transpose_in(byte_stream))
+            delimiter_ms = pablo.create_char_class_ms(byte_stream, b",\n")
+            starts = []
+            cursor = 1
+            while not context.atEOF(cursor):
+                starts.append(pablo.count_forward_zeroes(cursor))
+                cursor = context.AdvanceThenScanTo(context.ScanTo(cursor, delimiter_ms),
+                                                   ~delimiter_ms)
+            return starts
+
+        self.addCleanup(setattr, pablo, 'EOF_mask', pablo.EOF_mask)
+        self.addCleanup(setattr, pablo, 'data', pablo.data)
+        pablo.EOF_mask = int("111111111", 2)
+        pablo.data = "ab,cd\nefg"
+        context = pablo.StreamContext("ab,cd\nefg")
+        cursors = int("1000001", 2)
+        self.assertEqual(context.ScanTo(cursors, int("100100", 2)),
+                         pablo.ScanTo(cursors, int("100100", 2)))
+        self.assertEqual(context.inFile(1 << 12), 0)
+        self.assertEqual(context.atEOF(1 << 9), pablo.atEOF(1 << 9))
+        self.assertEqual(context.match("efg", 1 << 6), 1 << 6)
+        self.assertEqual(context.match("eff", 1 << 6), 0)
+        self.assertEqual(context.match("g,", 1 << 8), 0)
+
+        inputs = [b"a,b\n" * n + b"ccc,d\n" for n in range(1, 20)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(scan_fields, inputs))
+        self.assertEqual(results, [scan_fields(byte_stream) for byte_stream in inputs])
+        self.assertEqual(results[0], [0, 2, 4, 8])
+
+    def test_marker_stream(self):
+        """Sparse and dense marker streams give the same results as int bit streams."""
+        length = 1000
+        sparse_bits = (1 << 3) | (1 << 500) | (1 << 998)
+        dense_bits = int("110" * 333, 2)
+        sparse = pablo.MarkerStream.from_bits(sparse_bits, length)
+        dense = pablo.MarkerStream.from_bits(dense_bits, length)
+        self.assertTrue(sparse.is_sparse)
+        self.assertFalse(dense.is_sparse)
+        self.assertEqual(sparse.positions, [3, 500, 998])
+        self.assertEqual(sparse, pablo.MarkerStream(length, bits=sparse_bits))
+
+        self.assertEqual(int(sparse & dense), sparse_bits & dense_bits)
+        self.assertTrue((sparse & dense).is_sparse)
+        self.assertEqual(int(sparse | dense), sparse_bits | dense_bits)
+        self.assertEqual(int(dense.andnot(sparse)), dense_bits & ~sparse_bits)
+        self.assertEqual(int(sparse.andnot(dense)), sparse_bits & ~dense_bits)
+        self.assertEqual(sparse.popcount(), 3)
+        self.assertEqual(dense.popcount(), pablo.get_popcount(dense_bits))
+        self.assertEqual(sparse.shift(2).positions, [5, 502])
+        self.assertEqual(int(dense.shift(-1)), dense_bits >> 1)
+        self.assertEqual(sparse.scan_forward(4), 500)
+        self.assertEqual(sparse.scan_forward(999), -1)
+        self.assertEqual(dense.scan_forward(3), 4)
+
+        self.assertEqual(pablo.create_idx_ms(sparse, 64), pablo.create_idx_ms(sparse_bits, 64))
+        bp_bit_streams = [0]
+        pablo.apply_pdep(bp_bit_streams, 0, sparse, int("101", 2))
+        self.assertEqual(bp_bit_streams[0], (1 << 3) | (1 << 998))
+
+        runs_ms = pablo.MarkerStream.from_positions([3, 4, 5, 500, 998, 999], length)
+        self.assertTrue(runs_ms.is_sparse)
+        self.assertEqual(pablo.get_runs(runs_ms), [(3, 3), (500, 1), (998, 2)])
+        self.assertEqual(pablo.get_runs(runs_ms), pablo.get_runs(runs_ms.bits))
+        source = pablo.StreamSet.transpose_in(b"abcdef")
+        sparse_set = pablo.StreamSet(length)
+        sparse_set.pdep_all(runs_ms, source)
+        dense_set = pablo.StreamSet(length)
+        dense_set.pdep_all(runs_ms.bits, source)
+        self.assertEqual(list(sparse_set), list(dense_set))
+        self.assertEqual(sparse_set.pext_all(runs_ms).transpose_out(), "abcdef")
+
 if __name__ == '__main__':
     unittest.main()
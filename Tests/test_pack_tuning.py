@@ -0,0 +1,68 @@
+"""
+Contains tests for the functions in pack_tuning.py.
+"""
+import unittest
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import pack_tuning
+from src import csv_json_transducer
+
+class TestPackTuningMethods(unittest.TestCase):
+    """Unit and integration tests for automatic pack size selection."""
+
+    def test_count_nonempty_packs(self):
+        """Only packs with a set bit are counted."""
+        window = (1 << 3) | (1 << 17) | (1 << 18)
+        self.assertEqual(pack_tuning.count_nonempty_packs(window, 32, 8), 2)
+        self.assertEqual(pack_tuning.count_nonempty_packs(window, 32, 4), 2)
+        self.assertEqual(pack_tuning.count_nonempty_packs(window, 32, 2), 3)
+
+    def test_sample_windows(self):
+        """Short streams are sampled completely, long ones at evenly spaced windows."""
+        windows, window_bits, scale = pack_tuning.sample_windows((1 << 100) | 1, 101,
+                                                                 sample_bits=64)
+        self.assertEqual((windows, window_bits, scale), ([1, 1 << 36], 64, 1.0))
+        windows, _, scale = pack_tuning.sample_windows(0, 64 * 100, num_samples=10,
+                                                       sample_bits=64)
+        self.assertEqual(len(windows), 10)
+        self.assertEqual(scale, 10.0)
+
+    def test_choose_pack_size(self):
+        """Dense streams get large packs, sparse streams smaller ones."""
+        num_bits = 1 << 16
+        dense = int("10" * (num_bits // 2), 2)
+        choice = pack_tuning.choose_pack_size(dense, num_bits)
+        self.assertEqual(choice.pack_size, max(pack_tuning.CANDIDATE_PACK_SIZES))
+        self.assertEqual(choice.nonempty_fraction, 1.0)
+        self.assertEqual(choice.index_depth, 1)
+
+        sparse = sum(1 << posn for posn in range(0, num_bits, 700))
+        choice = pack_tuning.choose_pack_size(sparse, num_bits)
+        self.assertEqual(choice.pack_size, 256)
+        self.assertLess(choice.nonempty_fraction, 0.5)
+        for pack_size in pack_tuning.CANDIDATE_PACK_SIZES:
+            self.assertLessEqual(choice.cost,
+                                 pack_tuning.describe_pack_size(pack_size, sparse, num_bits).cost)
+
+    def test_auto_mode(self):
+        """Auto mode transduces the same as a fixed pack size and records its choice."""
+        columns = ["col A", "gul", "chaava", "dabu"]
+        path = "Resources/Test/unicode_test_large.csv"
+        stats = {}
+        result = csv_json_transducer.main(pack_tuning.AUTO_PACK_SIZE, columns, path,
+                                          verbose=False, stats=stats)
+        self.assertEqual(result, csv_json_transducer.main(64, columns, path, verbose=False))
+        self.assertIn(stats["pack_size"], pack_tuning.CANDIDATE_PACK_SIZES)
+        self.assertEqual(sorted(stats), ["index_depth", "nonempty_pack_fraction", "pack_cost",
+                                         "pack_size"])
+
+if __name__ == '__main__':
+    unittest.main()
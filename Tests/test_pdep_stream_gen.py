@@ -14,7 +14,8 @@ sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
 
 from src.transducer_target_enums import TransductionTarget
 from src import pablo
-from src.json_converter import JSONConverter
+from src.converter import Converter
+from src.json_converter import JSONConverter, ROW_SHAPE_CACHE, MINIFIED, COMPACT
 from Tests import helper_functions
 
 class TestPDEPStreamGenMethods(unittest.TestCase):
@@ -92,5 +93,57 @@ class TestPDEPStreamGenMethods(unittest.TestCase):
 
         self.assertEqual(actual_pdep_marker_stream.value, int(expected_pdep_ms, 2))
 
+    def test_multiple_rows(self):
+        """Row templates are concatenated with the boilerplate between JSON objects.
+
+        Compare against the field-at-a-time Converter.create_pdep_stream.
+        """
+        csv_column_names = ["col1", "col2", "col3"]
+        field_widths = [3, 0, 3, 5, 3, 1, 3, 0, 3]
+        converter = JSONConverter(field_widths, csv_column_names)
+        self.assertEqual(converter.create_pdep_stream(), Converter.create_pdep_stream(converter))
+
+    def test_single_column_rows(self):
+        """Each single-column row is wrapped in its own JSON object."""
+        converter = JSONConverter([1, 2], ["x"])
+        bpb_stream = converter.create_bpb_stream()
+        self.assertEqual(bpb_stream, '[\n    {\n        "x": _\n    },\n    {\n        "x": __\n    }\n]')
+        expected_pdep_ms = "".join("1" if char == "_" else "0" for char in bpb_stream)[::-1]
+        self.assertEqual(converter.create_pdep_stream(), int(expected_pdep_ms, 2))
+
+    def test_row_shape_cache(self):
+        """Repeated row shapes are built once and then looked up."""
+        ROW_SHAPE_CACHE.clear()
+        converter = JSONConverter([2, 3] * 50 + [4, 4], ["a", "b"])
+        converter.create_pdep_stream()
+        self.assertEqual(ROW_SHAPE_CACHE.misses, 2)
+        self.assertEqual(ROW_SHAPE_CACHE.hits, 49)
+        converter.create_bpb_stream()
+        self.assertEqual(ROW_SHAPE_CACHE.misses, 2)
+
+    def test_layouts(self):
+        """The boilerplate and the per-field boilerplate byte counts follow the layout."""
+        csv_column_names = ["col1", "é"]
+        field_widths = [3, 0, 1, 2]
+        converter = JSONConverter(field_widths, csv_column_names, MINIFIED)
+        bpb_stream = converter.create_bpb_stream()
+        self.assertEqual(bpb_stream, '[{"col1":___,"é":},{"col1":_,"é":__}]')
+        self.assertEqual(converter.create_pdep_stream(), Converter.create_pdep_stream(converter))
+        self.assertEqual(converter.output_length(), len(bpb_stream.encode('utf-8')))
+        converter = JSONConverter(field_widths, csv_column_names, "compact")
+        self.assertEqual(converter.create_bpb_stream(),
+                         '[\n{"col1": ___, "é": },\n{"col1": _, "é": __}\n]')
+        self.assertEqual(converter.create_pdep_stream(), Converter.create_pdep_stream(converter))
+        self.assertEqual(JSONConverter([], ["a"], MINIFIED).create_bpb_stream(), "[]")
+        with self.assertRaises(ValueError):
+            JSONConverter([], ["a"], "tabbed")
+
+    def test_row_shape_cache_layouts(self):
+        """Row templates are cached per layout."""
+        ROW_SHAPE_CACHE.clear()
+        JSONConverter([2, 3], ["a", "b"]).create_bpb_stream()
+        JSONConverter([2, 3], ["a", "b"], COMPACT).create_bpb_stream()
+        self.assertEqual(ROW_SHAPE_CACHE.misses, 2)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+"""
+Contains tests for the functions in profiling.py.
+"""
+import unittest
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import profiling
+from src import csv_json_transducer
+
+class TestProfilingMethods(unittest.TestCase):
+    """Unit and integration tests for column profiling."""
+
+    def test_column_profiles(self):
+        """Widths, empty fields and character checks are reported per column."""
+        profile = profiling.profile_csv_str(64, ["a", "b", "c"], "12,x é,\n-3.5,,7\n")
+        self.assertEqual(profile.num_rows, 2)
+        self.assertEqual(profile.input_bytes, 17)
+        self.assertEqual(profile.columns[0],
+                         profiling.ColumnProfile("a", 2, 4, 3.0, 6, 0, True, True))
+        self.assertEqual(profile.columns[1],
+                         profiling.ColumnProfile("b", 0, 4, 2.0, 4, 1, False, False))
+        self.assertEqual(profile.columns[2],
+                         profiling.ColumnProfile("c", 0, 1, 0.5, 1, 1, False, True))
+
+    def test_last_field(self):
+        """A bad byte just before the end of the file is found."""
+        profile = profiling.profile_csv_str(64, ["a", "b"], "1,2\n3,4x\n")
+        self.assertEqual([column.numeric for column in profile.columns], [True, False])
+
+    def test_output_length(self):
+        """The output size matches the transduced file, and can preallocate its buffer."""
+        columns = ["col A", "gul", "chaava", "dabu"]
+        path = "Resources/Test/unicode_test_large.csv"
+        profile = profiling.profile_file(64, columns, path)
+        expected = csv_json_transducer.main(64, columns, path, verbose=False).encode('utf-8')
+        self.assertEqual(profile.output_bytes, len(expected))
+        csv_file_as_bytes = open(path, 'rb').read()
+        output_buffer = csv_json_transducer.transduce_csv_to_buffer(
+            64, columns, csv_file_as_bytes, output_length=profile.output_bytes)
+        self.assertEqual(bytes(output_buffer), expected)
+        selected = csv_json_transducer.transduce_csv_str(64, columns, csv_file_as_bytes,
+                                                         selected_columns=["gul", "dabu"])
+        self.assertEqual(profiling.output_length(profile, ["gul", "dabu"]),
+                         len(selected.encode('utf-8')))
+        with self.assertRaises(ValueError):
+            csv_json_transducer.transduce_csv_to_buffer(64, columns, csv_file_as_bytes,
+                                                        output_length=10)
+
+    def test_empty_file(self):
+        """An empty file has no rows and transduces to an empty array."""
+        profile = profiling.profile_csv_str(64, ["a"], b"")
+        self.assertEqual(profile.num_rows, 0)
+        self.assertEqual(profile.output_bytes, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Contains tests for the functions in pushdown.py.
+"""
+import unittest
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import pushdown
+from src import pablo
+from src import csv_json_transducer
+
+class TestPushdownMethods(unittest.TestCase):
+    """Unit and system tests for pushing column selection into the marker streams."""
+
+    def test_project_columns(self):
+        """Unwanted columns are cleared from the pext_ms and dropped from the field widths.
+
+        csv_input:       12,abc,flap\\n1,,xy\\n
+        fields_pext_ms:  011001011110111011
+        projected:       011001011110000011
+        """
+        csv_file_as_str = "12,abc,flap\n1,,xy\n"
+        fields_pext_ms = pablo.create_pext_ms(csv_file_as_str, [",", "\n"], True)
+        projected_pext_ms, projected_field_widths = pushdown.push_down(
+            fields_pext_ms, [2, 3, 4, 1, 0, 2], 3, [0, 2])
+        self.assertEqual(projected_pext_ms, int("011001011110000011", 2))
+        self.assertEqual(projected_field_widths, [2, 4, 1, 2])
+
+    def test_selected_columns(self):
+        """Only the selected columns are transduced, in file order."""
+        result = csv_json_transducer.main(64, ["col A", "col B", "col C"], "Resources/Test/test.csv",
+                                          selected_columns=["col C", "col A"], verbose=False)
+        self.assertEqual(result, '[\n    {\n        "col A": 12,\n        "col C": flap\n    }\n]')
+
+    def test_select_rows(self):
+        """Rows are selected by comparing the literal against the column's field starts."""
+        csv_file_as_str = "1,Female\n2,Male\n3,Fem\n4,Female\n5,\n"
+        field_widths = [1, 6, 1, 4, 1, 3, 1, 6, 1, 0]
+        stream_set = pablo.StreamSet.transpose_in(csv_file_as_str)
+        self.assertEqual(pushdown.select_rows(stream_set, field_widths, 2, 1,
+                                              pushdown.RowFilter("gender", "Female")),
+                         [True, False, False, True, False])
+        self.assertEqual(pushdown.select_rows(stream_set, field_widths, 2, 1,
+                                              pushdown.RowFilter("gender", "Fem", prefix=True)),
+                         [True, False, True, True, False])
+        self.assertEqual(pushdown.select_rows(stream_set, field_widths, 2, 1,
+                                              pushdown.RowFilter("gender", "")),
+                         [False, False, False, False, True])
+
+    def test_row_filter(self):
+        """Only the selected rows (and columns) are transduced."""
+        columns = ["id", "first_name", "last_name", "email", "gender", "ip_address"]
+        result = csv_json_transducer.main(64, columns, "Resources/Test/test_multiline_big.csv",
+                                          selected_columns=["id", "gender"],
+                                          row_filter=pushdown.RowFilter("id", "2", prefix=True),
+                                          verbose=False)
+        ids = [line.split(": ")[1].rstrip(",") for line in result.split("\n") if '"id"' in line]
+        self.assertEqual(ids, ["2"] + [str(i) for i in range(20, 30)] +
+                         [str(i) for i in range(200, 251)])
+        self.assertNotIn("first_name", result)
+        self.assertEqual(result.count('"gender"'), 62)
+
+    def test_unknown_column(self):
+        """Selecting a column the file doesn't have is an error."""
+        self.assertRaises(ValueError, pushdown.get_column_indices, ["a", "b"], ["c"])
+        self.assertRaises(ValueError, pushdown.get_column_indices, ["a", "b"], [])
+
+    def test_reused_converter(self):
+        """A converter can't be reused when columns or rows are pushed down."""
+        converter = csv_json_transducer.create_converter(
+            csv_json_transducer.TransductionTarget.JSON, [], ["a", "b"])
+        self.assertEqual(csv_json_transducer.transduce_csv_str(64, ["a", "b"], "1,2\n",
+                                                               converter=converter),
+                         csv_json_transducer.transduce_csv_str(64, ["a", "b"], "1,2\n"))
+        with self.assertRaises(ValueError):
+            csv_json_transducer.transduce_csv_str(64, ["a", "b"], "1,2\n", converter=converter,
+                                                  selected_columns=["b"])
+        with self.assertRaises(ValueError):
+            csv_json_transducer.transduce_csv_str(64, ["a", "b"], "1,2\n", converter=converter,
+                                                  row_filter=pushdown.RowFilter("a", "1"))
+
+if __name__ == '__main__':
+    unittest.main()
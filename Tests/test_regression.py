@@ -0,0 +1,76 @@
+"""
+Contains tests for the functions in regression.py.
+"""
+import unittest
+import tempfile
+import random
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import regression
+from src import csv_json_transducer
+from src import pablo
+
+class TestRegressionMethods(unittest.TestCase):
+    """Unit and integration tests for the regression harness."""
+
+    def test_reference_matches_known_file(self):
+        """The reference transduction agrees with the transducer on a checked-in file."""
+        columns = ["col A", "gul", "chaava", "dabu"]
+        path = "Resources/Test/unicode_test_large.csv"
+        self.assertEqual(regression.reference_transduce(pablo.readfile(path), columns),
+                         csv_json_transducer.main(64, columns, path, verbose=False))
+        self.assertEqual(regression.reference_transduce("", ["a"]), "[\n]")
+
+    def test_generate_csv(self):
+        """Generated files have the requested shape."""
+        csv_file_as_str = regression.generate_csv(random.Random(1), 30, 5, empty_fraction=0.5)
+        rows = csv_file_as_str.split("\n")
+        self.assertEqual(rows[-1], "")
+        self.assertEqual(len(rows), 31)
+        self.assertTrue(all(row.count(",") == 4 for row in rows[:-1]))
+        self.assertIn(",,", csv_file_as_str)
+
+    def test_random_files(self):
+        """The transducer agrees with the reference on random files."""
+        self.assertEqual(regression.check_random_files(10, seed=7, max_rows=10), [])
+
+    def test_find_regressions(self):
+        """Stages slower than the tolerance allows, relative to the reference, are reported."""
+        baseline = {"tolerance": 0.2, "relative_throughput": {"transpose": 10.0, "transduce": 2.0}}
+        throughput = {"transpose": 7.0, "transduce": 1.9, "total": 0.1, "reference": 1.0}
+        self.assertEqual(regression.find_regressions(throughput, baseline),
+                         [("transpose", 7.0, 10.0)])
+        self.assertEqual(regression.find_regressions(throughput, baseline, tolerance=0.5), [])
+        self.assertEqual(regression.find_regressions(throughput, baseline, tolerance=0),
+                         [("transduce", 1.9, 2.0), ("transpose", 7.0, 10.0)])
+        # A slower machine slows the reference down as well
+        slower = {stage: value / 4 for stage, value in throughput.items()}
+        slower["transpose"] = 10.0 / 4
+        self.assertEqual(regression.find_regressions(slower, baseline), [])
+
+    def test_baseline_round_trip(self):
+        """Measured throughputs can be saved as the baseline and compared against."""
+        throughput = regression.measure_throughput(num_rows=20, repeats=1)
+        self.assertEqual(sorted(throughput),
+                         sorted(regression.STAGES + [regression.REFERENCE_STAGE]))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            baseline_path = os.path.join(temp_dir, "baseline.json")
+            regression.save_baseline(baseline_path, throughput, tolerance=0)
+            baseline = regression.load_baseline(baseline_path)
+            with open(baseline_path, 'w') as f:
+                f.write('{"tolerance": 0.25, "throughput": {"transpose": 12.5}}')
+            with self.assertRaises(ValueError):
+                regression.load_baseline(baseline_path)
+        self.assertEqual(baseline["tolerance"], 0)
+        self.assertEqual(sorted(baseline["relative_throughput"]), sorted(regression.STAGES))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Contains tests for the functions in row_index.py.
+"""
+import unittest
+import tempfile
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import row_index
+from src import csv_json_transducer
+
+BIG_CSV = "Resources/Test/test_multiline_big.csv"
+BIG_CSV_COLUMNS = ["id", "first_name", "last_name", "email", "gender", "ip_address"]
+
+class TestRowIndexMethods(unittest.TestCase):
+    """Unit and integration tests for the row-offset index."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.temp_dir.name, "big.idx")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_build_and_load(self):
+        """Checkpoints land on every Nth row, across block boundaries."""
+        built = row_index.build_row_index(BIG_CSV, 16, self.index_path, block_size=100)
+        loaded = row_index.load_row_index(self.index_path)
+        self.assertEqual(built, loaded)
+
+        with open(BIG_CSV, 'rb') as f:
+            rows = f.read().split(b"\n")
+        self.assertEqual(loaded.num_rows, 250)
+        self.assertEqual(len(loaded.offsets), 250 // 16 + 1)
+        for k, offset in enumerate(loaded.offsets):
+            self.assertEqual(offset, sum(len(row) + 1 for row in rows[:k * 16]))
+
+        # Many checkpoints per block
+        dense = row_index.build_row_index(BIG_CSV, 3, self.index_path)
+        self.assertEqual(len(dense.offsets), 250 // 3 + 1)
+        for k, offset in enumerate(dense.offsets):
+            self.assertEqual(offset, sum(len(row) + 1 for row in rows[:k * 3]))
+
+    def test_transduce_row_range(self):
+        """A range of rows transduces the same as a file containing only those rows."""
+        row_index.build_row_index(BIG_CSV, 16, self.index_path)
+        result = row_index.transduce_row_range(64, BIG_CSV_COLUMNS, BIG_CSV, 100, 105,
+                                               self.index_path)
+
+        with open(BIG_CSV, 'rb') as f:
+            rows = f.read().split(b"\n")
+        expected = csv_json_transducer.transduce_csv_str(
+            64, BIG_CSV_COLUMNS, b"".join(row + b"\n" for row in rows[100:105]).decode('utf-8'))
+        self.assertEqual(result, expected)
+        self.assertTrue(result.startswith('[\n    {\n        "id": 101,'))
+
+    def test_range_past_end(self):
+        """Ranges are clamped to the rows in the file."""
+        row_index.build_row_index(BIG_CSV, 64, self.index_path)
+        last_row = row_index.transduce_row_range(64, BIG_CSV_COLUMNS, BIG_CSV, 249, 1000,
+                                                 self.index_path)
+        self.assertIn('"id": 250,', last_row)
+        self.assertEqual(row_index.transduce_row_range(64, BIG_CSV_COLUMNS, BIG_CSV, 300, 400,
+                                                       self.index_path), "[\n]")
+
+if __name__ == '__main__':
+    unittest.main()
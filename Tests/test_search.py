@@ -0,0 +1,53 @@
+"""
+Contains tests for the functions in search.py.
+"""
+import unittest
+import re
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import search
+from src import pablo
+
+class TestSearchMethods(unittest.TestCase):
+    """Unit and integration tests for multi-pattern literal search."""
+
+    def test_offsets(self):
+        """Every occurrence is found, including overlapping ones and non-ASCII patterns."""
+        stream_set = pablo.StreamSet.transpose_in("aaa,bé\nxaab,é\n")
+        offsets = search.match_offsets(stream_set, ["aa", "é", b"b", "zz"])
+        self.assertEqual(offsets, {"aa": [0, 1, 9], "é": [5, 13], b"b": [4, 11], "zz": []})
+        with self.assertRaises(ValueError):
+            search.match_offsets(stream_set, [""])
+
+    def test_rows(self):
+        """Matches are reported by row, once per row."""
+        stream_set = pablo.StreamSet.transpose_in("1,ann\n2,bob\n3,annie\n4,ann")
+        self.assertEqual(search.match_rows(stream_set, ["ann", "bob", "\n3"]),
+                         {"ann": [0, 2, 3], "bob": [1], "\n3": [1]})
+        self.assertEqual(search.match_rows(stream_set, ["ann", "1"], whole_field=True),
+                         {"ann": [0, 3], "1": [0]})
+
+    def test_matches_regex(self):
+        """On a real file, the matches agree with a plain string search."""
+        path = "Resources/Test/test_multiline_big.csv"
+        data = pablo.readfile_bytes(path)
+        patterns = [b"Female", b".com", b"192.", b"@g"]
+        offsets = search.search_file(path, patterns, rows=False)
+        for pattern in patterns:
+            expected = [m.start() for m in re.finditer(b"(?=" + re.escape(pattern) + b")", data)]
+            self.assertEqual(offsets[pattern], expected)
+        rows = search.search_file(path, patterns)
+        lines = data.split(b"\n")
+        for pattern in patterns:
+            self.assertEqual(rows[pattern], [i for i, line in enumerate(lines) if pattern in line])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Contains tests for the functions in template_converter.py.
+"""
+import unittest
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import template_converter
+from src import csv_json_transducer
+from src.converter import Converter
+from src.template_converter import FormatSpec
+
+XML = FormatSpec("<rows>\n", "\n</rows>", "<rows/>", "  <row", "/>", "\n", " {name}=\"", "\"",
+                 "")
+TSV = FormatSpec("", "\n", "", "", "", "\n", "", "", "\t")
+
+class TestTemplateConverterMethods(unittest.TestCase):
+    """Unit and integration tests for the format template compiler."""
+
+    def test_compile_format(self):
+        """The boilerplate between values is precomputed, with lengths in UTF-8 bytes."""
+        compiled = template_converter.compile_format(XML, ("id", "é"))
+        self.assertEqual(compiled.gaps, ('  <row id="', '" é="'))
+        self.assertEqual(compiled.gap_lens, (11, 6))
+        self.assertEqual(compiled.tail, '"/>')
+        with self.assertRaises(ValueError):
+            template_converter.compile_format(XML, ())
+
+    def test_boilerplate_and_pdep(self):
+        """The compiled boilerplate and PDEP masks agree with the field-at-a-time counts."""
+        converter = template_converter.compile_converter(XML, ["id", "é"], [1, 3, 2, 0])
+        bpb_stream = converter.create_bpb_stream()
+        self.assertEqual(bpb_stream,
+                         '<rows>\n  <row id="_" é="___"/>\n  <row id="__" é=""/>\n</rows>')
+        self.assertEqual(converter.create_pdep_stream(), Converter.create_pdep_stream(converter))
+        expected_pdep_ms = "".join("1" if char == "_" else "0"
+                                   for char in bpb_stream.replace("é", "éé"))
+        self.assertEqual(converter.create_pdep_stream(), int(expected_pdep_ms[::-1], 2))
+        self.assertEqual(converter.output_length(), len(bpb_stream.encode('utf-8')))
+
+    def test_single_column_pdep(self):
+        """With a single column only the first field starts the file and only the last
+        ends it, though every field starts and ends a row."""
+        converter = template_converter.compile_converter(XML, ["id"], [1, 2, 3])
+        bpb_stream = converter.create_bpb_stream()
+        self.assertEqual(bpb_stream,
+                         '<rows>\n  <row id="_"/>\n  <row id="__"/>\n  <row id="___"/>\n</rows>')
+        expected_pdep_ms = "".join("1" if char == "_" else "0" for char in bpb_stream)
+        self.assertEqual(converter.create_pdep_stream(), int(expected_pdep_ms[::-1], 2))
+        self.assertEqual(Converter.create_pdep_stream(converter), int(expected_pdep_ms[::-1], 2))
+
+    def test_transduce(self):
+        """A spec can be passed to the transducer as the target format."""
+        csv_file_as_str = "1,ab\n22,\n"
+        self.assertEqual(csv_json_transducer.transduce_csv_str(64, ["id", "name"],
+                                                               csv_file_as_str, XML),
+                         '<rows>\n  <row id="1" name="ab"/>\n  <row id="22" name=""/>\n</rows>')
+        self.assertEqual(csv_json_transducer.transduce_csv_str(64, ["id", "name"],
+                                                               csv_file_as_str, TSV),
+                         "1\tab\n22\t\n")
+        self.assertEqual(csv_json_transducer.transduce_csv_str(64, ["id", "name"],
+                                                               csv_file_as_str, TSV,
+                                                               selected_columns=["name"]),
+                         "ab\n\n")
+        self.assertEqual(csv_json_transducer.transduce_csv_str(64, ["id"], "", XML), "<rows/>")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Contains tests for the functions in transcoder.py.
+"""
+import unittest
+import tempfile
+
+# workaround to get the import statements below working properly. Required
+# if this module can be run as "main". Adds PythonPrototypes directory to sys path
+import sys
+import os
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import transcoder
+from src import csv_json_transducer
+from src.transducer_target_enums import SourceFormats
+
+class TestTranscoderMethods(unittest.TestCase):
+    """Unit and integration tests for UTF-16LE and Latin-1 transcoding."""
+
+    def test_latin1(self):
+        """Every Latin-1 byte transcodes to its UTF-8 encoding."""
+        byte_stream = bytes(range(256))
+        result = transcoder.transcode_latin1(byte_stream).transpose_out(decode=False)
+        self.assertEqual(result, byte_stream.decode('latin-1').encode('utf-8'))
+        self.assertEqual(transcoder.transcode_latin1(b"").length, 0)
+
+    def test_utf16le(self):
+        """One, two, three and four byte UTF-8 sequences, including surrogate pairs."""
+        text = "a,é߿,ࠀ€퟿￿\n\U00010000\U0010ffff\U0001f600\n"
+        result = transcoder.transcode_utf16le(text.encode('utf-16-le'))
+        self.assertEqual(result.transpose_out(decode=False), text.encode('utf-8'))
+        self.assertEqual(result.length, len(text.encode('utf-8')))
+
+    def test_utf16le_bom(self):
+        """A leading byte order mark isn't transcoded."""
+        result = transcoder.transcode_utf16le(b"\xff\xfe" + "1,2\n".encode('utf-16-le'))
+        self.assertEqual(result.transpose_out(), "1,2\n")
+
+    def test_utf16le_invalid(self):
+        """Odd length input and unpaired surrogates are rejected."""
+        with self.assertRaises(ValueError):
+            transcoder.transcode_utf16le(b"a\x00b")
+        with self.assertRaises(ValueError) as context:
+            transcoder.transcode_utf16le(b"a\x00\x00\xd8b\x00")  # high surrogate, no low
+        self.assertEqual(context.exception.args[1], 2)
+        with self.assertRaises(ValueError) as context:
+            transcoder.transcode_utf16le(b"a\x00b\x00\x00\xdc")  # low surrogate, no high
+        self.assertEqual(context.exception.args[1], 4)
+
+    def test_main(self):
+        """Files in every source encoding transduce the same as their UTF-8 equivalent."""
+        columns = ["col A", "gul", "chaava", "dabu"]
+        path = "Resources/Test/unicode_test_large.csv"
+        expected = csv_json_transducer.main(64, columns, path, verbose=False)
+        with open(path, 'rb') as f:
+            text = f.read().decode('utf-8')
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            utf16_path = os.path.join(temp_dir, "utf16.csv")
+            with open(utf16_path, 'wb') as f:
+                f.write(text.encode('utf-16'))  # with a byte order mark
+            self.assertEqual(csv_json_transducer.main(64, columns, utf16_path,
+                                                      source_format=SourceFormats.CSV_UTF16LE,
+                                                      verbose=False),
+                             expected)
+
+            latin1_path = os.path.join(temp_dir, "latin1.csv")
+            with open(latin1_path, 'wb') as f:
+                f.write("café,naïve\nÿ,\n".encode('latin-1'))
+            result = csv_json_transducer.main(64, ["a", "b"], latin1_path,
+                                              source_format=SourceFormats.CSV_LATIN1,
+                                              verbose=False)
+            self.assertIn('"a": café,', result)
+            self.assertIn('"a": ÿ,', result)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+Contains the functions used to aggregate the values of a single column without transducing.
+
+Jobs that only need the number of rows per value of a column, or the number of distinct
+values, don't need any JSON. Here the column selection is pushed down into the PEXT marker
+stream (see pushdown), PEXT extracts just that column's field bytes, and the values are
+sliced out of the extracted bytes with the field widths. No boilerplate or PDEP streams are
+built. Files are processed a chunk of complete rows at a time, and each chunk's values are
+added to an aggregator:
+    CountAggregator counts the rows per value, exactly.
+    DistinctSketch estimates the number of distinct values (HyperLogLog) in fixed memory.
+
+Example:
+    counts = aggregate_file(64, ["id", "name", "gender"], "people.csv", "gender").counts
+"""
+import sys
+import os
+import math
+import hashlib
+from collections import Counter
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import csv_json_transducer
+from src import compression
+from src.chunking import split_complete_rows
+
+class CountAggregator:
+    """Counts the rows per value. The counts are in self.counts, a Counter."""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def update(self, values):
+        """Add the values (str) of a chunk."""
+        self.counts.update(values)
+
+    def merge(self, other):
+        """Add the counts of another CountAggregator, e.g. one for another file."""
+        self.counts.update(other.counts)
+
+class DistinctSketch:
+    """Estimates the number of distinct values with a HyperLogLog sketch.
+
+    Uses 2 ** precision one-byte registers. The standard error of the estimate is about
+    1.04 / sqrt(2 ** precision), i.e. 1.6% for the default precision.
+    """
+
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 16:
+            raise ValueError("Sketch precision must be between 4 and 16:", precision)
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        """Add a value (str or bytes)."""
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        # 64 bits of SHA-1, since blake2b needs Python 3.6
+        hashed = int.from_bytes(hashlib.sha1(value).digest()[:8], 'little')
+        index = hashed & (len(self.registers) - 1)
+        # Position of the first 1 bit in the remaining 64 - precision bits
+        rank = 64 - self.precision - (hashed >> self.precision).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        """Add the values of a chunk."""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Add the values seen by another sketch with the same precision."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision.")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        """Return the estimated number of distinct values (int)."""
+        num_registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / num_registers)
+        raw = alpha * num_registers ** 2 / sum(2.0 ** -rank for rank in self.registers)
+        empty_registers = self.registers.count(0)
+        if raw <= 2.5 * num_registers and empty_registers:
+            # Small cardinalities: linear counting is more accurate
+            return round(num_registers * math.log(num_registers / empty_registers))
+        return round(raw)
+
+def extract_column_values(pack_size, csv_column_names, csv_file_as_str, column):
+    """Return the values of column, in file order.
+
+    Args:
+        pack_size: See csv_json_transducer.main.
+        csv_column_names: See csv_json_transducer.main.
+        csv_file_as_str (str, bytes or StreamSet): See csv_json_transducer.transduce_csv_str.
+        column (str): The column whose values are returned.
+    Returns:
+        A list of str.
+    Raises:
+        ValueError: If the file isn't valid UTF-8, contains malformed rows, or column isn't
+            one of csv_column_names.
+    """
+    prepared = csv_json_transducer.prepare_transduction(pack_size, csv_column_names,
+                                                        csv_file_as_str,
+                                                        selected_columns=[column])
+    value_bytes = prepared.csv_stream_set.pext_all(prepared.fields_pext_ms) \
+                                         .transpose_out(decode=False)
+    values = []
+    posn = 0
+    for fw in prepared.field_widths:
+        values.append(value_bytes[posn:posn + fw].decode('utf-8'))
+        posn += fw
+    return values
+
+def aggregate_csv_str(pack_size, csv_column_names, csv_file_as_str, column, aggregator=None,
+                      key=None):
+    """Add the values of column to aggregator.
+
+    Args:
+        aggregator: A CountAggregator (the default) or DistinctSketch, or any object with
+            an update(values) method.
+        key: If provided, a function applied to each value before it's aggregated, e.g. to
+            group email addresses by domain.
+        Others: See extract_column_values.
+    Returns:
+        The aggregator.
+    """
+    if aggregator is None:
+        aggregator = CountAggregator()
+    values = extract_column_values(pack_size, csv_column_names, csv_file_as_str, column)
+    aggregator.update(values if key is None else map(key, values))
+    return aggregator
+
+def aggregate_file(pack_size, csv_column_names, path_to_file, column, aggregator=None,
+                   key=None, chunk_size=1 << 20):
+    """Aggregate the values of column in the (possibly compressed) file at path_to_file.
+
+    The file is read a chunk of complete rows at a time, so only a chunk's streams are in
+    memory at once. See aggregate_csv_str for the arguments.
+
+    Returns:
+        The aggregator.
+    """
+    if aggregator is None:
+        aggregator = CountAggregator()
+    with compression.DecompressingReader(path_to_file, chunk_size) as reader:
+        remainder = b""
+        for data in reader:
+            complete_rows, remainder = split_complete_rows(remainder + data)
+            aggregate_csv_str(pack_size, csv_column_names, complete_rows, column, aggregator,
+                              key)
+        # A trailing partial row is aggregated as-is, so it fails verification like it
+        # would when processing the whole file at once.
+        aggregate_csv_str(pack_size, csv_column_names, remainder, column, aggregator, key)
+    return aggregator
@@ -0,0 +1,166 @@
+"""
+Contains an asyncio driver that overlaps reading, transducing and writing.
+
+The input file is read a chunk at a time, each chunk of complete rows is transduced in an
+executor, and finished chunks are written out while later chunks are still being read and
+transduced. The stages are connected by bounded queues, so a slow stage applies
+backpressure to the stages before it rather than letting chunks pile up in memory.
+Chunks are written in the order they were read.
+
+Compressed input and output files are (de)compressed by the read and write threads (see
+compression), so codec time overlaps with transduction too.
+"""
+import sys
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src.chunking import split_complete_rows, transduce_rows
+from src import compression
+from src.json_converter import PRETTY, get_layout
+
+# Marks the end of a queue.
+_END = None
+
+def transduce_file(pack_size, csv_column_names, path_to_file, output_path,
+                   chunk_size=1 << 20, max_pending_chunks=4, num_workers=1, layout=PRETTY):
+    """Run transduce_file_async to completion in a new event loop. See transduce_file_async."""
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(transduce_file_async(
+            pack_size, csv_column_names, path_to_file, output_path, chunk_size,
+            max_pending_chunks, num_workers, layout=layout))
+    finally:
+        loop.close()
+
+async def transduce_file_async(pack_size, csv_column_names, path_to_file, output_path,
+                               chunk_size=1 << 20, max_pending_chunks=4, num_workers=1,
+                               executor=None, layout=PRETTY):
+    """Transduce the CSV file at path_to_file to a JSON file at output_path.
+
+    Args:
+        pack_size: See csv_json_transducer.main.
+        csv_column_names: See csv_json_transducer.main.
+        path_to_file (str): The CSV file to transduce.
+        output_path (str): Where the JSON file is written.
+        chunk_size (int): Number of bytes read at a time. Chunks are cut back to the last
+            complete row, so the chunks that are transduced can be slightly smaller or larger.
+        max_pending_chunks (int): Capacity of each of the queues between the stages.
+        num_workers (int): Number of worker processes used to transduce chunks. Ignored if
+            executor is provided.
+        executor (concurrent.futures.Executor): Executor chunks are transduced in.
+        layout (JSONLayout or str): See csv_json_transducer.main.
+    """
+    layout = get_layout(layout)
+    loop = asyncio.get_event_loop()
+    chunk_queue = asyncio.Queue(maxsize=max_pending_chunks)
+    result_queue = asyncio.Queue(maxsize=max_pending_chunks)
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+    # File I/O is blocking, so reads and writes each get a thread of their own.
+    io_executor = ThreadPoolExecutor(max_workers=2)
+
+    stages = [asyncio.ensure_future(read_chunks(loop, io_executor, path_to_file, chunk_size,
+                                                chunk_queue)),
+              asyncio.ensure_future(dispatch_chunks(loop, executor, pack_size, csv_column_names,
+                                                    chunk_queue, result_queue, layout))]
+    try:
+        await write_chunks(loop, io_executor, output_path, result_queue, layout)
+        await asyncio.gather(*stages)
+    finally:
+        for stage in stages:
+            stage.cancel()
+        # Let the cancelled stages finish before their executors are shut down
+        await asyncio.gather(*stages, return_exceptions=True)
+        discard_results(result_queue)
+        io_executor.shutdown(wait=True)
+        if owns_executor:
+            executor.shutdown(wait=True)
+
+def discard_results(result_queue):
+    """Cancel the futures left in result_queue after a failed run, retrieving the errors of
+    those that already failed so they aren't logged as never retrieved."""
+    while not result_queue.empty():
+        future = result_queue.get_nowait()
+        if future is _END:
+            continue
+        if future.done() and not future.cancelled():
+            future.exception()
+        else:
+            future.cancel()
+
+async def read_chunks(loop, io_executor, path_to_file, chunk_size, chunk_queue):
+    """Read path_to_file and queue it a chunk of complete rows at a time.
+
+    A trailing partial row at the end of the file is queued as-is, so that it fails
+    verification like it would when transducing the whole file at once. Any error is
+    queued in place of the end of the queue.
+    """
+    end = _END
+    try:
+        with compression.open_input(path_to_file) as f:
+            remainder = b""
+            while True:
+                data = await loop.run_in_executor(io_executor, f.read, chunk_size)
+                if not data:
+                    break
+                complete_rows, remainder = split_complete_rows(remainder + data)
+                if complete_rows:
+                    await chunk_queue.put(complete_rows)
+            if remainder:
+                await chunk_queue.put(remainder)
+    except asyncio.CancelledError:
+        # The later stages are gone, so nothing is left waiting on the queue
+        raise
+    except Exception as error:  # e.g. zlib.error on corrupt gzip data
+        end = error
+    await chunk_queue.put(end)
+
+async def dispatch_chunks(loop, executor, pack_size, csv_column_names, chunk_queue,
+                          result_queue, layout=PRETTY):
+    """Submit each queued chunk to executor and queue the resulting futures in order.
+
+    An error queued by read_chunks ends chunk_queue, and is queued as a failed future.
+    """
+    while True:
+        chunk = await chunk_queue.get()
+        if chunk is _END:
+            break
+        if isinstance(chunk, Exception):
+            future = loop.create_future()
+            future.set_exception(chunk)
+            await result_queue.put(future)
+            break
+        future = loop.run_in_executor(executor, transduce_rows, pack_size,
+                                      csv_column_names, chunk, layout)
+        await result_queue.put(future)
+    await result_queue.put(_END)
+
+async def write_chunks(loop, io_executor, output_path, result_queue, layout=PRETTY):
+    """Write each transduced chunk to output_path as soon as it (and all before it) is done."""
+    layout = get_layout(layout)
+    array_open = layout.array_open.encode('utf-8')
+    row_separator = layout.row_separator.encode('utf-8')
+    with compression.open_output(output_path) as f:
+        rows_written = False
+        while True:
+            future = await result_queue.get()
+            if future is _END:
+                break
+            body = await future
+            if body:
+                await loop.run_in_executor(io_executor, f.write,
+                                           (row_separator if rows_written else array_open) +
+                                           body)
+                rows_written = True
+        # An input file without rows still produces an (empty) JSON array.
+        closing = layout.array_close if rows_written else layout.empty_array
+        await loop.run_in_executor(io_executor, f.write, closing.encode('utf-8'))
@@ -0,0 +1,212 @@
+"""
+Contains the batch driver used to transduce many files that share a column set.
+
+Files are spread across a pool of worker processes. Each worker keeps one converter per
+column set and reuses it (and its encoded column name boilerplate) for every file it is
+handed, rather than rebuilding everything from scratch for each file.
+
+Can also be run from the command line, e.g.
+    python src/batch.py --columns id,first_name,email --output-dir out "data/*.csv"
+"""
+import sys
+import os
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src.transducer_target_enums import TransductionTarget
+from src.json_converter import PRETTY, LAYOUTS, get_layout
+from src import pablo
+from src import csv_json_transducer
+from src import pack_tuning
+from src import compression
+
+# Converters owned by the current (worker) process, keyed by (target format, column names,
+# layout).
+_converters = {}
+
+def expand_paths(paths):
+    """Expand a glob pattern, or a list of paths and glob patterns, into a sorted list of files.
+
+    Entries that aren't glob patterns are kept as-is so that missing files are reported
+    per file rather than silently dropped.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    expanded = []
+    for path in paths:
+        if glob.has_magic(path):
+            expanded.extend(sorted(glob.glob(path)))
+        else:
+            expanded.append(path)
+    return expanded
+
+def get_converter(target_format, csv_column_names, layout=PRETTY):
+    """Return this process's converter for the given column set and layout, creating it if
+    needed."""
+    layout = get_layout(layout)
+    key = (target_format, tuple(csv_column_names), layout)
+    converter = _converters.get(key)
+    if converter is None:
+        converter = csv_json_transducer.create_converter(target_format, [], csv_column_names,
+                                                         layout)
+        _converters[key] = converter
+    return converter
+
+def output_path_for(path_to_file, output_dir):
+    """Return the path of the output file for path_to_file, e.g. out/a.csv -> out/a.json.
+    A compression extension is dropped too, e.g. out/a.csv.gz -> out/a.json."""
+    base_name = os.path.basename(path_to_file)
+    if compression.codec_from_extension(base_name) is not compression.NONE:
+        base_name = os.path.splitext(base_name)[0]
+    base_name = os.path.splitext(base_name)[0]
+    return os.path.join(output_dir, base_name + ".json")
+
+def transduce_file(pack_size, csv_column_names, path_to_file, output_dir=None,
+                   target_format=TransductionTarget.JSON, layout=PRETTY):
+    """Transduce a single file of a batch. Runs inside a worker process.
+
+    Returns:
+        A dict with the per-file stats: path, input_bytes, output_bytes, seconds,
+        throughput (input MB/s) and the pack size stats added by
+        csv_json_transducer.transduce_csv_str (pack_size, pack_cost, ...). Contains an error
+        message instead of output stats if the file could not be transduced. If output_dir
+        is None the transduced file is returned under "output", otherwise it is written to
+        output_dir and the path is returned under "output_path".
+    """
+    result = {"path": path_to_file}
+    start = time.perf_counter()
+    try:
+        csv_file_as_bytes = compression.read_file(path_to_file)
+        converter = get_converter(target_format, csv_column_names, layout)
+        if output_dir is None:
+            output_byte_stream = csv_json_transducer.transduce_csv_str(
+                pack_size, csv_column_names, csv_file_as_bytes, target_format, converter,
+                stats=result, layout=converter.layout)
+            result["output"] = output_byte_stream
+            output_bytes = len(output_byte_stream.encode('utf-8'))
+        else:
+            result["output_path"] = output_path_for(path_to_file, output_dir)
+            fd = os.open(result["output_path"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            try:
+                output_bytes = csv_json_transducer.transduce_csv_to_fd(
+                    pack_size, csv_column_names, csv_file_as_bytes, fd, target_format,
+                    converter, stats=result, layout=converter.layout)
+            finally:
+                os.close(fd)
+    except (OSError, ValueError) as error:
+        result["error"] = str(error)
+        return result
+    seconds = time.perf_counter() - start
+    result["input_bytes"] = len(csv_file_as_bytes)
+    result["output_bytes"] = output_bytes
+    result["seconds"] = seconds
+    result["throughput"] = _megabytes_per_second(result["input_bytes"], seconds)
+    return result
+
+def transduce_batch(pack_size, csv_column_names, paths, output_dir=None, num_workers=None,
+                    target_format=TransductionTarget.JSON, layout=PRETTY):
+    """Transduce every file in paths using a pool of worker processes.
+
+    Args:
+        pack_size: See csv_json_transducer.main.
+        csv_column_names (list of str): The column names shared by every file in the batch.
+        paths: A glob pattern, or a list of paths and/or glob patterns.
+        output_dir (str): Directory the transduced files are written to. If None, the
+            transduced files are returned in the per-file results instead.
+        num_workers (int): Number of worker processes. Defaults to the number of CPUs.
+            If 1, the files are transduced in the calling process.
+        target_format: The format we want to transduce the files to.
+        layout (JSONLayout or str): See csv_json_transducer.main.
+    Returns:
+        A tuple (file_results, aggregate). file_results is a list containing the dict
+        returned by transduce_file for each file, in the order the files were given.
+        aggregate is a dict with the stats for the batch as a whole.
+    """
+    paths = expand_paths(paths)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    if num_workers == 1 or len(paths) <= 1:
+        file_results = [transduce_file(pack_size, csv_column_names, path, output_dir,
+                                       target_format, layout) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            futures = [pool.submit(transduce_file, pack_size, csv_column_names, path,
+                                   output_dir, target_format, layout) for path in paths]
+            file_results = [future.result() for future in futures]
+    wall_seconds = time.perf_counter() - start
+
+    return file_results, aggregate_stats(file_results, wall_seconds, num_workers)
+
+def aggregate_stats(file_results, wall_seconds, num_workers):
+    """Combine per-file stats into stats for the whole batch."""
+    succeeded = [result for result in file_results if "error" not in result]
+    input_bytes = sum(result["input_bytes"] for result in succeeded)
+    return {
+        "files": len(file_results),
+        "failed": len(file_results) - len(succeeded),
+        "workers": num_workers,
+        "input_bytes": input_bytes,
+        "output_bytes": sum(result["output_bytes"] for result in succeeded),
+        "cpu_seconds": sum(result["seconds"] for result in succeeded),
+        "wall_seconds": wall_seconds,
+        "throughput": _megabytes_per_second(input_bytes, wall_seconds),
+    }
+
+def format_report(file_results, aggregate):
+    """Format per-file and aggregate throughput as a human readable report."""
+    lines = []
+    for result in file_results:
+        if "error" in result:
+            lines.append("{}: FAILED ({})".format(result["path"], result["error"]))
+        else:
+            lines.append("{}: {} bytes in {:.4f}s ({:.3f} MB/s, pack size {}, cost {})".format(
+                result["path"], result["input_bytes"], result["seconds"], result["throughput"],
+                result["pack_size"], result["pack_cost"]))
+    lines.append("{} files ({} failed), {} bytes in {:.4f}s on {} workers ({:.3f} MB/s)".format(
+        aggregate["files"], aggregate["failed"], aggregate["input_bytes"],
+        aggregate["wall_seconds"], aggregate["workers"], aggregate["throughput"]))
+    return "\n".join(lines)
+
+def _megabytes_per_second(num_bytes, seconds):
+    return num_bytes / seconds / 1e6 if seconds > 0 else 0.0
+
+def parse_pack_size(value):
+    """Parse a --pack-size argument: an int, or pack_tuning.AUTO_PACK_SIZE."""
+    return value if value == pack_tuning.AUTO_PACK_SIZE else int(value)
+
+def parse_args(argv):
+    """Parse the command line arguments of the batch CLI."""
+    parser = argparse.ArgumentParser(description="Transduce a batch of CSV files to JSON.")
+    parser.add_argument("paths", nargs="+", help="CSV files and/or glob patterns to transduce.")
+    parser.add_argument("--columns", required=True,
+                        help="Comma separated column names shared by every file.")
+    parser.add_argument("--pack-size", type=parse_pack_size, default=64,
+                        help="A power of two, or 'auto' to choose from the delimiter density.")
+    parser.add_argument("--output-dir", default="out",
+                        help="Directory the JSON files are written to.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), default="pretty",
+                        help="Layout of the JSON output.")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    ARGS = parse_args(sys.argv[1:])
+    FILE_RESULTS, AGGREGATE = transduce_batch(ARGS.pack_size, ARGS.columns.split(","), ARGS.paths,
+                                              ARGS.output_dir, ARGS.workers,
+                                              layout=ARGS.layout)
+    print(format_report(FILE_RESULTS, AGGREGATE))
+    sys.exit(1 if AGGREGATE["failed"] else 0)
@@ -0,0 +1,170 @@
+"""
+Contains a chunked transduction driver that can be resumed after it dies part way through.
+
+chunking.transduce_file starts over from the beginning if it's interrupted, which on a very
+large file can throw away hours of work. This driver periodically saves a checkpoint next
+to the output: how far it has read into the (decompressed) input, how many output bytes are
+safely on disk, how many rows have been written, and the carried field state, i.e. the
+partial row left over at the end of the last chunk that was read. Before a checkpoint is
+saved the output is flushed and synced, and the checkpoint itself is written to a temporary
+file and renamed into place, so it never describes output that isn't on disk.
+
+A restarted run loads the checkpoint, truncates the output to the checkpointed size
+(dropping whatever was written after it), restores the carried row and continues reading
+at the checkpointed input offset. Since it knows whether rows have already been written it
+picks the right separator for the next row, and the finished file is identical to that of
+an uninterrupted run. The checkpoint is removed once the output is complete.
+
+The output can't be compressed: a compressed stream can't be truncated and appended to.
+The input may be.
+
+Example:
+    transduce_file(64, ["id", "name"], "huge.csv.gz", "huge.json")  # killed at 90%
+    transduce_file(64, ["id", "name"], "huge.csv.gz", "huge.json")  # picks up from there
+"""
+import sys
+import os
+import json
+import base64
+from collections import namedtuple
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import chunking
+from src import compression
+from src.json_converter import PRETTY, get_layout
+
+# Extension added to the output path to get the default checkpoint path.
+CHECKPOINT_EXTENSION = ".checkpoint"
+
+# The progress of a chunked run.
+# input_offset (int): Number of decompressed input bytes read so far.
+# output_offset (int): Number of output bytes written (and synced) so far.
+# rows_emitted (int): Number of rows written so far.
+# remainder (bytes): The partial row at the end of the input read so far, which is prepended
+#     to the next chunk.
+# job (dict): Identifies the run: the input file (path, size, mtime), the columns and the
+#     layout. A checkpoint is only resumed by a run with the same job.
+Checkpoint = namedtuple("Checkpoint", ["input_offset", "output_offset", "rows_emitted",
+                                       "remainder", "job"])
+
+def job_description(csv_column_names, path_to_file, layout=PRETTY):
+    """Return the job of a Checkpoint for transducing path_to_file. See Checkpoint."""
+    stat = os.stat(path_to_file)
+    return {"path": os.path.abspath(path_to_file), "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns, "columns": list(csv_column_names),
+            "layout": list(get_layout(layout))}
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """Atomically replace the checkpoint at checkpoint_path with checkpoint."""
+    state = checkpoint._asdict()
+    state["remainder"] = base64.b64encode(checkpoint.remainder).decode('ascii')
+    temp_path = checkpoint_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, checkpoint_path)
+
+def load_checkpoint(checkpoint_path):
+    """Return the Checkpoint saved at checkpoint_path, or None if there isn't one.
+
+    Raises:
+        ValueError: If the checkpoint file is corrupt.
+    """
+    try:
+        with open(checkpoint_path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    try:
+        state["remainder"] = base64.b64decode(state["remainder"])
+        return Checkpoint(**state)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Corrupt checkpoint:", checkpoint_path)
+
+def transduce_file(pack_size, csv_column_names, path_to_file, output_path,
+                   checkpoint_path=None, chunk_size=1 << 20, checkpoint_interval=16,
+                   max_pending_chunks=4, layout=PRETTY):
+    """Transduce the CSV file at path_to_file to a JSON file at output_path, a chunk at a
+    time, resuming from the checkpoint of an earlier run if there is one.
+
+    Args:
+        pack_size: See csv_json_transducer.main.
+        csv_column_names: See csv_json_transducer.main.
+        path_to_file (str): The CSV file to transduce. May be compressed.
+        output_path (str): Where the JSON file is written. Must not name a codec.
+        checkpoint_path (str): Where the checkpoint is kept. Defaults to output_path plus
+            CHECKPOINT_EXTENSION.
+        chunk_size (int): Number of (decompressed) bytes read at a time.
+        checkpoint_interval (int): Number of chunks between checkpoints.
+        max_pending_chunks (int): Number of chunks the decompressing thread may run ahead.
+        layout (JSONLayout or str): See csv_json_transducer.main.
+    Returns:
+        The number of rows written.
+    Raises:
+        ValueError: If output_path names a codec, the checkpoint was saved by a different
+            job (input file, columns or layout) or doesn't match the output, or the input
+            contains malformed rows.
+    """
+    if compression.codec_from_extension(output_path) is not compression.NONE:
+        raise ValueError("Checkpointed output can't be compressed:", output_path)
+    if checkpoint_path is None:
+        checkpoint_path = output_path + CHECKPOINT_EXTENSION
+    layout = get_layout(layout)
+    array_open = layout.array_open.encode('utf-8')
+    row_separator = layout.row_separator.encode('utf-8')
+    job = job_description(csv_column_names, path_to_file, layout)
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint is None:
+        checkpoint = Checkpoint(0, 0, 0, b"", job)
+        output_file = open(output_path, "wb")
+    else:
+        if checkpoint.job != job:
+            raise ValueError("Checkpoint was saved by a different job:", checkpoint_path)
+        output_file = open(output_path, "r+b")
+        if os.fstat(output_file.fileno()).st_size < checkpoint.output_offset:
+            output_file.close()
+            raise ValueError("Output is shorter than its checkpoint:", output_path)
+        # Drop whatever was written after the checkpoint was saved
+        output_file.truncate(checkpoint.output_offset)
+        output_file.seek(checkpoint.output_offset)
+
+    with output_file, \
+            compression.DecompressingReader(path_to_file, chunk_size, max_pending_chunks,
+                                            start_offset=checkpoint.input_offset) as reader:
+        input_offset = checkpoint.input_offset
+        rows_emitted = checkpoint.rows_emitted
+        remainder = checkpoint.remainder
+        chunks_since_checkpoint = 0
+        for data in reader:
+            input_offset += len(data)
+            complete_rows, remainder = chunking.split_complete_rows(remainder + data)
+            body = chunking.transduce_rows(pack_size, csv_column_names, complete_rows, layout)
+            if body:
+                output_file.write((row_separator if rows_emitted else array_open) + body)
+                rows_emitted += complete_rows.count(b"\n")
+            chunks_since_checkpoint += 1
+            if chunks_since_checkpoint == checkpoint_interval:
+                output_file.flush()
+                os.fsync(output_file.fileno())
+                save_checkpoint(checkpoint_path, Checkpoint(input_offset, output_file.tell(),
+                                                            rows_emitted, remainder, job))
+                chunks_since_checkpoint = 0
+        # A trailing partial row is transduced as-is, so it fails verification like it
+        # would when transducing the whole file at once.
+        body = chunking.transduce_rows(pack_size, csv_column_names, remainder, layout)
+        if body:
+            output_file.write((row_separator if rows_emitted else array_open) + body)
+            rows_emitted += 1
+        closing = layout.array_close if rows_emitted else layout.empty_array
+        output_file.write(closing.encode('utf-8'))
+    if os.path.exists(checkpoint_path):
+        os.unlink(checkpoint_path)
+    return rows_emitted
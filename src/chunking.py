@@ -0,0 +1,108 @@
+"""
+Helpers for transducing a CSV file a piece at a time.
+
+The transducer works on complete rows, so input is split after the last newline of each
+piece and the leftover partial row is carried into the next piece. The JSON produced for
+each piece is a complete JSON array; the helpers below strip the array brackets so that
+the objects of successive pieces can be joined into a single array.
+"""
+import sys
+import os
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import csv_json_transducer
+from src import compression
+from src.json_converter import PRETTY, get_layout
+
+def split_complete_rows(byte_chunk):
+    """Split byte_chunk after its last newline.
+
+    Returns:
+        A tuple (complete_rows, remainder). complete_rows holds every complete row in
+        byte_chunk. remainder holds the trailing partial row (if any), which should be
+        prepended to the next chunk.
+    """
+    end = byte_chunk.rfind(b"\n") + 1
+    return byte_chunk[:end], byte_chunk[end:]
+
+def json_array_body(json_array, layout=PRETTY):
+    """Strip the opening "[\\n" and closing "\\n]" (in the pretty layout) from a
+    transduced JSON array.
+
+    Example:
+        '[\\n    {\\n        "col1": 123\\n    }\\n]' -> '    {\\n        "col1": 123\\n    }'
+    """
+    layout = get_layout(layout)
+    return json_array[len(layout.array_open):len(json_array) - len(layout.array_close)]
+
+def transduce_rows(pack_size, csv_column_names, complete_rows, layout=PRETTY):
+    """Transduce a chunk of complete CSV rows to the JSON objects for those rows.
+
+    Args:
+        pack_size: See csv_json_transducer.main.
+        csv_column_names: See csv_json_transducer.main.
+        complete_rows (bytes): UTF-8 encoded CSV rows, each terminated by a newline.
+        layout (JSONLayout or str): See csv_json_transducer.main.
+    Returns:
+        The UTF-8 encoded JSON objects for the rows, separated by the layout's row
+        separator, without the enclosing array brackets. Empty if complete_rows is empty.
+    """
+    output_byte_stream = csv_json_transducer.transduce_csv_str(
+        pack_size, csv_column_names, complete_rows.decode('utf-8'), layout=layout)
+    return json_array_body(output_byte_stream, layout).encode('utf-8')
+
+def join_json_bodies(bodies, layout=PRETTY):
+    """Join chunk bodies produced by transduce_rows into a single JSON array."""
+    layout = get_layout(layout)
+    bodies = [body for body in bodies if body]
+    if not bodies:
+        return layout.empty_array.encode('utf-8')
+    return layout.array_open.encode('utf-8') + \
+        layout.row_separator.encode('utf-8').join(bodies) + layout.array_close.encode('utf-8')
+
+def transduce_file(pack_size, csv_column_names, path_to_file, output_path,
+                   chunk_size=1 << 20, max_pending_chunks=4, layout=PRETTY):
+    """Transduce the CSV file at path_to_file to a JSON file at output_path, a chunk at a time.
+
+    Either file may be compressed (see compression). The input is decompressed in a
+    background thread and the output compressed in another, so both overlap with the
+    transduction of the chunks in between.
+
+    Args:
+        pack_size: See csv_json_transducer.main.
+        csv_column_names: See csv_json_transducer.main.
+        path_to_file (str): The CSV file to transduce.
+        output_path (str): Where the JSON file is written.
+        chunk_size (int): Number of (decompressed) bytes read at a time.
+        max_pending_chunks (int): Number of chunks each background thread may run ahead.
+        layout (JSONLayout or str): See csv_json_transducer.main.
+    """
+    layout = get_layout(layout)
+    array_open = layout.array_open.encode('utf-8')
+    row_separator = layout.row_separator.encode('utf-8')
+    with compression.DecompressingReader(path_to_file, chunk_size,
+                                         max_pending_chunks) as reader, \
+            compression.CompressingWriter(output_path,
+                                          max_pending_chunks=max_pending_chunks) as writer:
+        rows_written = False
+        remainder = b""
+        for data in reader:
+            complete_rows, remainder = split_complete_rows(remainder + data)
+            body = transduce_rows(pack_size, csv_column_names, complete_rows, layout)
+            if body:
+                writer.write((row_separator if rows_written else array_open) + body)
+                rows_written = True
+        # A trailing partial row is transduced as-is, so it fails verification like it
+        # would when transducing the whole file at once.
+        body = transduce_rows(pack_size, csv_column_names, remainder, layout)
+        if body:
+            writer.write((row_separator if rows_written else array_open) + body)
+            rows_written = True
+        closing = layout.array_close if rows_written else layout.empty_array
+        writer.write(closing.encode('utf-8'))
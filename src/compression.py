@@ -0,0 +1,216 @@
+"""
+Contains the functions used to read and write gzip, bz2 and xz compressed files.
+
+The codec of an input file is detected from its extension, or failing that from its magic
+bytes. The codec of an output file is chosen from its extension alone. Files with any other
+extension are read and written uncompressed.
+
+DecompressingReader and CompressingWriter run the codec in a thread of its own, connected to
+the transducer by a bounded queue. zlib, bz2 and lzma release the GIL while they work, so
+(de)compressing one chunk overlaps with transducing another.
+"""
+import os
+import bz2
+import gzip
+import lzma
+import queue
+import threading
+
+NONE = None
+GZIP = "gzip"
+BZ2 = "bz2"
+XZ = "xz"
+
+EXTENSIONS = {".gz": GZIP, ".gzip": GZIP, ".bz2": BZ2, ".xz": XZ}
+MAGIC_BYTES = {GZIP: b"\x1f\x8b", BZ2: b"BZh", XZ: b"\xfd7zXZ\x00"}
+OPENERS = {GZIP: gzip.open, BZ2: bz2.open, XZ: lzma.open}
+
+# Marks the end of a queue.
+_END = None
+
+def codec_from_extension(path):
+    """Return the codec named by the extension of path, or NONE."""
+    for extension, codec in EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return codec
+    return NONE
+
+def codec_from_magic_bytes(header):
+    """Return the codec whose magic bytes header starts with, or NONE."""
+    for codec, magic in MAGIC_BYTES.items():
+        if header.startswith(magic):
+            return codec
+    return NONE
+
+def detect_codec(path):
+    """Return the codec of the file at path, from its extension or its magic bytes."""
+    codec = codec_from_extension(path)
+    if codec is NONE:
+        with open(path, 'rb') as f:
+            codec = codec_from_magic_bytes(f.read(max(len(m) for m in MAGIC_BYTES.values())))
+    return codec
+
+def open_compressed(path, mode='rb', codec=NONE):
+    """Open path in binary mode, through the opener of codec if it has one.
+
+    Args:
+        mode (str): 'rb' or 'wb'.
+        codec: One of GZIP, BZ2, XZ or NONE.
+    """
+    if codec is NONE:
+        return open(path, mode)
+    if codec not in OPENERS:
+        raise ValueError("Unsupported compression codec specified:", codec)
+    return OPENERS[codec](path, mode)
+
+def open_input(path):
+    """Open the file at path for reading, decompressing it if it's compressed."""
+    return open_compressed(path, 'rb', detect_codec(path))
+
+def open_output(path):
+    """Open the file at path for writing, compressing it if its extension names a codec."""
+    return open_compressed(path, 'wb', codec_from_extension(path))
+
+def read_file(path):
+    """Return the (decompressed) contents of the file at path, as bytes."""
+    with open_input(path) as f:
+        return f.read()
+
+class DecompressingReader:
+    """Iterates over the decompressed contents of a file, a chunk at a time.
+
+    The file is read and decompressed in a background thread, which stays up to
+    max_pending_chunks chunks ahead of the consumer. Any error raised while reading (e.g.
+    OSError, EOFError or zlib.error) is raised by the iterator, in place of the chunk that
+    couldn't be read.
+
+    Example:
+        with DecompressingReader("data.csv.gz") as reader:
+            for chunk in reader:
+                ...
+    """
+
+    def __init__(self, path, chunk_size=1 << 20, max_pending_chunks=4, codec=None,
+                 start_offset=0):
+        """Start decompressing path. If codec is None it's detected with detect_codec.
+        Reading starts start_offset bytes into the decompressed contents."""
+        self.codec = detect_codec(path) if codec is None else codec
+        self._queue = queue.Queue(maxsize=max_pending_chunks)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._read,
+                                        args=(path, chunk_size, start_offset), daemon=True)
+        self._thread.start()
+
+    def _read(self, path, chunk_size, start_offset):
+        try:
+            with open_compressed(path, 'rb', self.codec) as f:
+                if start_offset:
+                    f.seek(start_offset)  # compressed files decompress up to the offset
+                while not self._closed.is_set():
+                    data = f.read(chunk_size)
+                    if not data:
+                        break
+                    self._put(data)
+        except Exception as error:  # e.g. zlib.error on corrupt gzip data
+            self._put(error)
+        finally:
+            # Always end the queue, so the consumer can't block on it forever
+            self._put(_END)
+
+    def _put(self, item):
+        # Give up once the consumer has closed the reader, rather than block on a full queue.
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        """Stop the background thread. Chunks not yet consumed are discarded."""
+        self._closed.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class CompressingWriter:
+    """Writes chunks to a file, compressing them in a background thread.
+
+    write queues a chunk and returns, so the caller can go on to produce the next chunk
+    while this one is compressed. An error raised while writing is raised by the next call
+    to write, or by close.
+
+    Used as a context manager, the file is only finished (closed, with the codec's trailer)
+    if the block succeeds. If it raises, the file is aborted instead, see abort.
+    """
+
+    def __init__(self, path, codec=None, max_pending_chunks=4):
+        """Open path for writing. If codec is None it's chosen from the extension of path."""
+        self.path = path
+        self.codec = codec_from_extension(path) if codec is None else codec
+        self._file = open_compressed(path, 'wb', self.codec)
+        self._queue = queue.Queue(maxsize=max_pending_chunks)
+        self._error = None
+        self._aborted = False
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def _write(self):
+        while True:
+            data = self._queue.get()
+            if data is _END:
+                return
+            if self._error is None and not self._aborted:
+                try:
+                    self._file.write(data)
+                except Exception as error:  # e.g. zlib.error
+                    self._error = error
+
+    def write(self, data):
+        """Queue data to be compressed and written."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put(data)
+
+    def close(self):
+        """Wait until every queued chunk has been written, then close the file."""
+        self._queue.put(_END)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def abort(self):
+        """Discard the chunks still queued, stop the thread and delete the file, so that a
+        truncated output that looks complete isn't left behind."""
+        self._aborted = True
+        self._queue.put(_END)
+        self._thread.join()
+        try:
+            self._file.close()
+        except Exception:  # e.g. the error the writer thread hit
+            pass
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
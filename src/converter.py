@@ -34,7 +34,7 @@ class Converter(ABC):
         pass
 
     @abstractmethod
-    def transduce_field(self, field_wrapper, field_type, starts_or_ends_file):
+    def transduce_field(self, field_wrapper, field_type, starts_file, ends_file):
         """Implementation is output format dependant. Any concrete subclasses of Converter
         must implement this method."""
         pass
@@ -52,7 +52,8 @@ class Converter(ABC):
         pass
 
     @abstractmethod
-    def transduce(self, file_as_str, fields_pext_ms, return_extracted_bs=False):
+    def transduce(self, file_as_str, fields_pext_ms, return_extracted_bs=False,
+                  csv_stream_set=None):
         """Implementation is output format dependant. Any concrete subclasses of Converter
         must implement this method."""
         pass
@@ -75,40 +76,28 @@ class Converter(ABC):
         to our "stream" variables inside methods and have these changes persist once the
         methods return.
 
-        Returns (BitStream):
+        Returns (int):
             The pdep bit stream.
 
         Examples:
             See test_pdep_stream_gen.py
         """
-        pdep_marker_stream = pablo.BitStream(0)
+        pdep_marker_stream = 0
         field_type = 0
         # Tracks number bits already written. We skip over these before inserting new transduced field
         shift_amnt = 0
+        # A single wrapper is reused for every field rather than allocating one per field.
+        field_wrapper = pablo.BitStream(0)
         # process fields in the order they appear in the file, i.e. from left to right
         for i, field_width in enumerate(self.field_widths):
-            starts_or_ends_file = True if i == 0 or i == (len(self.field_widths) - 1) else False
-            field_wrapper = pablo.BitStream((1 << field_width) - 1) # create field
+            starts_file = i == 0
+            ends_file = i == len(self.field_widths) - 1
+            field_wrapper.value = (1 << field_width) - 1 # create field
             num_boilerplate_bytes_added = self.transduce_field(field_wrapper, field_type,
-                                                               starts_or_ends_file)
-            self.insert_field(field_wrapper, pdep_marker_stream, shift_amnt)
+                                                               starts_file, ends_file)
+            pdep_marker_stream |= field_wrapper.value << shift_amnt
             shift_amnt += num_boilerplate_bytes_added + field_width
             field_type += 1
             if field_type == self.num_fields_per_unit:
                 field_type = 0
-            #print(bin(pdep_marker_stream.value)) debug
-        #print(bin(pdep_marker_stream.value)) #debug
-        return pdep_marker_stream.value
-
-    def insert_field(self, field_wrapper, pdep_marker_stream, shift_amount):
-        """OR padded value into PDEP marker stream.
-
-        Stream grows from right to left. First field we process (which is the first
-        field that appear in the input file) is the left-most field represented by
-        pdep_marker_stream. Last field we process (last field in the file) is the
-        rightmost.
-        """
-        pdep_marker_stream.value = (field_wrapper.value << shift_amount) \
-                                | pdep_marker_stream.value
-
-    
+        return pdep_marker_stream
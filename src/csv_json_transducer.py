@@ -5,6 +5,7 @@ supported is CSV to JSON.
 """
 import sys
 import os
+from collections import namedtuple
 # workaround to get the import statements below working properly.
 # see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
 PACKAGE_PARENT = '..'
@@ -19,10 +20,16 @@ test = os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT))
 from src.transducer_target_enums import TransductionTarget, SourceFormats
 from src import pablo
 from src import field_width
-from src.json_converter import JSONConverter
+from src import pushdown
+from src import transcoder
+from src import pack_tuning
+from src import compression
+from src.json_converter import JSONConverter, PRETTY
+from src.template_converter import FormatSpec, compile_converter
 
 def main(pack_size, csv_column_names, path_to_file,
-         target_format=TransductionTarget.JSON, source_format=SourceFormats.CSV):
+         target_format=TransductionTarget.JSON, source_format=SourceFormats.CSV,
+         selected_columns=None, row_filter=None, verbose=True, stats=None, layout=PRETTY):
     """Accept path to file in source_format, transduces file to target_format.
 
     Args:
@@ -30,41 +37,270 @@ def main(pack_size, csv_column_names, path_to_file,
             can process pack_size bits at a time (our quick and dirty versions process the entire
             stream in one go, though).
             create_idx_ms and the field width functions process streams pack_size bits at once.
+            Pass pack_tuning.AUTO_PACK_SIZE to choose the pack size from the delimiter density.
         csv_column_names: TODO refactor. This input should be requested within pdep_stream_gen if
             transduction target == JSON.
         path_to_file(str): path to file to transduce. Absolute, or relative to the main
             project directory.
-        target_format: The format we want to transduce file at path_to_file to.
+        target_format: The format we want to transduce file at path_to_file to. A
+            TransductionTarget, or a template_converter.FormatSpec.
         source_format: The format of the file at path_to_file.
+        selected_columns (list of str): If provided, only these columns are transduced.
+            Columns are output in the order they appear in the input file.
+        row_filter (pushdown.RowFilter): If provided, only the rows whose value in
+            row_filter.column equals (or starts with) row_filter.literal are transduced.
+        verbose (boolean): Print the input file, intermediate streams and output file.
+        stats (dict): If provided, the run stats are added to it: the pack size used
+            ("pack_size"), the estimated field width scan cost of that pack size in words
+            ("pack_cost"), the estimated fraction of non-empty packs
+            ("nonempty_pack_fraction") and the depth of the pack index ("index_depth").
+        layout (JSONLayout or str): The layout of the JSON output: json_converter.PRETTY,
+            COMPACT or MINIFIED, or the name of one of them.
     Returns:
         The transduced file. E.g. for CSV to JSON, the JSON file that results from transducing
             the input CSV file.
     """
 
-    # Process the input file
-    csv_file_as_str = pablo.readfile(path_to_file)
+    # Process the input file. Read it as bytes, it's validated as UTF-8 before transduction.
+    # Files in other encodings are transcoded to UTF-8 bit streams first. Compressed files
+    # are decompressed.
+    csv_file_as_bytes = compression.read_file(path_to_file)
+    if source_format != SourceFormats.CSV:
+        csv_file_as_bytes = transcoder.transcode_to_utf8(csv_file_as_bytes, source_format)
+    output_byte_stream = transduce_csv_str(pack_size, csv_column_names, csv_file_as_bytes,
+                                           target_format, selected_columns=selected_columns,
+                                           row_filter=row_filter, verbose=verbose,
+                                           stats=stats, layout=layout)
+    #pablo.writefile('out.json', output_byte_stream)
+    return output_byte_stream
+
+def transduce_csv_str(pack_size, csv_column_names, csv_file_as_str,
+                      target_format=TransductionTarget.JSON, converter=None,
+                      selected_columns=None, row_filter=None, verbose=False, stats=None,
+                      layout=PRETTY):
+    """Transduce a CSV file that has already been read into memory.
+
+    Args:
+        pack_size: See main.
+        csv_column_names: See main.
+        csv_file_as_str (str, bytes or StreamSet): The contents of the CSV file. bytes must be
+            UTF-8 encoded; they are validated before anything is transduced. A StreamSet holds
+            the basis bit streams of the UTF-8 encoded file, e.g. as produced by the
+            transcoder.
+        target_format: The format we want to transduce csv_file_as_str to.
+        converter (Converter): Optional converter to reuse. Its column names must match
+            csv_column_names. Reusing a converter across files that share a column set
+            avoids rebuilding the column name boilerplate for each file. Its layout must
+            match layout. Can't be combined with selected_columns or row_filter: the rows
+            are verified against every column, but only the selected ones are transduced.
+        selected_columns (list of str): See main.
+        row_filter (pushdown.RowFilter): See main.
+        verbose (boolean): Print the input file, intermediate streams and output file.
+        stats (dict): See main.
+        layout (JSONLayout or str): See main.
+    Returns:
+        The transduced file.
+    Raises:
+        ValueError: If the file isn't valid UTF-8 or contains malformed rows, or if converter
+            is combined with selected_columns or row_filter.
+    """
+    prepared = prepare_transduction(pack_size, csv_column_names, csv_file_as_str,
+                                    target_format, converter, selected_columns, row_filter,
+                                    stats, layout)
+    output_byte_stream = prepared.converter.transduce(None, prepared.fields_pext_ms,
+                                                      csv_stream_set=prepared.csv_stream_set)
+    if verbose:
+        print("input CSV file:", "\n" + prepared.csv_stream_set.transpose_out())
+        print("CSV file column names:", csv_column_names)
+        print("fields_pext_ms:", bin(prepared.fields_pext_ms))
+        print("field widths:", prepared.field_widths)
+        print("output_JSON_file:", "\n" + output_byte_stream)
+    return output_byte_stream
+
+def transduce_csv_to_fd(pack_size, csv_column_names, csv_file_as_str, fd,
+                        target_format=TransductionTarget.JSON, converter=None,
+                        selected_columns=None, row_filter=None, stats=None,
+                        output_length=None, layout=PRETTY):
+    """Transduce a CSV file that has already been read into memory and write it to fd.
+
+    The output is built by transduce_csv_to_buffer and written with os.write. No str is
+    built for the output.
+
+    Args:
+        fd (int): File descriptor open for writing.
+        output_length (int): See transduce_csv_to_buffer.
+        Others: See transduce_csv_str.
+    Returns:
+        The number of bytes written.
+    """
+    output_buffer = transduce_csv_to_buffer(pack_size, csv_column_names, csv_file_as_str,
+                                            target_format, converter, selected_columns,
+                                            row_filter, stats, output_length, layout)
+    return write_all(fd, output_buffer)
+
+def transduce_csv_to_buffer(pack_size, csv_column_names, csv_file_as_str,
+                            target_format=TransductionTarget.JSON, converter=None,
+                            selected_columns=None, row_filter=None, stats=None,
+                            output_length=None, layout=PRETTY):
+    """Transduce a CSV file into a single bytearray sized exactly from the row templates.
+
+    Args:
+        output_length (int): The size of the output, if it's known in advance (e.g. from
+            profiling.output_length). The buffer is then allocated before the file is
+            processed, rather than after its row templates have been built.
+        Others: See transduce_csv_str.
+    Returns:
+        The UTF-8 encoded output file (bytearray).
+    Raises:
+        ValueError: If output_length is given and isn't the size of the output.
+    """
+    output_buffer = None if output_length is None else bytearray(output_length)
+    prepared = prepare_transduction(pack_size, csv_column_names, csv_file_as_str,
+                                    target_format, converter, selected_columns, row_filter,
+                                    stats, layout)
+    templates = prepared.converter.get_row_templates()
+    converter_output_length = prepared.converter.output_length(templates)
+    if output_buffer is None:
+        output_buffer = bytearray(converter_output_length)
+    elif output_length != converter_output_length:
+        raise ValueError("Output length given does not match the transduced file:",
+                         output_length, converter_output_length)
+    prepared.converter.transduce_into(output_buffer, prepared.fields_pext_ms,
+                                      prepared.csv_stream_set, templates=templates)
+    return output_buffer
+
+def write_all(fd, buffer):
+    """Write all of buffer to fd. os.write may write less than it's given (e.g. to a pipe),
+    so keep writing until the whole buffer has been written. Returns len(buffer)."""
+    view = memoryview(buffer)
+    written = 0
+    while written < len(view):
+        written += os.write(fd, view[written:])
+    return written
+
+def transduce_file_to_path(pack_size, csv_column_names, path_to_file, output_path,
+                           target_format=TransductionTarget.JSON,
+                           source_format=SourceFormats.CSV, selected_columns=None,
+                           row_filter=None, stats=None, layout=PRETTY):
+    """Transduce the file at path_to_file and write the result to output_path.
+
+    Like main, but the output goes to a file through transduce_csv_to_fd rather than being
+    returned as a str. If the extension of output_path names a codec (e.g. ".gz"), the
+    output is compressed.
+
+    Returns:
+        The number of (uncompressed) bytes written.
+    """
+    csv_file_as_bytes = compression.read_file(path_to_file)
+    if source_format != SourceFormats.CSV:
+        csv_file_as_bytes = transcoder.transcode_to_utf8(csv_file_as_bytes, source_format)
+    if compression.codec_from_extension(output_path) is not compression.NONE:
+        output_buffer = transduce_csv_to_buffer(pack_size, csv_column_names,
+                                                csv_file_as_bytes, target_format,
+                                                selected_columns=selected_columns,
+                                                row_filter=row_filter, stats=stats,
+                                                layout=layout)
+        with compression.open_output(output_path) as f:
+            f.write(output_buffer)
+        return len(output_buffer)
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        return transduce_csv_to_fd(pack_size, csv_column_names, csv_file_as_bytes, fd,
+                                   target_format, selected_columns=selected_columns,
+                                   row_filter=row_filter, stats=stats, layout=layout)
+    finally:
+        os.close(fd)
+
+# The results of the passes that come before the transduction itself.
+PreparedTransduction = namedtuple("PreparedTransduction",
+                                  ["converter", "fields_pext_ms", "field_widths",
+                                   "csv_stream_set"])
+
+def prepare_transduction(pack_size, csv_column_names, csv_file_as_str,
+                         target_format=TransductionTarget.JSON, converter=None,
+                         selected_columns=None, row_filter=None, stats=None, layout=PRETTY):
+    """Validate the file and compute everything the converter needs to transduce it.
+
+    Args: See transduce_csv_str.
+    Returns:
+        A PreparedTransduction. Its converter is ready to transduce the selected fields.
+    Raises:
+        ValueError: See transduce_csv_str.
+    """
+    pushed_down = selected_columns is not None or row_filter is not None
+    if converter is not None and pushed_down:
+        raise ValueError("A converter can't be reused with selected columns or a row filter.")
+    # Decompose the file once. Delimiter detection and UTF-8 validation share the basis
+    # streams, and so does the transduction itself.
+    if isinstance(csv_file_as_str, pablo.StreamSet):
+        csv_stream_set = csv_file_as_str
+    else:
+        csv_stream_set = pablo.StreamSet.transpose_in(csv_file_as_str)
     # TODO replace [] with format, e.g CSV
-    field_widths = field_width.calculate_field_widths(csv_file_as_str, pack_size, [",", "\n"])
-    fields_pext_ms = pablo.create_pext_ms(csv_file_as_str, [",", "\n"], True)
+    delimiter_ms, invalid_offset = pablo.detect_delimiters(csv_stream_set, [",", "\n"])
+    if invalid_offset != -1:
+        raise ValueError("Input CSV file is not valid UTF-8. First invalid byte at offset:",
+                         invalid_offset)
+    fields_pext_ms = ~delimiter_ms & ((1 << csv_stream_set.length) - 1)
+    pack_choice = None
+    if pack_size == pack_tuning.AUTO_PACK_SIZE:
+        # The field width marker stream has the same density as the delimiters
+        pack_choice = pack_tuning.choose_pack_size(delimiter_ms, csv_stream_set.length)
+        pack_size = pack_choice.pack_size
+    field_widths = []
+    if csv_stream_set.length:
+        # Sparse if the fields are wide, in which case the widths are read off the
+        # delimiter positions rather than scanned pack by pack
+        delimiter_stream = pablo.MarkerStream.from_bits(delimiter_ms, csv_stream_set.length)
+        field_widths = field_width.calculate_field_widths_from_ms(fields_pext_ms,
+                                                                  delimiter_stream, pack_size)
+
+    # Create (or reuse) the Converter object we'll use to transduce the file
+    if converter is None:
+        converter = create_converter(target_format, field_widths, csv_column_names, layout)
+    else:
+        converter.field_widths = field_widths
+
+    converter.verify_user_inputs(pack_size, csv_stream_set)
+    if stats is not None:
+        if pack_choice is None:
+            pack_choice = pack_tuning.describe_pack_size(pack_size, delimiter_ms,
+                                                         csv_stream_set.length)
+        stats["pack_size"] = pack_size
+        stats["pack_cost"] = pack_choice.cost
+        stats["nonempty_pack_fraction"] = pack_choice.nonempty_fraction
+        stats["index_depth"] = pack_choice.index_depth
+    if pushed_down:
+        # Drop the unwanted columns and rows before transducing rather than after
+        column_indices = pushdown.get_column_indices(csv_column_names,
+                                                     selected_columns or csv_column_names)
+        selected_rows = None
+        if row_filter is not None:
+            filter_column_index = pushdown.get_column_indices(csv_column_names,
+                                                              [row_filter.column])[0]
+            selected_rows = pushdown.select_rows(csv_stream_set, field_widths,
+                                                 len(csv_column_names), filter_column_index,
+                                                 row_filter)
+        fields_pext_ms, field_widths = pushdown.push_down(
+            fields_pext_ms, field_widths, len(csv_column_names), column_indices, selected_rows)
+        converter = create_converter(target_format, field_widths,
+                                     [csv_column_names[i] for i in column_indices], layout)
+    return PreparedTransduction(converter, fields_pext_ms, field_widths, csv_stream_set)
+
+def create_converter(target_format, field_widths, csv_column_names, layout=PRETTY):
+    """Create the Converter object used to transduce a file to target_format.
 
-    # Create the Converter object we'll use to transduce the file
-    converter = None
+    target_format may also be a template_converter.FormatSpec, which is compiled into a
+    converter for the format it describes. layout only applies to JSON.
+    """
+    if isinstance(target_format, FormatSpec):
+        return compile_converter(target_format, csv_column_names, field_widths)
     if target_format == TransductionTarget.JSON:
-        # TODO prompt for column names / types here, then extract this block as method
-        converter = JSONConverter(field_widths, csv_column_names)
+        # TODO prompt for column names / types here
+        return JSONConverter(field_widths, csv_column_names, layout)
     else:
         raise ValueError("Unsupported target transduction format specified:", target_format)
 
-    converter.verify_user_inputs(pack_size, csv_file_as_str)
-    output_byte_stream = converter.transduce(csv_file_as_str, fields_pext_ms)
-    print("input CSV file:", "\n" + csv_file_as_str)
-    print("CSV file column names:", csv_column_names)
-    print("fields_pext_ms:", bin(fields_pext_ms))
-    print("field widths:", field_widths)
-    print("output_JSON_file:", "\n" + output_byte_stream)
-    #pablo.writefile('out.json', output_byte_stream)
-    return output_byte_stream
-
 if __name__ == '__main__':
     #main(64, ["id","first_name","last_name","email","gender","ip_address"], "Resources/Test/test_multiline_big.csv")
     #main(64, ["col A"], "Resources/Test/s2p_test.csv")
@@ -0,0 +1,274 @@
+"""
+Contains a long-running transduction daemon that accepts jobs over a Unix domain socket.
+
+Running csv_json_transducer.main once per file pays for interpreter startup and starts with
+empty caches every time. The daemon is started once and keeps its caches warm: jobs run on
+a pool of worker threads in a single process, so they all share the compiled column name
+boilerplate (template_converter.compile_format) and the row template cache
+(template_converter.ROW_SHAPE_CACHE).
+
+Protocol: the client sends one request, a JSON object on a single line, and the daemon
+answers with a JSON header line. A "transduce" request names the input file and its
+columns, e.g.
+    {"op": "transduce", "path": "data.csv", "columns": ["id", "name"], "pack_size": 64,
+     "layout": "minified", "output_path": "data.json"}
+If output_path is given the output is written there (compressed if its extension names a
+codec) and the header reports its size. Otherwise the header is followed by the
+output_bytes bytes of the output. Relative paths are resolved against the daemon's working
+directory. If the daemon was started with an output cache (see output_cache), transduce
+jobs take their output from it when possible, unless the request has "cache": false. A
+"stats" request returns the daemon's job and cache stats in the header.
+Failures are reported as {"ok": false, "error": "..."}.
+
+Can also be run from the command line, e.g.
+    python src/daemon.py serve --socket /tmp/transducer.sock --workers 4 \
+        --cache-dir /tmp/transducer-cache
+    python src/daemon.py transduce --socket /tmp/transducer.sock --columns id,name data.csv
+    python src/daemon.py stats --socket /tmp/transducer.sock
+"""
+import sys
+import os
+import json
+import time
+import socket
+import socketserver
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src.transducer_target_enums import SourceFormats
+from src import csv_json_transducer
+from src import compression
+from src import pack_tuning
+from src import pushdown
+from src import transcoder
+from src.output_cache import OutputCache
+from src.template_converter import ROW_SHAPE_CACHE, compile_format
+
+# Longest request line accepted, in bytes.
+MAX_REQUEST_BYTES = 1 << 20
+
+class TransductionHandler(socketserver.StreamRequestHandler):
+    """Handles a single request. See the module docstring for the protocol."""
+
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            request = json.loads(line.decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object.")
+            op = request.get("op")
+            if op == "transduce":
+                header, payload = self.server.run_job(request)
+            elif op == "stats":
+                header, payload = dict(self.server.get_stats(), ok=True), b""
+            else:
+                raise ValueError("Unsupported request op:", op)
+        except Exception as error:  # e.g. zlib.error from a corrupt input file
+            header, payload = {"ok": False, "error": str(error)}, b""
+        self.wfile.write(json.dumps(header).encode('utf-8') + b"\n")
+        self.wfile.write(payload)
+
+class TransductionServer(socketserver.UnixStreamServer):
+    """Serves transduction requests on a Unix domain socket with a pool of worker threads.
+
+    Threads rather than processes, so that every job shares the caches of the daemon. If
+    cache (an OutputCache) is provided, outputs are cached on disk.
+    """
+
+    def __init__(self, socket_path, num_workers=None, cache=None):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # left behind by a daemon that wasn't shut down cleanly
+        super().__init__(socket_path, TransductionHandler)
+        self.socket_path = socket_path
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=self.num_workers)
+        self._stats_lock = threading.Lock()
+        self._started = time.time()
+        self._jobs = 0
+        self._failed = 0
+        self._input_bytes = 0
+        self._output_bytes = 0
+        self._busy_seconds = 0.0
+
+    def process_request(self, request, client_address):
+        """Handle the request on a worker thread, so the server can accept the next one."""
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def run_job(self, request):
+        """Run a transduce request.
+
+        Returns:
+            A tuple (header, payload). payload holds the output bytes, unless the output was
+            written to request["output_path"].
+        """
+        start = time.perf_counter()
+        stats = {}
+        try:
+            output_length, payload = transduce_job(request, stats, self.cache)
+        except Exception:
+            self._record_job(0, 0, time.perf_counter() - start, failed=True)
+            raise
+        seconds = time.perf_counter() - start
+        input_bytes = stats.pop("input_bytes")
+        self._record_job(input_bytes, output_length, seconds)
+        header = {"ok": True, "output_bytes": output_length, "input_bytes": input_bytes,
+                  "seconds": seconds, "stats": stats}
+        return header, payload
+
+    def _record_job(self, input_bytes, output_bytes, seconds, failed=False):
+        with self._stats_lock:
+            self._jobs += 1
+            self._failed += failed
+            self._input_bytes += input_bytes
+            self._output_bytes += output_bytes
+            self._busy_seconds += seconds
+
+    def get_stats(self):
+        """Return the job counts and cache stats of the daemon."""
+        field_names = compile_format.cache_info()
+        with self._stats_lock:
+            stats = {
+                "uptime": time.time() - self._started,
+                "workers": self.num_workers,
+                "jobs": self._jobs,
+                "failed": self._failed,
+                "input_bytes": self._input_bytes,
+                "output_bytes": self._output_bytes,
+                "busy_seconds": self._busy_seconds,
+                "row_shape_cache": {"hits": ROW_SHAPE_CACHE.hits,
+                                    "misses": ROW_SHAPE_CACHE.misses,
+                                    "size": len(ROW_SHAPE_CACHE)},
+                "field_name_cache": {"hits": field_names.hits, "misses": field_names.misses,
+                                     "size": field_names.currsize},
+            }
+        if self.cache is not None:
+            stats["output_cache"] = {"hits": self.cache.hits, "misses": self.cache.misses,
+                                     "size": self.cache.size()}
+        return stats
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+def transduce_job(request, stats, cache=None):
+    """Transduce the file described by a transduce request.
+
+    Args:
+        request (dict): The request. See the module docstring.
+        stats (dict): The run stats are added to it (see csv_json_transducer.main), as well
+            as the size of the input in "input_bytes". With a cache, "cache_hit" is added
+            too, and the run stats are only added on a miss.
+        cache (OutputCache): If provided, the output is taken from or added to it.
+    Returns:
+        A tuple (output_length, payload). payload is empty if the output was written to
+        request["output_path"].
+    """
+    pack_size = request.get("pack_size", 64)
+    if pack_size != pack_tuning.AUTO_PACK_SIZE:
+        pack_size = int(pack_size)
+    columns = list(request["columns"])
+    options = {
+        "selected_columns": request.get("selected_columns"),
+        "row_filter": None,
+        "layout": request.get("layout", "pretty"),
+        "stats": stats,
+    }
+    if request.get("row_filter") is not None:
+        options["row_filter"] = pushdown.RowFilter(**request["row_filter"])
+    csv_file_as_bytes = compression.read_file(request["path"])
+    stats["input_bytes"] = len(csv_file_as_bytes)
+    source_format = SourceFormats[request.get("source_format", "CSV")]
+    if source_format != SourceFormats.CSV:
+        csv_file_as_bytes = transcoder.transcode_to_utf8(csv_file_as_bytes, source_format)
+    if cache is not None and request.get("cache", True):
+        output_buffer, stats["cache_hit"] = cache.transduce_csv_to_buffer(
+            pack_size, columns, csv_file_as_bytes, **options)
+    else:
+        output_buffer = csv_json_transducer.transduce_csv_to_buffer(pack_size, columns,
+                                                                    csv_file_as_bytes,
+                                                                    **options)
+    output_path = request.get("output_path")
+    if output_path is None:
+        return len(output_buffer), output_buffer
+    with compression.open_output(output_path) as f:
+        f.write(output_buffer)
+    return len(output_buffer), b""
+
+def send_request(socket_path, request):
+    """Send request to the daemon listening on socket_path.
+
+    Returns:
+        A tuple (header, payload). payload holds the output_bytes bytes that follow the
+        header of a successful transduce request whose output wasn't written to a file.
+    Raises:
+        ValueError: If the daemon reports an error.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        with client.makefile('rwb') as stream:
+            stream.write(json.dumps(request).encode('utf-8') + b"\n")
+            stream.flush()
+            header = json.loads(stream.readline().decode('utf-8'))
+            if not header["ok"]:
+                raise ValueError("Transduction daemon reported an error:", header["error"])
+            payload = b""
+            if request.get("op") == "transduce" and request.get("output_path") is None:
+                payload = stream.read(header["output_bytes"])
+    return header, payload
+
+def parse_args(argv):
+    """Parse the command line arguments of the daemon CLI."""
+    parser = argparse.ArgumentParser(description="Run or talk to a transduction daemon.")
+    parser.add_argument("command", choices=["serve", "transduce", "stats"])
+    parser.add_argument("paths", nargs="*", help="CSV files to transduce.")
+    parser.add_argument("--socket", required=True, help="Path of the Unix domain socket.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker threads. Defaults to the number of CPUs.")
+    parser.add_argument("--cache-dir", help="Cache outputs on disk in this directory.")
+    parser.add_argument("--cache-size", type=int, default=1 << 30,
+                        help="Size limit of the output cache, in bytes.")
+    parser.add_argument("--columns", help="Comma separated column names.")
+    parser.add_argument("--pack-size", default=64,
+                        help="A power of two, or 'auto' to choose from the delimiter density.")
+    parser.add_argument("--layout", default="pretty", help="Layout of the JSON output.")
+    parser.add_argument("--output", help="Write the output here rather than to stdout.")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    ARGS = parse_args(sys.argv[1:])
+    if ARGS.command == "serve":
+        CACHE = OutputCache(ARGS.cache_dir, ARGS.cache_size) if ARGS.cache_dir else None
+        with TransductionServer(ARGS.socket, ARGS.workers, CACHE) as SERVER:
+            try:
+                SERVER.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    elif ARGS.command == "stats":
+        print(json.dumps(send_request(ARGS.socket, {"op": "stats"})[0], indent=4))
+    else:
+        for PATH in ARGS.paths:
+            _, PAYLOAD = send_request(ARGS.socket, {
+                "op": "transduce", "path": os.path.abspath(PATH),
+                "columns": ARGS.columns.split(","), "pack_size": ARGS.pack_size,
+                "layout": ARGS.layout,
+                "output_path": os.path.abspath(ARGS.output) if ARGS.output else None})
+            sys.stdout.buffer.write(PAYLOAD)
@@ -42,15 +42,41 @@ def calculate_field_widths(byte_stream, pack_size, field_end_delims=(",", "\n"))
             the end of fields. E.g. for CSV files field_end_delims=(",", "\n")
 
     """
+    if not byte_stream:
+        return []  # an empty file contains no fields
     pext_marker_stream = pablo.create_pext_ms(byte_stream, field_end_delims, True)
+    delimiter_marker_stream = pablo.create_pext_ms(byte_stream, field_end_delims)
+    return calculate_field_widths_from_ms(pext_marker_stream, delimiter_marker_stream, pack_size)
+
+def calculate_field_widths_from_ms(pext_marker_stream, delimiter_marker_stream, pack_size):
+    """Calculate field widths from the fields and delimiters marker streams of a file.
+
+    Use this version when the marker streams have already been created, e.g. by
+    pablo.detect_delimiters. See calculate_field_widths.
+
+    If the delimiters are sparse (see pablo.MarkerStream), e.g. in files with wide fields,
+    the widths are read off the delimiter positions rather than scanned pack by pack.
+
+    Args:
+        pext_marker_stream (int): Marker stream with a bit set for every byte of every field.
+        delimiter_marker_stream (int or MarkerStream): Marker stream with a bit set for every
+            delimiter.
+        pack_size (int): See calculate_field_widths.
+    """
+    if not isinstance(delimiter_marker_stream, pablo.MarkerStream):
+        delimiter_marker_stream = pablo.MarkerStream.from_bits(
+            delimiter_marker_stream,
+            max(pext_marker_stream.bit_length(), delimiter_marker_stream.bit_length()))
+    if delimiter_marker_stream.is_sparse:
+        return calculate_field_widths_from_positions(pext_marker_stream,
+                                                     delimiter_marker_stream.positions)
+
     field_widths_ms = create_field_width_ms(pext_marker_stream)
     idx_marker_stream = pablo.create_idx_ms(field_widths_ms, pack_size)
-    # Allows us to simulate pass-by-reference for our idx_marker_stream.
-    idx_marker_stream_wrapper = pablo.BitStream(idx_marker_stream)
     field_widths = []
     field_start = -1
-    while idx_marker_stream_wrapper.value:
-        non_zero_pack_idx = find_nonzero_pack(idx_marker_stream_wrapper)
+    while idx_marker_stream:
+        non_zero_pack_idx, idx_marker_stream = find_nonzero_pack(idx_marker_stream)
         field_start = process_pack(field_widths_ms, field_widths, field_start,
                                    non_zero_pack_idx, pack_size)
 
@@ -61,20 +87,42 @@ def calculate_field_widths(byte_stream, pack_size, field_end_delims=(",", "\n"))
     # number of fields, so it's safe to append "0" len(field_widths) != the expected value.
     # We'll only be supplying the missing fields that correspond to empty fields at
     # the end of a line of input.
-    delimiter_marker_stream = pablo.create_pext_ms(byte_stream, field_end_delims)
-    while len(field_widths) < pablo.get_popcount(delimiter_marker_stream):
+    num_delimiters = delimiter_marker_stream.popcount()
+    while len(field_widths) < num_delimiters:
+        field_widths.append(0)
+    return field_widths
+
+def calculate_field_widths_from_positions(pext_marker_stream, delimiter_positions):
+    """Calculate field widths from the positions of the delimiters.
+
+    Gives the same result as the pack scan in calculate_field_widths_from_ms: each field
+    ends at a delimiter before the last field byte, or just after the last field byte, and
+    the empty fields after the last field byte are added at the end.
+
+    Example:
+        abc,,12\n -> delimiter_positions = [3, 4, 7] -> [3, 0, 2]
+    """
+    fields_end = pext_marker_stream.bit_length()
+    field_widths = []
+    field_start = -1
+    for field_end in delimiter_positions:
+        if field_end >= fields_end:
+            break
+        field_widths.append(field_end - field_start - 1)
+        field_start = field_end
+    field_widths.append(fields_end - field_start - 1)
+    while len(field_widths) < len(delimiter_positions):
         field_widths.append(0)
     return field_widths
 
-def find_nonzero_pack(idx_marker_stream_wrapper):
+def find_nonzero_pack(idx_marker_stream):
     """Find position of the first set bit in idx_marker stream.
 
-    Find the position, reset the lowest bit of idx_marker_stream_wrapper.value.,
-    and return the position.
+    Find the position and reset the lowest bit of idx_marker_stream.
+    Returns a tuple (position, updated idx_marker_stream).
     """
-    non_zero_pack_idx = pablo.count_forward_zeroes(idx_marker_stream_wrapper.value)
-    idx_marker_stream_wrapper.value = pablo.reset_lowest_bit(idx_marker_stream_wrapper.value)
-    return non_zero_pack_idx
+    non_zero_pack_idx = pablo.count_forward_zeroes(idx_marker_stream)
+    return non_zero_pack_idx, pablo.reset_lowest_bit(idx_marker_stream)
 
 def process_pack(field_widths_ms, field_widths, field_start, non_zero_pack_idx,
                  pack_size):
@@ -113,15 +161,14 @@ def process_pack(field_widths_ms, field_widths, field_start, non_zero_pack_idx,
     aligned_pack_mask = pack_mask << (non_zero_pack_idx * pack_size)
     aligned_pack = aligned_pack_mask & field_widths_ms # got the pack
     pack = aligned_pack >> (non_zero_pack_idx * pack_size)
-    pack_wrapper = pablo.BitStream(pack)
 
     # Process the pack
     abs_pack_start_posn = non_zero_pack_idx * pack_size
-    while pack_wrapper.value:
-        field_end = pablo.count_forward_zeroes(pack_wrapper.value) + abs_pack_start_posn
+    while pack:
+        field_end = pablo.count_forward_zeroes(pack) + abs_pack_start_posn
         field_widths.append(field_end - field_start - 1)
         field_start = field_end
-        pack_wrapper.value = pablo.reset_lowest_bit(pack_wrapper.value)
+        pack = pablo.reset_lowest_bit(pack)
     return field_start
 
 def create_field_width_ms(pext_marker_stream):
@@ -149,12 +196,7 @@ def create_field_width_ms(pext_marker_stream):
         pext_marker_stream (int): 1110111 -> (...111)00010001000 -> 10001000
     """
     # Get the end of the stream
-    temp = pext_marker_stream
-    end_of_fields_posn = 0
-    while pext_marker_stream:
-        end_of_fields_posn += 1
-        pext_marker_stream >>= 1
-    pext_marker_stream = temp
+    end_of_fields_posn = pext_marker_stream.bit_length()
 
     # Create the new marker stream
     field_widths_ms = ~pext_marker_stream
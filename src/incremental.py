@@ -0,0 +1,107 @@
+"""
+Contains the incremental transduction mode for append-only CSV files (e.g. logs).
+
+After each run a small checkpoint is stored next to the output file. It records how far
+into the input file we've transduced, how many rows have been emitted, the JSON layout and
+where the closing bracket (e.g. "\\n]" in the pretty layout) of the output JSON array is.
+The next run only transduces the complete rows that have been appended since, and patches
+the existing output file in place by replacing the closing bracket with the layout's row
+separator followed by the new JSON objects.
+"""
+import sys
+import os
+import json
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import csv_json_transducer
+from src.chunking import split_complete_rows, json_array_body
+from src.json_converter import PRETTY, get_layout
+
+def checkpoint_path_for(output_path):
+    """Return the default checkpoint path for output_path."""
+    return output_path + ".ckpt"
+
+def load_checkpoint(checkpoint_path):
+    """Load the checkpoint at checkpoint_path, or return None if there isn't one."""
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, 'r') as f:
+        return json.load(f)
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """Atomically replace the checkpoint at checkpoint_path."""
+    temp_path = checkpoint_path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, checkpoint_path)
+
+def transduce_incremental(pack_size, csv_column_names, path_to_file, output_path,
+                          checkpoint_path=None, layout=PRETTY):
+    """Transduce the rows appended to path_to_file since the last run.
+
+    If there is no checkpoint (or no output file), the input file has shrunk since the
+    last run (e.g. it was rotated) or the layout has changed, path_to_file is transduced
+    from the start and output_path is overwritten. A trailing partial row is left for the next run.
+
+    Args:
+        pack_size: See csv_json_transducer.main.
+        csv_column_names: See csv_json_transducer.main.
+        path_to_file (str): Path to the append-only CSV file.
+        output_path (str): Path to the JSON file to create or extend.
+        checkpoint_path (str): Where the checkpoint is stored. Defaults to
+            output_path + ".ckpt".
+        layout (JSONLayout or str): See csv_json_transducer.main.
+    Returns:
+        The number of rows emitted by this run.
+    """
+    if checkpoint_path is None:
+        checkpoint_path = checkpoint_path_for(output_path)
+    layout = get_layout(layout)
+    closing_bytes = layout.array_close.encode('utf-8')
+    checkpoint = load_checkpoint(checkpoint_path)
+    if (checkpoint is None or not os.path.exists(output_path)
+            or os.path.getsize(path_to_file) < checkpoint["byte_offset"]
+            or checkpoint.get("layout", list(PRETTY)) != list(layout)):
+        checkpoint = {"byte_offset": 0, "rows_emitted": 0, "closing_offset": 0}
+
+    with open(path_to_file, 'rb') as f:
+        f.seek(checkpoint["byte_offset"])
+        complete_rows, _ = split_complete_rows(f.read())
+    if not complete_rows and checkpoint["rows_emitted"]:
+        return 0
+
+    output_byte_stream = csv_json_transducer.transduce_csv_str(
+        pack_size, csv_column_names, complete_rows.decode('utf-8'), layout=layout)
+    num_new_rows = complete_rows.count(b"\n")
+
+    if checkpoint["rows_emitted"] == 0:
+        output_bytes = output_byte_stream.encode('utf-8')
+        with open(output_path, 'wb') as f:
+            f.write(output_bytes)
+        closing_offset = len(output_bytes) - len(closing_bytes)
+    else:
+        appended_bytes = (layout.row_separator +
+                          json_array_body(output_byte_stream, layout)).encode('utf-8')
+        closing_offset = checkpoint["closing_offset"]
+        with open(output_path, 'r+b') as f:
+            f.seek(closing_offset)
+            if f.read(len(closing_bytes)) != closing_bytes:
+                raise ValueError("Output file doesn't match its checkpoint: " + output_path)
+            f.seek(closing_offset)
+            f.write(appended_bytes + closing_bytes)
+            f.truncate()
+        closing_offset += len(appended_bytes)
+
+    save_checkpoint(checkpoint_path, {
+        "byte_offset": checkpoint["byte_offset"] + len(complete_rows),
+        "rows_emitted": checkpoint["rows_emitted"] + num_new_rows,
+        "closing_offset": closing_offset,
+        "layout": list(layout),
+    })
+    return num_new_rows
@@ -0,0 +1,331 @@
+"""
+Contains a small segment-at-a-time kernel pipeline framework, in the style of Parabix.
+
+transduce_csv_str makes a series of whole-file passes (s2p, delimiter detection, validation,
+field widths, PEXT, PDEP, p2s), each of which materializes its result for the whole file.
+Here each pass is a Kernel with declared input and output streams. A Pipeline pushes the file
+through the kernels one fixed-size segment at a time, so the intermediate streams are only
+ever a segment long. State that has to cross a segment boundary (e.g. the start of a field
+that continues into the next segment, or a row that isn't complete yet) is carried by the
+kernel that needs it.
+
+Streams are passed between kernels in a dict keyed by stream name. The pipeline's input
+stream is "bytes", the raw bytes of the current segment. Bit streams hold the bits of the
+current segment only, with bit 0 at the segment's first byte.
+
+Example:
+    pipeline = create_csv_json_pipeline(["col1", "col2"])
+    json_bytes = b"".join(pipeline.run(csv_bytes)["output"])
+"""
+import sys
+import os
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import pablo
+from src import pack_tuning
+from src.json_converter import JSONConverter, PRETTY, get_layout
+
+DEFAULT_SEGMENT_SIZE = 1 << 16
+
+# start: offset of the segment in the file. length: number of bytes in the segment.
+# final: True for the last segment of the file.
+Segment = namedtuple("Segment", ["start", "length", "final"])
+
+class Kernel(ABC):
+    """A stage of a Pipeline.
+
+    Subclasses declare the names of the streams they read (inputs) and write (outputs), and
+    implement process. Kernels that carry state between segments reset it in reset.
+    """
+    inputs = ()
+    outputs = ()
+
+    def reset(self):
+        """Clear any carried state before a new file is processed."""
+        pass
+
+    @abstractmethod
+    def process(self, segment, streams):
+        """Process one segment. Any concrete subclass of Kernel must implement this method.
+
+        Args:
+            segment (Segment): The segment being processed.
+            streams (dict): The segment's streams produced so far, keyed by name. Contains
+                at least the streams named in inputs.
+        Returns:
+            A dict holding a value for each of the streams named in outputs.
+        """
+        pass
+
+class Pipeline:
+    """Runs a chain of kernels over a file one segment at a time."""
+
+    def __init__(self, kernels, segment_size=DEFAULT_SEGMENT_SIZE):
+        """Check that every kernel's inputs are produced before it runs.
+
+        Raises:
+            ValueError: If a kernel reads a stream that isn't "bytes" or the output of an
+                earlier kernel, or segment_size isn't positive.
+        """
+        if segment_size <= 0:
+            raise ValueError("Segment size must be positive.")
+        available = {"bytes"}
+        for kernel in kernels:
+            missing = [name for name in kernel.inputs if name not in available]
+            if missing:
+                raise ValueError("Kernel " + type(kernel).__name__ +
+                                 " reads streams no earlier kernel produces:", missing)
+            available.update(kernel.outputs)
+        self.kernels = kernels
+        self.segment_size = segment_size
+        self.streams = available
+
+    def run(self, byte_stream, outputs=("output",)):
+        """Push byte_stream through the kernels.
+
+        Args:
+            byte_stream (bytes-like): The file.
+            outputs (tuple of str): The streams to collect.
+        Returns:
+            A dict holding, for each stream in outputs, the list of its per-segment values.
+        """
+        for name in outputs:
+            if name not in self.streams:
+                raise ValueError("No kernel produces stream:", name)
+        for kernel in self.kernels:
+            kernel.reset()
+        collected = {name: [] for name in outputs}
+        # An empty file is processed as a single, empty, final segment.
+        segment_starts = range(0, len(byte_stream), self.segment_size) or [0]
+        for start in segment_starts:
+            segment_bytes = bytes(byte_stream[start:start + self.segment_size])
+            segment = Segment(start, len(segment_bytes),
+                              start + self.segment_size >= len(byte_stream))
+            streams = {"bytes": segment_bytes}
+            for kernel in self.kernels:
+                streams.update(kernel.process(segment, streams))
+            for name in outputs:
+                collected[name].append(streams[name])
+        return collected
+
+class S2PKernel(Kernel):
+    """Transposes the segment's bytes into its eight basis bit streams."""
+    inputs = ("bytes",)
+    outputs = ("basis",)
+
+    def process(self, segment, streams):
+        return {"basis": pablo.StreamSet.transpose_in(streams["bytes"])}
+
+class UTF8ValidationKernel(Kernel):
+    """Raises ValueError at the first byte that isn't part of a valid UTF-8 sequence.
+
+    Validates the basis bit streams produced by S2PKernel, so the segment is only transposed
+    once. A sequence that is cut off by the end of a segment is carried (as basis bit
+    streams) into the next segment and validated there, so the reported offset is the same
+    as for the whole file.
+    """
+    inputs = ("basis",)
+
+    def reset(self):
+        self._carry = pablo.StreamSet()
+
+    def process(self, segment, streams):
+        basis = streams["basis"]
+        carry_length = self._carry.length
+        if carry_length:
+            basis = pablo.StreamSet(carry_length + basis.length,
+                                    [carried | (stream << carry_length)
+                                     for carried, stream in zip(self._carry, basis)])
+        cut = basis.length
+        if not segment.final:
+            tail_length = min(3, basis.length)
+            tail = pablo.StreamSet(tail_length, [stream >> (basis.length - tail_length)
+                                                 for stream in basis])
+            cut -= incomplete_sequence_length(tail.transpose_out(decode=False))
+        cut_mask = (1 << cut) - 1
+        invalid_offset = pablo.validate_utf8(
+            pablo.StreamSet(cut, [stream & cut_mask for stream in basis]))
+        if invalid_offset != -1:
+            raise ValueError("Input CSV file is not valid UTF-8. First invalid byte at offset:",
+                             segment.start - carry_length + invalid_offset)
+        self._carry = pablo.StreamSet(basis.length - cut, [stream >> cut for stream in basis])
+        return {}
+
+def incomplete_sequence_length(data):
+    """Return the number of bytes at the end of data that start a UTF-8 sequence that
+    continues past the end of data."""
+    for length in range(1, min(3, len(data)) + 1):
+        byte = data[-length]
+        if byte & 0xC0 == 0x80:  # continuation byte, keep looking for the lead byte
+            continue
+        if byte >= 0xF0:
+            needed = 4
+        elif byte >= 0xE0:
+            needed = 3
+        elif byte >= 0xC0:
+            needed = 2
+        else:
+            needed = 1
+        return length if needed > length else 0
+    return 0
+
+class DelimiterKernel(Kernel):
+    """Marks the delimiters of the segment and extracts the delimiter bytes, in order."""
+    inputs = ("basis",)
+    outputs = ("delimiters", "delimiter_bytes")
+
+    def __init__(self, field_end_delims=(",", "\n")):
+        self.field_end_delims = field_end_delims
+
+    def process(self, segment, streams):
+        delimiter_ms = 0
+        for delimiter in self.field_end_delims:
+            delimiter_ms |= streams["basis"].char_class(ord(delimiter))
+        return {"delimiters": delimiter_ms,
+                "delimiter_bytes": streams["basis"].pext_all(delimiter_ms)
+                                   .transpose_out(decode=False)}
+
+class FieldWidthKernel(Kernel):
+    """Computes the width of each field that ends in the segment.
+
+    Carries the position of the last delimiter, so fields that span segments get their full
+    width. In the final segment, a field that isn't followed by a delimiter is also output.
+    """
+    inputs = ("delimiters",)
+    outputs = ("field_widths",)
+
+    def reset(self):
+        self._field_start = -1  # absolute position of the last delimiter
+
+    def process(self, segment, streams):
+        field_widths = []
+        delimiters = pablo.MarkerStream.from_bits(streams["delimiters"], segment.length)
+        for posn in delimiters.positions:
+            field_end = segment.start + posn
+            field_widths.append(field_end - self._field_start - 1)
+            self._field_start = field_end
+        file_end = segment.start + segment.length
+        if segment.final and self._field_start != file_end - 1 and file_end:
+            field_widths.append(file_end - self._field_start - 1)
+        return {"field_widths": field_widths}
+
+class PextKernel(Kernel):
+    """Extracts the field bytes of the segment, i.e. everything but the delimiters."""
+    inputs = ("basis", "delimiters")
+    outputs = ("field_bytes",)
+
+    def process(self, segment, streams):
+        fields_pext_ms = ~streams["delimiters"] & ((1 << segment.length) - 1)
+        return {"field_bytes": streams["basis"].pext_all(fields_pext_ms)
+                               .transpose_out(decode=False)}
+
+class JSONKernel(Kernel):
+    """Checks the row structure and transduces the rows completed in the segment to JSON.
+
+    The boilerplate and PDEP mask of the completed rows are built from the row templates
+    of a JSONConverter, and the field bytes are deposited into the boilerplate. The widths
+    and bytes of a row that isn't complete yet are carried into the next segment.
+    """
+    inputs = ("field_widths", "field_bytes", "delimiter_bytes")
+    outputs = ("output",)
+
+    def __init__(self, csv_column_names, layout=PRETTY):
+        self.csv_column_names = csv_column_names
+        self.layout = get_layout(layout)
+
+    def reset(self):
+        self._row_widths = []             # widths of the fields of the incomplete row
+        self._row_bytes = bytearray()     # bytes of the incomplete row, including those of a
+                                          # field that continues into the next segment
+        self._rows_emitted = 0
+
+    def process(self, segment, streams):
+        num_columns = len(self.csv_column_names)
+        field_widths = streams["field_widths"]
+        field_bytes = streams["field_bytes"]
+        complete_widths = []
+        complete_end = 0  # end of the field bytes of the completed rows in pending_bytes
+        # The carried bytes include those of a field that continues into this segment,
+        # whose width is only known now.
+        pending_bytes = self._row_bytes + field_bytes
+        posn = sum(self._row_widths)
+        for delimiter, fw in zip(streams["delimiter_bytes"], field_widths):
+            self._row_widths.append(fw)
+            posn += fw
+            if len(self._row_widths) == num_columns and delimiter != ord("\n"):
+                raise ValueError("Input CSV file contains row missing a newline terminator.")
+            elif len(self._row_widths) == num_columns:
+                complete_widths.extend(self._row_widths)
+                complete_end = posn
+                self._row_widths = []
+        if segment.final:
+            if self._row_widths:
+                raise ValueError("Input CSV file contains malformed row.")
+            # A last field without a delimiter after it
+            complete_widths.extend(field_widths[len(streams["delimiter_bytes"]):])
+            complete_end = len(pending_bytes)
+        self._row_bytes = pending_bytes[complete_end:]
+
+        output = self.transduce_rows(complete_widths, bytes(pending_bytes[:complete_end]))
+        if segment.final:
+            closing = self.layout.array_close if self._rows_emitted else self.layout.empty_array
+            output += closing.encode('utf-8')
+        return {"output": output}
+
+    def transduce_rows(self, field_widths, field_bytes):
+        """Transduce complete rows to JSON objects, preceded by the array opening or the
+        row separator."""
+        if not field_widths:
+            return b""
+        converter = JSONConverter(field_widths, self.csv_column_names, self.layout)
+        templates = converter.get_row_templates()
+        separator = self.layout.row_separator if self._rows_emitted else self.layout.array_open
+        self._rows_emitted += len(templates)
+        boilerplate = separator + self.layout.row_separator.join(template.boilerplate
+                                                                 for template in templates)
+        separator_mask = "0" * len(separator.encode('utf-8'))
+        row_separator_mask = "0" * len(self.layout.row_separator.encode('utf-8'))
+        pdep_mask = separator_mask + row_separator_mask.join(template.pdep_mask
+                                                             for template in templates)
+
+        output_stream_set = pablo.StreamSet.transpose_in(boilerplate)
+        output_stream_set.pdep_all(int(pdep_mask[::-1], 2),
+                                   pablo.StreamSet.transpose_in(field_bytes))
+        return output_stream_set.transpose_out(decode=False)
+
+def create_csv_json_pipeline(csv_column_names, segment_size=DEFAULT_SEGMENT_SIZE,
+                             layout=PRETTY):
+    """Create the pipeline that transduces a CSV file to JSON. Collect its "output" stream."""
+    return Pipeline([S2PKernel(), UTF8ValidationKernel(), DelimiterKernel(), FieldWidthKernel(),
+                     PextKernel(), JSONKernel(csv_column_names, layout)], segment_size)
+
+def transduce_segmented(pack_size, csv_column_names, byte_stream,
+                        segment_size=DEFAULT_SEGMENT_SIZE, layout=PRETTY):
+    """Transduce a CSV file to JSON one segment at a time.
+
+    Gives the same result as csv_json_transducer.transduce_csv_str. Errors are raised when
+    the segment containing them is processed, so if a file contains several errors, the one
+    reported may differ.
+
+    Args:
+        pack_size: See csv_json_transducer.main. Only checked, the kernels don't use packs,
+            so pack_tuning.AUTO_PACK_SIZE has nothing to choose and is always accepted.
+        csv_column_names: See csv_json_transducer.main.
+        byte_stream (bytes-like): The UTF-8 encoded CSV file.
+        segment_size (int): Number of bytes processed at a time.
+        layout (JSONLayout or str): See csv_json_transducer.main.
+    Returns:
+        The JSON file (str).
+    """
+    if pack_size != pack_tuning.AUTO_PACK_SIZE:
+        JSONConverter([], csv_column_names).verify_pack_size(pack_size)
+    pipeline = create_csv_json_pipeline(csv_column_names, segment_size, layout)
+    return b"".join(pipeline.run(byte_stream)["output"]).decode('utf-8')
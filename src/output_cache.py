@@ -0,0 +1,228 @@
+"""
+Contains OutputCache, a content-addressed on-disk cache of transduced files.
+
+The same input file is often transduced again and again with the same columns and options
+(retries, several consumers of the same export). The output only depends on the input bytes
+and the converter configuration (target format, layout, selected columns, row filter), so
+it is cached under a hash of those. The pack size is left out of the key: it changes how
+the file is processed but not the output.
+
+Each entry is a file in the cache directory named after its key. Entries are written to a
+temporary file in the same directory and renamed into place, so a reader never sees a
+partially written entry, and concurrent jobs (threads or processes) that compute the same
+entry just replace it with identical bytes. A hit touches the entry's mtime, and when the
+entries exceed the size limit the least recently used ones are removed.
+
+Example:
+    cache = OutputCache("/var/cache/transducer", max_bytes=10 << 30)
+    result = cache.transduce_file(64, ["id", "name"], "people.csv", "people.json")
+"""
+import sys
+import os
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src.transducer_target_enums import TransductionTarget, SourceFormats
+from src.json_converter import PRETTY, get_layout
+from src import csv_json_transducer
+from src import compression
+from src import transcoder
+
+# Extension of the cache entries. Temporary files use a different one so they're never
+# mistaken for entries.
+ENTRY_EXTENSION = ".out"
+
+# The result of OutputCache.transduce_file. payload holds the output if it wasn't written to
+# an output path, and hit is True if the output came from the cache.
+CachedResult = namedtuple("CachedResult", ["output_length", "payload", "hit"])
+
+def cache_key(csv_file_as_bytes, csv_column_names, target_format=TransductionTarget.JSON,
+              selected_columns=None, row_filter=None, layout=PRETTY):
+    """Return the cache key (a hex str) of transducing csv_file_as_bytes with the given
+    configuration. See csv_json_transducer.main for the arguments."""
+    configuration = (tuple(csv_column_names), repr(target_format), get_layout(layout),
+                     None if selected_columns is None else tuple(selected_columns),
+                     row_filter)
+    digest = hashlib.sha256(csv_file_as_bytes)
+    digest.update(repr(configuration).encode('utf-8'))
+    return digest.hexdigest()
+
+class OutputCache:
+    """Content-addressed cache of transduced files in cache_dir, holding at most max_bytes.
+
+    Safe to share between the threads of a process, and between processes that use the
+    same cache_dir.
+    """
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        if max_bytes <= 0:
+            raise ValueError("Cache size limit must be positive:", max_bytes)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, key):
+        """Return the path of the entry for key."""
+        return os.path.join(self.cache_dir, key + ENTRY_EXTENSION)
+
+    def get(self, key):
+        """Return the path of the entry for key and mark it as recently used, or None if
+        there is no such entry."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, key, buffer):
+        """Atomically store buffer (bytes-like) as the entry for key, then evict least
+        recently used entries until the cache fits in max_bytes. Returns the entry's path.
+
+        An entry larger than max_bytes is evicted straight away.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            try:
+                csv_json_transducer.write_all(fd, buffer)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(temp_path, self.path_for(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        self.evict()
+        return self.path_for(key)
+
+    def entries(self):
+        """Return a list of (mtime, size, path) for each entry, least recently used first."""
+        entries = []
+        # Not used as a context manager, which needs Python 3.6. Exhausting the iterator
+        # closes it just the same.
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(ENTRY_EXTENSION):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # evicted by another job
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def size(self):
+        """Return the total size in bytes of the entries."""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass  # evicted by another job
+            total -= size
+
+    def clear(self):
+        """Remove every entry and reset the hit/miss counters."""
+        for _, _, path in self.entries():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def transduce_csv_to_buffer(self, pack_size, csv_column_names, csv_file_as_bytes,
+                                target_format=TransductionTarget.JSON, selected_columns=None,
+                                row_filter=None, stats=None, layout=PRETTY, key=None):
+        """Like csv_json_transducer.transduce_csv_to_buffer, but the output is taken from the
+        cache on a hit and added to it on a miss. The stats are only added on a miss.
+
+        Args:
+            key (str): The cache_key of the arguments, if it has already been computed.
+        Returns:
+            A tuple (output_buffer, hit). output_buffer is a bytes-like object.
+        """
+        if key is None:
+            key = cache_key(csv_file_as_bytes, csv_column_names, target_format,
+                            selected_columns, row_filter, layout)
+        entry_path = self.get(key)
+        if entry_path is not None:
+            try:
+                with open(entry_path, "rb") as f:
+                    return f.read(), True
+            except FileNotFoundError:
+                pass  # evicted by another job since the lookup
+        output_buffer = csv_json_transducer.transduce_csv_to_buffer(
+            pack_size, csv_column_names, csv_file_as_bytes, target_format,
+            selected_columns=selected_columns, row_filter=row_filter, stats=stats,
+            layout=layout)
+        self.put(key, output_buffer)
+        return output_buffer, False
+
+    def transduce_file(self, pack_size, csv_column_names, path_to_file, output_path=None,
+                       target_format=TransductionTarget.JSON,
+                       source_format=SourceFormats.CSV, selected_columns=None,
+                       row_filter=None, stats=None, layout=PRETTY, symlink=False):
+        """Transduce the file at path_to_file, or take its output from the cache.
+
+        Args:
+            output_path (str): If provided, the output is written here (compressed if its
+                extension names a codec) rather than returned.
+            symlink (boolean): Make output_path a symbolic link to the cache entry instead
+                of a copy of it. The link dangles once the entry is evicted, so only use
+                this if the output is consumed before the cache fills up. Ignored if the
+                output is compressed.
+            Others: See csv_json_transducer.transduce_file_to_path. The stats are only
+                added on a miss.
+        Returns:
+            A CachedResult.
+        """
+        csv_file_as_bytes = compression.read_file(path_to_file)
+        if source_format != SourceFormats.CSV:
+            csv_file_as_bytes = transcoder.transcode_to_utf8(csv_file_as_bytes, source_format)
+        key = cache_key(csv_file_as_bytes, csv_column_names, target_format, selected_columns,
+                        row_filter, layout)
+        output_buffer, hit = self.transduce_csv_to_buffer(
+            pack_size, csv_column_names, csv_file_as_bytes, target_format, selected_columns,
+            row_filter, stats, layout, key)
+        entry_path = self.path_for(key)
+        if output_path is None:
+            return CachedResult(len(output_buffer), bytes(output_buffer), hit)
+        if compression.codec_from_extension(output_path) is not compression.NONE:
+            with compression.open_output(output_path) as f:
+                f.write(output_buffer)
+        elif symlink and os.path.exists(entry_path):
+            link_path = output_path + ".tmp"
+            if os.path.lexists(link_path):
+                os.unlink(link_path)
+            os.symlink(os.path.abspath(entry_path), link_path)
+            os.replace(link_path, output_path)
+        else:
+            with open(output_path, "wb") as f:
+                f.write(output_buffer)
+        return CachedResult(len(output_buffer), b"", hit)
@@ -19,9 +19,13 @@
 #----------------------------------------------------------------------------
 # 
 import sys
+import re
 import codecs
+import bisect
 # Utility functions for demo purposes.
 
+# Used by ScanTo, AdvanceThenScanTo, atEOF, inFile and match. Code that may process more
+# than one stream at a time should use the methods of a StreamContext instead.
 EOF_mask = 0
 data = ''
 
@@ -31,7 +35,13 @@ def writefile(filename, s, charcode='utf-8',):
     f.close()
 
 def readfile(filename):
-    f = open(filename, 'r')
+    f = open(filename, 'r', encoding='utf-8')
+    contents = f.read()
+    f.close()
+    return contents
+
+def readfile_bytes(filename):
+    f = open(filename, 'rb')
     contents = f.read()
     f.close()
     return contents
@@ -60,15 +70,9 @@ def count_forward_zeroes(strm):
     Parabix uses LSB numbering, (see https://en.wikipedia.org/wiki/Bit_numbering)
     so for us the position 0 bit is the rightmost bit.
     Another way to think of this oepration is to count zeroes in the direction carry bits move.
+    strm & -strm isolates the lowest set bit, so we don't have to shift through the zeroes.
     """
-    zeroes = 0
-    while (strm & 0xFFFFFFFF) == 0:
-        zeroes += 32
-        strm >>= 32
-    while (strm & 1) == 0:
-        zeroes += 1
-        strm >>= 1
-    return zeroes
+    return (strm & -strm).bit_length() - 1
 #
 #
 #  Are there any bits in a stream
@@ -257,11 +261,7 @@ def reset_lowest_bit(bits):
     return bits & (bits -1)
 
 def get_popcount(bits):
-    count = 0
-    while bits:
-        bits = reset_lowest_bit(bits)
-        count += 1
-    return count
+    return bin(bits).count('1')
 
 # ---------------Functions below this line have been tested with Python 3.x only!!------------------
 
@@ -333,14 +333,7 @@ def inverse_transpose(bitset, len):
 
 def count_forward_ones(strm):
     """Count the number of consequtive 1s starting from the least sig bit position."""
-    ones = 0
-    while (strm & 0xFFFFFFFF) == 0xFFFFFFFF:
-        ones += 32
-        strm >>= 32
-    while (strm & 1) == 1:
-        ones += 1
-        strm >>= 1
-    return ones
+    return count_forward_zeroes(~strm)
 
 def set_lowest_bit(bits):
     return bits | (bits + 1)
@@ -355,8 +348,9 @@ def create_idx_ms(marker_stream, pack_size):
     See https://github.com/AdamBJ/Python-Prototyping/wiki/Bit-stream-growth-and-processing-order.
 
     Args:
-        marker_stream (int): The stream to scan through. It's a bit stream, so process it
-            from right to left (starting at pos 0, the least sig position).
+        marker_stream (int or MarkerStream): The stream to scan through. It's a bit stream,
+            so process it from right to left (starting at pos 0, the least sig position).
+            A sparse MarkerStream is indexed from its marker positions instead.
         pack_size (int): The final index stream is marker_stream length / pack_size
             bits long. Each bit of the index stream represents a pack_sized "pack"
             of input stream bits. If the index stream bit is set, that means the corresponding
@@ -364,6 +358,12 @@ def create_idx_ms(marker_stream, pack_size):
     Returns:
         idx_marker_stream (int): See pack_size comment.
     """
+    if isinstance(marker_stream, MarkerStream):
+        if marker_stream.is_sparse:
+            return MarkerStream.from_positions(
+                [posn // pack_size for posn in marker_stream.positions],
+                -(-marker_stream.length // pack_size)).bits
+        marker_stream = marker_stream.bits
     idx_marker_stream = 0
     pack_mask = (1 << pack_size) - 1
     shift_amnt = 0
@@ -421,6 +421,128 @@ def create_pext_ms(byte_stream, target_characters, get_inverse=False):
 
     return pext_marker_stream
 
+def create_char_class_ms(byte_stream, target_bytes):
+    """Create a marker stream with a bit set for each byte of byte_stream in target_bytes.
+
+    Byte-oriented counterpart of create_pext_ms. The whole stream is classified with a
+    single translation, so it's suitable for large (e.g. mmap'd) inputs.
+
+    Example:
+        byte_stream = b"abc,123\n", target_bytes = b"\n" -> 10000000
+    """
+    table = bytes(0x31 if byte in target_bytes else 0x30 for byte in range(256))
+    bits = bytes(byte_stream).translate(table)
+    return int(bits[::-1], 2) if bits else 0
+
+def validate_utf8(stream_set):
+    """Find the first byte of stream_set that isn't part of a valid UTF-8 sequence.
+
+    All positions are checked at once with bitwise operations on the basis bit streams:
+    lead and continuation bytes are classified, the positions where continuation bytes are
+    required are computed by advancing the lead byte streams, and the second byte of the
+    sequences that can be overlong, encode a surrogate or exceed U+10FFFF is range-checked.
+
+    Args:
+        stream_set (StreamSet): The basis bit streams of the byte stream to validate.
+    Returns:
+        The offset of the first invalid byte, or -1 if the byte stream is valid UTF-8.
+        If a multi-byte sequence is invalid (e.g. it's overlong or cut short), the offset
+        of its lead byte is returned, as in the UnicodeDecodeError raised by bytes.decode.
+    """
+    b0, b1, b2, b3, b4, b5, b6, b7 = stream_set.streams
+    all_ms = (1 << stream_set.length) - 1
+    prefix_11 = b7 & b6
+    cont = b7 & ~b6                                 # 10xxxxxx
+    lead2 = prefix_11 & ~b5                         # 110xxxxx
+    lead3 = prefix_11 & b5 & ~b4                    # 1110xxxx
+    lead4 = prefix_11 & b5 & b4 & ~b3               # 11110xxx
+    invalid_lead = (lead2 & ~(b4 | b3 | b2 | b1)) \
+        | (lead4 & b2 & (b1 | b0)) \
+        | (prefix_11 & b5 & b4 & b3)                # C0-C1, F5-F7, F8-FF
+
+    # Positions that must hold the 2nd, 3rd and 4th byte of a multi-byte sequence
+    scope2 = Advance(lead2 | lead3 | lead4)
+    scope3 = Advance(Advance(lead3 | lead4))
+    scope4 = Advance(Advance(Advance(lead4)))
+    expected_cont = scope2 | scope3 | scope4
+
+    # Lead bytes whose second byte has a restricted range
+    e0 = lead3 & ~(b3 | b2 | b1 | b0)
+    ed = lead3 & b3 & b2 & ~b1 & b0
+    f0 = lead4 & ~(b2 | b1 | b0)
+    f4 = lead4 & b2 & ~b1 & ~b0
+    bad_second_byte = (Advance(e0) & ~b5) \
+        | (Advance(ed) & b5) \
+        | (Advance(f0) & ~(b5 | b4)) \
+        | (Advance(f4) & (b5 | b4))                 # overlong, surrogate, > U+10FFFF
+
+    error = ((expected_cont ^ cont) | invalid_lead | bad_second_byte) & all_ms
+    if expected_cont & ~all_ms:
+        # The stream ends in the middle of a sequence, so its lead byte is invalid.
+        error |= 1 << ((lead2 | lead3 | lead4).bit_length() - 1)
+    if not error:
+        return -1
+    first_error = count_forward_zeroes(error)
+    if (expected_cont >> first_error) & 1:
+        # Report the lead byte of the sequence the error was found in.
+        first_error = ((lead2 | lead3 | lead4) & ((1 << first_error) - 1)).bit_length() - 1
+    return first_error
+
+def detect_delimiters(stream_set, field_end_delims=(",", "\n")):
+    """Create the delimiter marker stream and validate UTF-8 in a single pass over stream_set.
+
+    Args:
+        stream_set (StreamSet): The basis bit streams of the input file.
+        field_end_delims (tuple of str): Single-byte characters that demarcate the end of
+            fields.
+    Returns:
+        A tuple (delimiter_marker_stream, first_invalid_offset). See create_pext_ms and
+        validate_utf8.
+    """
+    delimiter_marker_stream = 0
+    for delimiter in field_end_delims:
+        delimiter_marker_stream |= stream_set.char_class(ord(delimiter))
+    return delimiter_marker_stream, validate_utf8(stream_set)
+
+def select_bit(strm, k):
+    """Return the position of the k-th (counting from 0) set bit of strm, or -1 if there
+    are k or fewer set bits.
+
+    Example:
+        strm = 10110, k = 1 -> 2
+    """
+    return select_bits(strm, [k])[0]
+
+def select_bits(strm, ranks):
+    """Return the position of the k-th (counting from 0) set bit of strm for each k in
+    ranks, in a single pass over strm. -1 for each k with k or fewer set bits.
+
+    Use this rather than calling select_bit once per k, which scans strm from the start
+    every time.
+
+    Args:
+        strm (int): The bit stream.
+        ranks (iterable of int): The ranks k, in ascending order.
+    Example:
+        strm = 10110, ranks = [0, 2, 3] -> [1, 4, -1]
+    """
+    bits = bin(strm)[:1:-1]  # LSB first, built once for all of ranks
+    positions = []
+    posn = -1
+    count = -1  # rank of the set bit at posn
+    exhausted = False
+    for k in ranks:
+        # Each search carries on from the previous one, so strm is only scanned once
+        while count < k and not exhausted:
+            next_posn = bits.find('1', posn + 1)
+            if next_posn == -1:
+                exhausted = True
+            else:
+                posn = next_posn
+                count += 1
+        positions.append(posn if count == k else -1)
+    return positions
+
 def apply_pext(bit_stream, pext_marker_stream):
     """Apply quick-and-dirty python version of PEXT to bit_stream.
 
@@ -437,22 +559,7 @@ def apply_pext(bit_stream, pext_marker_stream):
 
         extracted_bit_stream: 101000   0
     """
-    extracted_bit_stream = 0
-    shift_amnt = 0
-    while pext_marker_stream:
-        leading_zeroes = count_forward_zeroes(pext_marker_stream)
-        fw = get_width_next_field(pext_marker_stream)
-        field = (1 << fw) - 1
-        field <<= leading_zeroes
-        field &= bit_stream
-        field >>= leading_zeroes # field now contains extracted bit stream data
-
-        # Reset pext_marker_stream bits belonging to the field we just processed
-        pext_marker_stream = pext_marker_stream & ~((1 << (leading_zeroes + fw)) - 1)
-        # Insert the bits we extracted into extracted_bit_stream
-        extracted_bit_stream = (field << shift_amnt) | extracted_bit_stream
-        shift_amnt += fw
-    return extracted_bit_stream
+    return _pext_runs(bit_stream, get_runs(pext_marker_stream))
 
 def apply_pdep(bp_bit_streams, bp_stream_idx, pdep_marker_stream, source_bit_stream):
     """Apply quick-and-dirty Python version of pdep to bp_bit_streams[bp_stream_idx].
@@ -463,7 +570,8 @@ def apply_pdep(bp_bit_streams, bp_stream_idx, pdep_marker_stream, source_bit_str
         bp_bit_streams: Stream set that contains the stream the pdep operation will be applied to.
         bp_stream_idx: Index in bp_bit_streams of the stream we will apply the pdep operation to.
         pdep_marker_stream: Marker stream that tells us the positions within bp_bit_streams[bp_stream_idx]
-            that the extracted bits should be deposited.
+            that the extracted bits should be deposited. May be a MarkerStream; if it's
+            sparse the bits are deposited one marker position at a time.
         source_bit_stream: The stream we will be inserting into bp_bit_streams[bp_stream_idx] at the
             locations indicated by pdep_marker_stream. Consists of extracted field bits, e.g. for a CSV file
             source_bit_stream could be obtained by applying s2p on a version of the CSV file with the
@@ -477,19 +585,410 @@ def apply_pdep(bp_bit_streams, bp_stream_idx, pdep_marker_stream, source_bit_str
 
         bp_bit_stream[bp_stream_idx] = 000000001010000000001100000000
     """
-    while pdep_marker_stream:
-        leading_zeroes = count_forward_zeroes(pdep_marker_stream)
-        fw = get_width_next_field(pdep_marker_stream)
-        field = ((1 << fw) - 1)
-        bp_bit_streams[bp_stream_idx] &= ~(field << leading_zeroes) # zero out deposit field
-        field &= source_bit_stream
-        source_bit_stream >>= fw
-        bp_bit_streams[bp_stream_idx] |= (field << leading_zeroes)
-
-        # reset pdep_marker_stream bits belonging to the field we just processed
-        pdep_marker_stream = pdep_marker_stream & ~((1 << (leading_zeroes + fw)) - 1)
+    if isinstance(pdep_marker_stream, MarkerStream):
+        if pdep_marker_stream.is_sparse:
+            positions = pdep_marker_stream.positions
+            bits = bytearray(_to_bits(bp_bit_streams[bp_stream_idx],
+                                      max(bp_bit_streams[bp_stream_idx].bit_length(),
+                                          positions[-1] + 1 if positions else 0)), 'ascii')
+            source_bits = _to_bits(source_bit_stream, len(positions))
+            for posn, bit in zip(positions, source_bits):
+                bits[posn] = ord(bit)
+            bp_bit_streams[bp_stream_idx] = _from_bits(bits.decode('ascii'))
+            return
+        pdep_marker_stream = pdep_marker_stream.bits
+    bp_bit_streams[bp_stream_idx] = _pdep_runs(bp_bit_streams[bp_stream_idx],
+                                               get_runs(pdep_marker_stream),
+                                               pdep_marker_stream.bit_length(), source_bit_stream)
+
+def get_runs(marker_stream):
+    """Return the runs of consecutive 1 bits in marker_stream as (start position, width) pairs.
+
+    PEXT and PDEP process a marker stream one run (i.e. field) at a time. Finding the runs
+    once lets us apply the same marker stream to all eight basis streams without scanning
+    it again for each one. marker_stream may be a MarkerStream; if it's sparse the runs are
+    found from its marker positions, without scanning the whole stream.
+
+    Example:
+        marker_stream = 11100110 -> [(1, 2), (5, 3)]
+    """
+    if isinstance(marker_stream, MarkerStream):
+        if marker_stream.is_sparse:
+            runs = []
+            for posn in marker_stream.positions:
+                if runs and runs[-1][0] + runs[-1][1] == posn:
+                    runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+                else:
+                    runs.append((posn, 1))
+            return runs
+        marker_stream = marker_stream.bits
+    bits = bin(marker_stream)[:1:-1]  # LSB first
+    return [(match.start(), match.end() - match.start()) for match in re.finditer('1+', bits)]
+
+def _to_bits(strm, length):
+    """Return the low length bits of strm as a str of "0"/"1" characters, LSB first."""
+    return format(strm & ((1 << length) - 1), '0{}b'.format(length))[::-1] if length else ''
+
+def bits_to_bytes(strm, length):
+    """Return a byte for each of the low length bits of strm: 1 if the bit is set, else 0.
+
+    Example:
+        strm = 110, length = 4 -> b"\\x00\\x01\\x01\\x00"
+    """
+    return _to_bits(strm, length).encode('ascii').translate(_DIGIT_TABLE)
+
+def _from_bits(bits):
+    """Inverse of _to_bits."""
+    return int(bits[::-1], 2) if bits else 0
+
+def _pext_runs(bit_stream, runs):
+    if not runs:
+        return 0
+    start, width = runs[-1]
+    bits = _to_bits(bit_stream, start + width)
+    return _from_bits(''.join([bits[start:start + width] for start, width in runs]))
+
+def _pdep_runs(bit_stream, runs, marker_length, source_bit_stream):
+    if not runs:
+        return bit_stream
+    length = max(bit_stream.bit_length(), marker_length)
+    bits = _to_bits(bit_stream, length)
+    source_bits = _to_bits(source_bit_stream, sum(width for _, width in runs))
+    pieces = []
+    end = 0
+    used = 0
+    for start, width in runs:
+        pieces.append(bits[end:start])
+        pieces.append(source_bits[used:used + width])
+        used += width
+        end = start + width
+    pieces.append(bits[end:])
+    return _from_bits(''.join(pieces))
 
 class BitStream:
     """Workaround to allow pass-by-value for ints."""
     def __init__(self, value):
         self.value = value
+
+# _BIT_TABLES[i] translates each byte to b"1" if bit i of the byte is set, else b"0".
+_BIT_TABLES = [bytes(0x30 + ((byte >> i) & 1) for byte in range(256)) for i in range(8)]
+# Translates b"0"/b"1" to the bytes 0/1.
+_DIGIT_TABLE = bytes(byte - 0x30 if byte in b"01" else byte for byte in range(256))
+# MarkerStreams with fewer markers per bit than this hold marker positions, not bits.
+# At this density a list of positions takes about as many machine words as the bits do.
+SPARSE_DENSITY = 1 / 64
+
+# Number of bytes transpose_out_into reassembles at a time. A multiple of 8, so that blocks
+# start on a byte boundary of the streams.
+TRANSPOSE_BLOCK_SIZE = 1 << 16
+
+class StreamSet:
+    """The eight parallel basis bit streams of a byte stream.
+
+    streams[i] holds bit i of every byte, i.e. the bit streams produced by serial_to_parallel.
+    Indexing a StreamSet gives the same results as indexing the list of streams, so it can be
+    passed to functions that expect one (e.g. inverse_transpose).
+
+    The bulk operations apply a single marker stream to all eight streams. Those that
+    modify the set do so in place rather than creating a new set.
+    """
+    __slots__ = ('streams', 'length')
+
+    def __init__(self, length=0, streams=None):
+        """Create a stream set for a byte stream of length bytes."""
+        self.length = length
+        self.streams = [0] * 8 if streams is None else streams
+
+    def __getitem__(self, i):
+        return self.streams[i]
+
+    def __setitem__(self, i, value):
+        self.streams[i] = value
+
+    def __iter__(self):
+        return iter(self.streams)
+
+    @classmethod
+    def transpose_in(cls, byte_stream):
+        """Decompose byte_stream into its basis bit streams (serial to parallel).
+
+        Args:
+            byte_stream (str or bytes-like): A str is UTF-8 encoded first, as in
+                serial_to_parallel.
+        """
+        if isinstance(byte_stream, str):
+            byte_stream = byte_stream.encode('utf-8')
+        byte_stream = bytes(byte_stream)
+        streams = [int(byte_stream.translate(table)[::-1], 2) if byte_stream else 0
+                   for table in _BIT_TABLES]
+        return cls(len(byte_stream), streams)
+
+    def transpose_out(self, length=None, decode=True):
+        """Reassemble the basis bit streams into a byte stream (parallel to serial).
+
+        Args:
+            length (int): Number of bytes to reassemble. Defaults to self.length.
+            decode (boolean): Decode the bytes as UTF-8 like inverse_transpose does. If False,
+                the bytes are returned as-is.
+        """
+        if length is None:
+            length = self.length
+        # Spread each stream so that bit k lands in bit i of byte k, then OR them together.
+        combined = 0
+        for i, stream in enumerate(self.streams):
+            combined |= int.from_bytes(bits_to_bytes(stream, length), 'little') << i
+        byte_stream = combined.to_bytes(length, 'little')
+        return byte_stream.decode('utf-8') if decode else byte_stream
+
+    def transpose_out_into(self, buffer, offset=0):
+        """Reassemble the basis bit streams into buffer, starting at offset.
+
+        Args:
+            buffer: A writable buffer (e.g. bytearray, memoryview or mmap) with room for
+                self.length bytes at offset.
+        Returns:
+            The number of bytes written, i.e. self.length.
+        """
+        view = memoryview(buffer)
+        # The streams as little-endian bytes, so a block's bits can be sliced out cheaply
+        length_mask = (1 << self.length) - 1
+        stream_bytes = [(stream & length_mask).to_bytes(-(-self.length // 8), 'little')
+                        for stream in self.streams]
+        for block_start in range(0, self.length, TRANSPOSE_BLOCK_SIZE):
+            block_length = min(TRANSPOSE_BLOCK_SIZE, self.length - block_start)
+            first_byte = block_start // 8
+            last_byte = -(-(block_start + block_length) // 8)
+            combined = 0
+            for i, block in enumerate(stream_bytes):
+                block_stream = int.from_bytes(block[first_byte:last_byte], 'little')
+                combined |= int.from_bytes(bits_to_bytes(block_stream, block_length),
+                                           'little') << i
+            view[offset + block_start:offset + block_start + block_length] = \
+                combined.to_bytes(block_length, 'little')
+        return self.length
+
+    def pext_all(self, pext_marker_stream):
+        """Apply PEXT to each of the streams. Returns a new StreamSet with the extracted bits.
+
+        pext_marker_stream may be an int or a MarkerStream (see get_runs).
+        """
+        runs = get_runs(pext_marker_stream)
+        return StreamSet(sum(width for _, width in runs),
+                         [_pext_runs(stream, runs) for stream in self.streams])
+
+    def pdep_all(self, pdep_marker_stream, source):
+        """Deposit the bits of each stream in source into the matching stream of this set.
+
+        pdep_marker_stream may be an int or a MarkerStream (see get_runs).
+        """
+        runs = get_runs(pdep_marker_stream)
+        marker_length = runs[-1][0] + runs[-1][1] if runs else 0
+        for i in range(8):
+            self.streams[i] = _pdep_runs(self.streams[i], runs, marker_length, source[i])
+
+    def masked_and(self, mask):
+        """AND each of the streams with mask."""
+        for i in range(8):
+            self.streams[i] &= mask
+
+    def char_class(self, byte_value):
+        """Return the character class stream for byte_value.
+
+        A bit is set at each position whose byte equals byte_value. Computed by ANDing
+        together each basis stream (where byte_value has a 1 bit) or its complement
+        (where it has a 0 bit).
+        """
+        char_class_ms = (1 << self.length) - 1
+        for i, stream in enumerate(self.streams):
+            char_class_ms &= stream if (byte_value >> i) & 1 else ~stream
+        return char_class_ms
+
+class StreamContext:
+    """The EOF mask and source buffer of a single stream, for reentrant scanning.
+
+    ScanTo, ScanToFirst, AdvanceThenScanTo, atEOF, inFile and match read the module level
+    EOF_mask and data, so only one stream can be processed at a time in a process. The
+    methods of this class are the same primitives, reading the mask and buffer of the
+    context instead. Each transduction creates its own context, so several can run on
+    the threads of one process.
+    """
+    __slots__ = ('EOF_mask', 'data')
+
+    def __init__(self, data, length=None):
+        """Create a context for data (str or bytes-like) of length positions.
+
+        Args:
+            data: The source buffer that match compares against.
+            length (int): Number of positions in the stream. Defaults to len(data).
+        """
+        self.data = data
+        self.EOF_mask = (1 << (len(data) if length is None else length)) - 1
+
+    @classmethod
+    def from_stream_set(cls, stream_set, data=None):
+        """Create a context for the byte stream that stream_set was transposed from.
+
+        The source buffer is reassembled from stream_set if data isn't provided.
+        """
+        if data is None:
+            data = stream_set.transpose_out(decode=False)
+        return cls(data, stream_set.length)
+
+    def ScanTo(self, Cursors, ToStream):
+        ScanStream = ~ToStream & self.EOF_mask
+        return (Cursors + ScanStream) & ~ScanStream
+
+    def ScanToFirst(self, ScanStream):
+        return self.ScanTo(1, ScanStream)
+
+    def AdvanceThenScanTo(self, marker, scanclass):
+        charclass = ~scanclass & self.EOF_mask
+        return (marker + (charclass | marker)) & ~charclass
+
+    def atEOF(self, strm):
+        if strm > self.EOF_mask or strm < 0:
+            return self.EOF_mask + 1
+        else:
+            return 0
+
+    def inFile(self, lex_error):
+        return self.EOF_mask & lex_error
+
+    def match(self, s, marker):
+        pos = count_forward_zeroes(marker)
+        if self.data[pos:pos + len(s)] != s:
+            return 0
+        return marker
+
+class MarkerStream:
+    """A marker stream held as a dense bit stream or as a sorted list of marker positions.
+
+    Every operation on a dense (int) stream costs O(stream length), however few markers
+    it contains. Delimiter and newline streams of files with wide fields are very sparse,
+    so below SPARSE_DENSITY markers per bit we hold the positions instead, and operations
+    cost O(number of markers). from_bits picks the form; each operation returns its result
+    in the form that suits the result's density.
+
+    length is the number of positions in the stream, i.e. the file size in bytes. Markers
+    at or past length are dropped.
+    """
+    __slots__ = ('length', '_bits', '_positions')
+
+    def __init__(self, length, bits=None, positions=None):
+        """Create a stream from exactly one of bits (int) or positions (sorted list)."""
+        self.length = length
+        self._bits = bits
+        self._positions = positions
+
+    @classmethod
+    def from_bits(cls, bits, length=None):
+        """Create a stream from a dense bit stream, in the form that suits its density."""
+        if length is None:
+            length = bits.bit_length()
+        return cls(length, bits=bits & ((1 << length) - 1)).adapted()
+
+    @classmethod
+    def from_positions(cls, positions, length):
+        """Create a stream from marker positions, in the form that suits their density."""
+        return cls(length, positions=sorted(posn for posn in positions if posn < length)) \
+            .adapted()
+
+    @property
+    def is_sparse(self):
+        return self._bits is None
+
+    @property
+    def bits(self):
+        """The stream as a dense bit stream (int)."""
+        if self._bits is None:
+            bits = bytearray(b"0" * self.length)
+            for posn in self._positions:
+                bits[posn] = ord("1")
+            return int(bytes(bits[::-1]), 2) if bits else 0
+        return self._bits
+
+    @property
+    def positions(self):
+        """The marker positions, in ascending order."""
+        if self._positions is None:
+            return [match.start() for match in re.finditer('1', bin(self._bits)[:1:-1])]
+        return self._positions
+
+    def __int__(self):
+        return self.bits
+
+    def __eq__(self, other):
+        return isinstance(other, MarkerStream) and self.length == other.length and \
+            self.bits == other.bits
+
+    def __repr__(self):
+        return "MarkerStream({}, {})".format(
+            self.length, "positions=" + repr(self._positions) if self.is_sparse
+            else "bits=" + bin(self._bits))
+
+    def adapted(self):
+        """Return this stream in the form that suits its density."""
+        sparse = self.popcount() < self.length * SPARSE_DENSITY
+        if sparse == self.is_sparse:
+            return self
+        if sparse:
+            return MarkerStream(self.length, positions=self.positions)
+        return MarkerStream(self.length, bits=self.bits)
+
+    def popcount(self):
+        if self.is_sparse:
+            return len(self._positions)
+        return get_popcount(self._bits)
+
+    def __and__(self, other):
+        length = min(self.length, other.length)
+        if self.is_sparse or other.is_sparse:
+            # Keep the markers of the sparse stream that are also set in the other stream
+            sparse, other = (self, other) if self.is_sparse else (other, self)
+            if other.is_sparse:
+                keep = set(other.positions)
+                positions = [posn for posn in sparse.positions if posn in keep]
+            else:
+                bits = _to_bits(other.bits, sparse.length)
+                positions = [posn for posn in sparse.positions if bits[posn] == "1"]
+            return MarkerStream(length, positions=[posn for posn in positions if posn < length])
+        return MarkerStream(length, bits=self.bits & other.bits).adapted()
+
+    def __or__(self, other):
+        length = max(self.length, other.length)
+        if self.is_sparse and other.is_sparse:
+            positions = sorted(set(self.positions) | set(other.positions))
+            return MarkerStream(length, positions=positions).adapted()
+        return MarkerStream(length, bits=self.bits | other.bits).adapted()
+
+    def andnot(self, other):
+        """Return the markers of this stream that aren't set in other."""
+        if self.is_sparse:
+            if other.is_sparse:
+                drop = set(other.positions)
+                positions = [posn for posn in self.positions if posn not in drop]
+            else:
+                bits = _to_bits(other.bits, self.length)
+                positions = [posn for posn in self.positions if bits[posn] == "0"]
+            return MarkerStream(self.length, positions=positions)
+        return MarkerStream(self.length, bits=self.bits & ~other.bits).adapted()
+
+    def shift(self, amount):
+        """Move every marker amount positions forward (Advance by amount). Markers moved
+        past the end of the stream are dropped. A negative amount moves them back."""
+        if self.is_sparse:
+            return MarkerStream(self.length, positions=[
+                posn + amount for posn in self._positions if 0 <= posn + amount < self.length])
+        if amount >= 0:
+            bits = (self._bits << amount) & ((1 << self.length) - 1)
+        else:
+            bits = self._bits >> -amount
+        return MarkerStream(self.length, bits=bits).adapted()
+
+    def scan_forward(self, posn=0):
+        """Return the position of the first marker at or after posn, or -1 if there's none."""
+        if self.is_sparse:
+            i = bisect.bisect_left(self._positions, posn)
+            return self._positions[i] if i < len(self._positions) else -1
+        remaining = self._bits >> posn
+        return posn + count_forward_zeroes(remaining) if remaining else -1
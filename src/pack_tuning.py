@@ -0,0 +1,98 @@
+"""
+Contains the functions used to choose pack_size automatically.
+
+pack_size only affects the field width scan: create_idx_ms marks the packs of the field
+width marker stream that contain at least one marker, and process_pack scans each marked
+pack for field ends. Small packs mean a long index stream to scan. Large packs mean each
+marked pack takes longer to scan, and on sparse streams most of the pack is empty. So the
+best pack size depends on how dense the delimiters are.
+
+We estimate the scan work for each candidate pack size, in machine words touched:
+    num_bits / pack_size                          (one index bit tested per pack)
+    + nonempty_packs * max(1, pack_size / 64)     (each marked pack is scanned word by word)
+and pick the cheapest. nonempty_packs is estimated from evenly spaced sample windows of the
+marker stream, so choosing a pack size doesn't cost a full pass over a large stream.
+
+The index is a single level (idx_marker_stream marks packs, nothing marks groups of
+index bits), so the index depth is always 1.
+"""
+from collections import namedtuple
+
+# Pass as pack_size to choose the pack size automatically.
+AUTO_PACK_SIZE = "auto"
+# Powers of two, as required by Converter.verify_pack_size.
+CANDIDATE_PACK_SIZES = (8, 16, 32, 64, 128, 256, 512, 1024)
+WORD_SIZE = 64
+SAMPLE_BITS = 4096
+INDEX_DEPTH = 1
+
+# The chosen pack size, its estimated cost in words and the estimated fraction of packs that
+# contain markers.
+PackSizeChoice = namedtuple("PackSizeChoice", ["pack_size", "cost", "nonempty_fraction",
+                                               "index_depth"])
+
+def sample_windows(marker_stream, num_bits, num_samples=32, sample_bits=SAMPLE_BITS):
+    """Return evenly spaced windows of marker_stream.
+
+    Windows start at multiples of sample_bits, so a window holds whole packs of every
+    candidate size. If the stream is no longer than num_samples windows, every window is
+    returned.
+
+    Returns:
+        A tuple (windows, window_bits, scale). windows is a list of ints, each holding the
+        window_bits bits of one window. scale is the factor that converts counts over the
+        windows into counts over the whole stream.
+    """
+    num_windows = -(-num_bits // sample_bits)  # round up
+    if num_windows <= num_samples:
+        step = 1
+    else:
+        step = num_windows // num_samples
+    window_mask = (1 << sample_bits) - 1
+    windows = [(marker_stream >> (window * sample_bits)) & window_mask
+               for window in range(0, num_windows, step)][:num_samples]
+    scale = num_windows / len(windows) if windows else 0
+    return windows, sample_bits, scale
+
+def count_nonempty_packs(window, window_bits, pack_size):
+    """Count the packs of window that contain at least one set bit."""
+    pack_mask = (1 << pack_size) - 1
+    count = 0
+    for pack_start in range(0, window_bits, pack_size):
+        if window & (pack_mask << pack_start):
+            count += 1
+    return count
+
+def estimate_cost(num_bits, nonempty_packs, pack_size):
+    """Estimate the words touched by the field width scan. See the module docstring."""
+    num_packs = -(-num_bits // pack_size)
+    return num_packs + nonempty_packs * max(1, pack_size // WORD_SIZE)
+
+def choose_pack_size(marker_stream, num_bits, candidates=CANDIDATE_PACK_SIZES,
+                     num_samples=32):
+    """Choose the candidate pack size with the lowest estimated scan cost for marker_stream.
+
+    Args:
+        marker_stream (int): The field width (or delimiter) marker stream.
+        num_bits (int): Length of marker_stream, i.e. the file size in bytes.
+        candidates (tuple of int): The pack sizes to choose from, powers of two.
+        num_samples (int): Number of sample windows.
+    Returns:
+        A PackSizeChoice. Ties go to the smaller pack size.
+    """
+    windows, window_bits, scale = sample_windows(marker_stream, num_bits, num_samples,
+                                                 max(SAMPLE_BITS, max(candidates)))
+    best = None
+    for pack_size in candidates:
+        sampled_packs = len(windows) * (window_bits // pack_size)
+        nonempty = sum(count_nonempty_packs(window, window_bits, pack_size)
+                       for window in windows)
+        fraction = nonempty / sampled_packs if sampled_packs else 0.0
+        cost = estimate_cost(num_bits, round(nonempty * scale), pack_size)
+        if best is None or cost < best.cost:
+            best = PackSizeChoice(pack_size, cost, fraction, INDEX_DEPTH)
+    return best
+
+def describe_pack_size(pack_size, marker_stream, num_bits):
+    """Return the PackSizeChoice for a fixed pack_size, with its estimated cost."""
+    return choose_pack_size(marker_stream, num_bits, candidates=(pack_size,))
@@ -0,0 +1,135 @@
+"""
+Contains the functions used to profile the columns of a CSV file without transducing it.
+
+For each column we report the min, max and mean field width, the number of empty fields,
+and whether every field of the column is numeric or ASCII. The widths come from the field
+width list. The character checks are made for all fields at once on character class
+streams:
+    starts = first byte of each field
+    good   = field bytes in the character class (e.g. ASCII)
+    ScanThru(starts, good) stops at the first byte of each field that is not in the class,
+which is either the delimiter after the field (every byte is in the class) or a bad byte.
+So only the fields that fail a check have to be looked at individually.
+
+The total output size is computed from the widths alone, so it can be used to allocate the
+output buffer before transducing (see csv_json_transducer.transduce_csv_to_buffer).
+"""
+import sys
+import os
+from bisect import bisect_right
+from collections import namedtuple
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import pablo
+from src import pushdown
+from src import compression
+from src import csv_json_transducer
+from src.json_converter import JSONConverter, PRETTY, get_layout, byte_length
+
+# The bytes a numeric field may contain: digits, sign, decimal point and exponent.
+NUMERIC_BYTES = b"0123456789+-.eE"
+
+# Width statistics and character checks for a single column. total_width is the sum of the
+# widths of the column's fields. numeric is True if every field of the column is non-empty
+# and made of NUMERIC_BYTES, ascii is True if every field is ASCII.
+ColumnProfile = namedtuple("ColumnProfile", ["name", "min_width", "max_width", "mean_width",
+                                             "total_width", "empty_fields", "numeric",
+                                             "ascii"])
+
+# The profiles of all columns, in file order, and the totals for the file. output_bytes is
+# the size of the transduced (JSON) file in bytes, in the pretty layout.
+FileProfile = namedtuple("FileProfile", ["columns", "num_rows", "input_bytes",
+                                         "output_bytes"])
+
+def profile_csv_str(pack_size, csv_column_names, csv_file_as_str):
+    """Profile each column of a CSV file that has already been read into memory.
+
+    Args:
+        pack_size: See csv_json_transducer.main.
+        csv_column_names: See csv_json_transducer.main.
+        csv_file_as_str (str, bytes or StreamSet): See csv_json_transducer.transduce_csv_str.
+    Returns:
+        A FileProfile.
+    Raises:
+        ValueError: If the file isn't valid UTF-8 or contains malformed rows.
+    """
+    prepared = csv_json_transducer.prepare_transduction(pack_size, csv_column_names,
+                                                        csv_file_as_str)
+    stream_set = prepared.csv_stream_set
+    field_widths = prepared.field_widths
+    num_columns = len(csv_column_names)
+    num_rows = len(field_widths) // num_columns
+
+    file_mask = (1 << stream_set.length) - 1
+    delimiter_ms = ~prepared.fields_pext_ms & file_mask
+    starts_ms = ((delimiter_ms << 1) | 1) & file_mask
+    field_starts = pushdown.get_field_starts(field_widths)
+    numeric_ms = 0
+    for byte_value in NUMERIC_BYTES:
+        numeric_ms |= stream_set.char_class(byte_value)
+    ascii_ms = ~stream_set[7] & file_mask
+    non_numeric_columns = failing_columns(starts_ms, numeric_ms, prepared.fields_pext_ms,
+                                          field_starts, num_columns)
+    non_ascii_columns = failing_columns(starts_ms, ascii_ms, prepared.fields_pext_ms,
+                                        field_starts, num_columns)
+
+    columns = []
+    for i, name in enumerate(csv_column_names):
+        widths = field_widths[i::num_columns]
+        empty_fields = widths.count(0)
+        columns.append(ColumnProfile(
+            name, min(widths, default=0), max(widths, default=0),
+            sum(widths) / len(widths) if widths else 0.0, sum(widths), empty_fields,
+            i not in non_numeric_columns and not empty_fields, i not in non_ascii_columns))
+    profile = FileProfile(columns, num_rows, stream_set.length, 0)
+    return profile._replace(output_bytes=output_length(profile))
+
+def profile_file(pack_size, csv_column_names, path_to_file):
+    """Profile the columns of the (possibly compressed) CSV file at path_to_file."""
+    return profile_csv_str(pack_size, csv_column_names, compression.read_file(path_to_file))
+
+def failing_columns(starts_ms, good_ms, fields_ms, field_starts, num_columns):
+    """Return the set of columns with a field that contains a byte not marked in good_ms.
+
+    Args:
+        starts_ms (int): Marks the first byte of every field, or its delimiter if it's empty.
+        good_ms (int): Marks the field bytes that pass the check.
+        fields_ms (int): Marks every field byte, i.e. everything but the delimiters.
+        field_starts (list of int): Position of the first byte of each field.
+        num_columns (int): Number of columns (fields per row) in the file.
+    """
+    # Each cursor stops at its field's delimiter, or at the field's first bad byte
+    bad_ms = pablo.ScanThru(starts_ms, good_ms) & fields_ms & ~good_ms
+    columns = set()
+    for posn in pablo.MarkerStream.from_bits(bad_ms).positions:
+        columns.add((bisect_right(field_starts, posn) - 1) % num_columns)
+    return columns
+
+def output_length(profile, selected_columns=None, layout=PRETTY):
+    """Return the size in bytes of the JSON file for profile.
+
+    Args:
+        profile (FileProfile): The profile of the input file.
+        selected_columns (list of str): If provided, the size when only these columns are
+            transduced. Row filters can't be accounted for, so with one this is an upper
+            bound.
+        layout (JSONLayout or str): The layout of the JSON output.
+    """
+    layout = get_layout(layout)
+    columns = [column for column in profile.columns
+               if selected_columns is None or column.name in selected_columns]
+    if not profile.num_rows:
+        return byte_length(layout.empty_array)
+    # The boilerplate of a row with only empty fields: the bytes every row has.
+    empty_row = JSONConverter([0] * len(columns), [column.name for column in columns], layout)
+    row_bytes = empty_row.get_row_templates()[0].pdep_mask.count("0")
+    separator_bytes = byte_length(layout.row_separator) * (profile.num_rows - 1)
+    array_bytes = byte_length(layout.array_open) + byte_length(layout.array_close)
+    return array_bytes + profile.num_rows * row_bytes + separator_bytes + \
+        sum(column.total_width for column in columns)
@@ -0,0 +1,152 @@
+"""
+Functions that push column selection and row filtering down into the marker streams used by
+the transducer.
+
+Rather than extracting, transposing and depositing every field and discarding the unwanted
+ones afterwards, the unwanted fields are cleared from the PEXT marker stream and dropped
+from the field width list before transduction. PEXT then only extracts the fields we keep,
+and the boilerplate and PDEP streams are only built for those fields.
+
+Fields are numbered in file order. Field i belongs to column i % num_columns (its index
+within its row) and to row i // num_columns.
+"""
+import sys
+import os
+from collections import namedtuple
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import pablo
+
+# Selects the rows whose value in column equals literal, or starts with literal if
+# prefix is True.
+RowFilter = namedtuple("RowFilter", ["column", "literal", "prefix"])
+RowFilter.__new__.__defaults__ = (False,)
+
+def get_column_indices(csv_column_names, selected_columns):
+    """Return the indices of selected_columns within csv_column_names, in file order.
+
+    Raises:
+        ValueError: If no columns are selected or a selected column isn't one of
+            csv_column_names.
+    """
+    if not selected_columns:
+        raise ValueError("At least one column must be selected.")
+    for column_name in selected_columns:
+        if column_name not in csv_column_names:
+            raise ValueError("Selected column is not a column of the input file:", column_name)
+    return [i for i, column_name in enumerate(csv_column_names)
+            if column_name in selected_columns]
+
+def get_field_starts(field_widths):
+    """Return the position of the first byte of each field.
+
+    Each field is followed by a single delimiter byte.
+
+    Example:
+        field_widths = [3, 0, 5] -> [0, 4, 5]
+    """
+    field_starts = []
+    posn = 0
+    for fw in field_widths:
+        field_starts.append(posn)
+        posn += fw + 1
+    return field_starts
+
+def create_fields_ms(field_widths, keep_field):
+    """Create a marker stream with the bytes of each field for which keep_field(i) is true set.
+
+    Args:
+        field_widths (list of int): The widths of all fields in the file, in file order.
+        keep_field: Function that takes a field's index and returns True to keep it.
+    Returns:
+        The marker stream (int). Built as a single "0"/"1" string, so the cost is linear in
+        the file size.
+    """
+    pieces = []
+    for i, fw in enumerate(field_widths):
+        pieces.append(("1" if keep_field(i) else "0") * fw)
+    bits = "0".join(pieces)  # one delimiter after each field but the last
+    return int(bits[::-1], 2) if bits else 0
+
+def push_down(fields_pext_ms, field_widths, num_columns, column_indices=None,
+              selected_rows=None):
+    """Keep only the fields that belong to the selected columns and rows.
+
+    Args:
+        fields_pext_ms (int): PEXT marker stream that selects every field in the file.
+        field_widths (list of int): The widths of all fields in the file, in file order.
+        num_columns (int): Number of columns (fields per row) in the file.
+        column_indices (list of int): The columns to keep. All columns if None.
+        selected_rows (list of boolean): Whether to keep each row. All rows if None.
+    Returns:
+        A tuple (fields_pext_ms, field_widths) for the selected fields only.
+    """
+    keep_columns = set(range(num_columns) if column_indices is None else column_indices)
+    def keep_field(i):
+        return i % num_columns in keep_columns and \
+            (selected_rows is None or selected_rows[i // num_columns])
+
+    keep_ms = create_fields_ms(field_widths, keep_field)
+    kept_field_widths = [fw for i, fw in enumerate(field_widths) if keep_field(i)]
+    return fields_pext_ms & keep_ms, kept_field_widths
+
+def match_field_starts(stream_set, field_starts, literal, prefix=False):
+    """Find the fields that equal (or start with) literal.
+
+    The literal is compared against every field start at once: the character class stream
+    of its k-th byte is shifted back by k positions and ANDed with the field start markers.
+    For an exact match, the field must also end (i.e. a delimiter must follow) after the
+    literal.
+
+    Args:
+        stream_set (StreamSet): The basis bit streams of the input file.
+        field_starts (list of int): Positions of the first byte of the fields to compare.
+        literal (str): The value to compare the fields against.
+        prefix (boolean): Match fields that start with literal rather than equal it.
+    Returns:
+        A list with a boolean for each field in field_starts, True if the field matches.
+    """
+    starts_ms = create_marker_ms(field_starts)
+    match_ms = starts_ms
+    char_classes = {}
+    literal_bytes = literal.encode('utf-8')
+    for k, byte_value in enumerate(literal_bytes):
+        if byte_value not in char_classes:
+            char_classes[byte_value] = stream_set.char_class(byte_value)
+        match_ms &= char_classes[byte_value] >> k
+    if not prefix:
+        delimiter_ms = stream_set.char_class(ord(",")) | stream_set.char_class(ord("\n"))
+        match_ms &= delimiter_ms >> len(literal_bytes)
+
+    match_bits = bin(match_ms)[:1:-1]  # LSB first
+    return [posn < len(match_bits) and match_bits[posn] == "1" for posn in field_starts]
+
+def create_marker_ms(positions):
+    """Create a marker stream with a bit set at each of positions."""
+    if not positions:
+        return 0
+    bits = bytearray(b"0" * (max(positions) + 1))
+    for posn in positions:
+        bits[posn] = ord("1")
+    return int(bytes(bits[::-1]), 2)
+
+def select_rows(stream_set, field_widths, num_columns, column_index, row_filter):
+    """Evaluate row_filter against each row of the file.
+
+    Args:
+        stream_set (StreamSet): The basis bit streams of the input file.
+        field_widths (list of int): The widths of all fields in the file, in file order.
+        num_columns (int): Number of columns (fields per row) in the file.
+        column_index (int): Index of the column row_filter applies to.
+        row_filter (RowFilter): The filter to apply.
+    Returns:
+        A list with a boolean for each row, True if the row is selected.
+    """
+    column_starts = get_field_starts(field_widths)[column_index::num_columns]
+    return match_field_starts(stream_set, column_starts, row_filter.literal, row_filter.prefix)
@@ -0,0 +1,293 @@
+"""
+Contains the differential and performance regression harness.
+
+Random CSV files (non-ASCII values, empty fields, wide rows) are transduced with
+csv_json_transducer.main and compared against a reference transduction built with the
+standard library csv and json modules. The throughput of each transduction stage is then
+measured on a fixed corpus and compared against the baseline numbers stored in a JSON file:
+a stage fails the gate if its throughput drops more than the tolerance below its baseline.
+
+Absolute throughput depends on the machine and on whatever else it is running, so the
+reference transduction is timed on the same corpus in the same run, and each stage's
+throughput is divided by the reference's. The gate compares these relative throughputs,
+which carry over between machines and runs far better than MB/s do. The baseline file
+looks like
+    {"tolerance": 0.25, "relative_throughput": {"transpose": 0.8, "delimiters": 9.1, ...}}
+
+Can also be run from the command line, e.g.
+    python src/regression.py --baseline Resources/perf_baseline.json
+Exits with status 1 if any output differs from the reference or any stage regressed.
+"""
+import sys
+import os
+import io
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src.transducer_target_enums import TransductionTarget
+from src import pablo
+from src import field_width
+from src import csv_json_transducer
+
+DEFAULT_BASELINE_PATH = os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT, "Resources",
+                                                      "perf_baseline.json"))
+DEFAULT_TOLERANCE = 0.25
+STAGES = ["transpose", "delimiters", "field_widths", "transduce", "total"]
+# The stage the others are measured against. See the module docstring.
+REFERENCE_STAGE = "reference"
+
+# Characters random values are drawn from: ASCII, 2, 3 and 4 byte UTF-8 sequences.
+# No commas or newlines, the transducer doesn't support quoted fields.
+VALUE_ALPHABET = "abcxyzABC0123456789 _-.:;!?@#$%&*()[]{}<>/'" + \
+    "éüßñøÆΩЖж" + "€₹中文字한국어" + "\U0001f600\U00010348"
+
+def generate_csv(rng, num_rows, num_columns, max_width=12, empty_fraction=0.1):
+    """Generate a random CSV file.
+
+    Args:
+        rng (random.Random): The random number generator to use.
+        num_rows (int): Number of rows.
+        num_columns (int): Number of fields per row.
+        max_width (int): Maximum number of characters in a value.
+        empty_fraction (float): Probability that a field is empty.
+    Returns:
+        The CSV file (str). Every row, including the last, ends with a newline.
+    """
+    rows = []
+    for _ in range(num_rows):
+        fields = []
+        for _ in range(num_columns):
+            if rng.random() < empty_fraction:
+                fields.append("")
+            else:
+                width = rng.randint(1, max_width)
+                fields.append("".join(rng.choice(VALUE_ALPHABET) for _ in range(width)))
+        rows.append(",".join(fields) + "\n")
+    return "".join(rows)
+
+def generate_column_names(num_columns):
+    """Return num_columns column names, e.g. ["col0", "col1", ...]."""
+    return ["col" + str(i) for i in range(num_columns)]
+
+def reference_transduce(csv_file_as_str, csv_column_names):
+    """Transduce csv_file_as_str to JSON with the standard library csv and json modules.
+
+    Produces the same layout as JSONConverter: the values are copied as-is, the column names
+    are quoted.
+    """
+    keys = ["        " + json.dumps(name, ensure_ascii=False) + ": " for name in csv_column_names]
+    objects = []
+    for row in csv.reader(io.StringIO(csv_file_as_str, newline=""), quoting=csv.QUOTE_NONE):
+        if not row:  # a single empty field
+            row = [""]
+        if len(row) != len(csv_column_names):
+            raise ValueError("Input CSV file contains malformed row.")
+        objects.append("    {\n" + ",\n".join(key + value for key, value in zip(keys, row)) +
+                       "\n    }")
+    if not objects:
+        return "[\n]"
+    return "[\n" + ",\n".join(objects) + "\n]"
+
+def check_random_files(num_files, seed=0, pack_size=64, max_rows=40, max_columns=12):
+    """Compare csv_json_transducer.main against reference_transduce on random files.
+
+    Files alternate between narrow and wide rows, and some have a single column.
+
+    Returns:
+        A list with a description of each file whose output differed. Empty if all matched.
+    """
+    rng = random.Random(seed)
+    mismatches = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "random.csv")
+        for file_num in range(num_files):
+            num_columns = 1 if file_num % 5 == 0 else rng.randint(2, max_columns)
+            max_width = 200 if file_num % 2 else 12
+            num_rows = rng.randint(0, max_rows)
+            csv_file_as_str = generate_csv(rng, num_rows, num_columns, max_width)
+            column_names = generate_column_names(num_columns)
+            with open(path, 'wb') as f:
+                f.write(csv_file_as_str.encode('utf-8'))
+
+            expected = reference_transduce(csv_file_as_str, column_names)
+            actual = csv_json_transducer.main(pack_size, column_names, path, verbose=False)
+            if actual != expected:
+                mismatches.append("seed {}, file {}: {} rows x {} columns".format(
+                    seed, file_num, num_rows, num_columns))
+    return mismatches
+
+def time_stages(pack_size, csv_column_names, byte_stream):
+    """Transduce byte_stream to JSON one stage at a time, timing each stage.
+
+    The stages are the same as in csv_json_transducer.transduce_csv_str.
+
+    Returns:
+        A dict with the time taken by each stage in STAGES, in seconds.
+    """
+    timings = {}
+    total_start = time.perf_counter()
+    start = total_start
+    stream_set = pablo.StreamSet.transpose_in(byte_stream)
+    timings["transpose"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    delimiter_ms, invalid_offset = pablo.detect_delimiters(stream_set, [",", "\n"])
+    if invalid_offset != -1:
+        raise ValueError("Input CSV file is not valid UTF-8. First invalid byte at offset:",
+                         invalid_offset)
+    timings["delimiters"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fields_pext_ms = ~delimiter_ms & ((1 << stream_set.length) - 1)
+    field_widths = field_width.calculate_field_widths_from_ms(fields_pext_ms, delimiter_ms,
+                                                              pack_size)
+    timings["field_widths"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    converter = csv_json_transducer.create_converter(TransductionTarget.JSON, field_widths,
+                                                     csv_column_names)
+    converter.verify_user_inputs(pack_size, stream_set)
+    converter.transduce(None, fields_pext_ms, csv_stream_set=stream_set)
+    timings["transduce"] = time.perf_counter() - start
+    timings["total"] = time.perf_counter() - total_start
+    return timings
+
+def measure_throughput(pack_size=64, num_rows=2000, num_columns=8, seed=0, repeats=5):
+    """Measure the throughput of each stage, and of reference_transduce, on a fixed random
+    corpus.
+
+    Each stage is timed repeats times and the fastest run is kept, to reduce noise. The
+    reference is timed in between the stages, so both see the same machine load.
+
+    Returns:
+        A dict with the throughput of each stage in STAGES and of REFERENCE_STAGE, in MB/s
+        of CSV input.
+    """
+    csv_file_as_str = generate_csv(random.Random(seed), num_rows, num_columns)
+    byte_stream = csv_file_as_str.encode('utf-8')
+    column_names = generate_column_names(num_columns)
+    best = {}
+    for _ in range(repeats):
+        timings = time_stages(pack_size, column_names, byte_stream)
+        start = time.perf_counter()
+        reference_transduce(csv_file_as_str, column_names)
+        timings[REFERENCE_STAGE] = time.perf_counter() - start
+        for stage, seconds in timings.items():
+            best[stage] = min(seconds, best.get(stage, seconds))
+    megabytes = len(byte_stream) / 1e6
+    return {stage: megabytes / max(best[stage], 1e-9) for stage in STAGES + [REFERENCE_STAGE]}
+
+def relative_throughput(throughput):
+    """Return the throughput of each stage in STAGES divided by that of REFERENCE_STAGE.
+
+    Args:
+        throughput (dict): See measure_throughput. Stages missing from it are left out.
+    """
+    return {stage: throughput[stage] / throughput[REFERENCE_STAGE] for stage in STAGES
+            if stage in throughput}
+
+def load_baseline(baseline_path):
+    """Read the baseline file. Returns a dict, see the module docstring.
+
+    Raises:
+        ValueError: If the file holds no relative throughputs, e.g. because it was written
+            by an older version of the harness that stored MB/s.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if "relative_throughput" not in baseline:
+        raise ValueError("Baseline holds no relative throughputs, regenerate it with "
+                         "--update-baseline:", baseline_path)
+    return baseline
+
+def save_baseline(baseline_path, throughput, tolerance=DEFAULT_TOLERANCE):
+    """Write the relative throughput of each stage to the baseline file.
+
+    Args:
+        throughput (dict): See measure_throughput.
+    """
+    baseline = {"tolerance": tolerance,
+                "relative_throughput": {stage: round(value, 3) for stage, value
+                                        in relative_throughput(throughput).items()}}
+    with open(baseline_path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+def find_regressions(throughput, baseline, tolerance=None):
+    """Compare the relative throughput of each stage against baseline.
+
+    Args:
+        throughput (dict): See measure_throughput.
+        baseline (dict): See load_baseline.
+        tolerance (float): Fraction of the baseline relative throughput a stage may lose
+            before it counts as a regression. Defaults to the baseline file's tolerance.
+    Returns:
+        A list of (stage, measured, baseline) tuples of relative throughputs for the stages
+        that regressed. Stages without a baseline number are skipped.
+    """
+    if tolerance is None:
+        tolerance = baseline.get("tolerance", DEFAULT_TOLERANCE)
+    relative = relative_throughput(throughput)
+    regressions = []
+    for stage, baseline_relative in sorted(baseline["relative_throughput"].items()):
+        if stage in relative and relative[stage] < baseline_relative * (1 - tolerance):
+            regressions.append((stage, relative[stage], baseline_relative))
+    return regressions
+
+def format_report(mismatches, throughput, regressions):
+    """Return a human readable summary of a harness run."""
+    lines = ["Differential check: " + ("{} mismatches".format(len(mismatches))
+                                       if mismatches else "OK")]
+    lines.extend("  " + mismatch for mismatch in mismatches)
+    regressed = {stage for stage, _, _ in regressions}
+    relative = relative_throughput(throughput)
+    for stage in STAGES:
+        lines.append("  {:<13}{:>10.2f} MB/s{:>9.3f}x reference{}".format(
+            stage, throughput[stage], relative[stage],
+            "  REGRESSED" if stage in regressed else ""))
+    lines.append("  {:<13}{:>10.2f} MB/s".format(REFERENCE_STAGE, throughput[REFERENCE_STAGE]))
+    for stage, measured, baseline_relative in regressions:
+        lines.append("Regression: {} {:.3f}x reference, baseline {:.3f}x".format(
+            stage, measured, baseline_relative))
+    return "\n".join(lines)
+
+def parse_args(argv):
+    """Parse the command line arguments of the harness CLI."""
+    parser = argparse.ArgumentParser(description="Differential and performance regression "
+                                                 "harness for the CSV to JSON transducer.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH,
+                        help="JSON file holding the baseline relative throughput of each "
+                             "stage.")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="Allowed fractional slowdown. Defaults to the baseline's.")
+    parser.add_argument("--files", type=int, default=50,
+                        help="Number of random files to compare against the reference.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pack-size", type=int, default=64)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Write the measured throughput to the baseline file.")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    ARGS = parse_args(sys.argv[1:])
+    MISMATCHES = check_random_files(ARGS.files, ARGS.seed, ARGS.pack_size)
+    THROUGHPUT = measure_throughput(ARGS.pack_size)
+    if ARGS.update_baseline:
+        save_baseline(ARGS.baseline, THROUGHPUT,
+                      DEFAULT_TOLERANCE if ARGS.tolerance is None else ARGS.tolerance)
+        REGRESSIONS = []
+    else:
+        REGRESSIONS = find_regressions(THROUGHPUT, load_baseline(ARGS.baseline), ARGS.tolerance)
+    print(format_report(MISMATCHES, THROUGHPUT, REGRESSIONS))
+    sys.exit(1 if MISMATCHES or REGRESSIONS else 0)
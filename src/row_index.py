@@ -0,0 +1,150 @@
+"""
+Contains the row-offset index used to transduce a range of rows without reading the whole file.
+
+The index records the byte offset of the start of every Nth row of a CSV file, i.e. the
+offset just past every Nth newline. The newlines are located with the newline marker stream
+of each block of the file: blocks that don't contain the next checkpoint are skipped with a
+popcount, and the checkpoint newline within a block is found with select.
+
+The index is stored in a compact binary sidecar file (by default <csv file>.idx):
+a header holding a magic number, N, the number of rows and the size of the indexed file,
+followed by one little-endian 64-bit offset per checkpoint.
+
+To transduce rows [start_row, stop_row), we seek to the nearest checkpoint before each end
+of the range, find the remaining (fewer than N) newlines, and transduce only that slice of
+the mmap'd file.
+"""
+import sys
+import os
+import mmap
+import struct
+from array import array
+from collections import namedtuple
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src.transducer_target_enums import TransductionTarget
+from src import pablo
+from src import csv_json_transducer
+
+INDEX_MAGIC = b"RIDX"
+# magic, every_n, num_rows, file_size
+_HEADER = struct.Struct("<4sIQQ")
+
+# offsets[k] is the byte offset of the start of row k * every_n.
+RowIndex = namedtuple("RowIndex", ["every_n", "num_rows", "file_size", "offsets"])
+
+def index_path_for(path_to_file):
+    """Return the default sidecar index path for path_to_file."""
+    return path_to_file + ".idx"
+
+def build_row_index(path_to_file, every_n=1024, index_path=None, block_size=1 << 20):
+    """Index the start of every every_n-th row of path_to_file and write the sidecar file.
+
+    Args:
+        path_to_file (str): The CSV file to index.
+        every_n (int): Distance, in rows, between indexed rows.
+        index_path (str): Where to write the index. Defaults to index_path_for(path_to_file).
+        block_size (int): Number of bytes classified at a time.
+    Returns:
+        The RowIndex that was written.
+    """
+    offsets = array('Q', [0])
+    num_rows = 0  # newlines seen so far
+    # Row num_rows + rows_to_next starts just past the next newline we need to record
+    rows_to_next = every_n
+    with open(path_to_file, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if file_size else b""
+        try:
+            for block_start in range(0, file_size, block_size):
+                newline_ms = pablo.create_char_class_ms(
+                    mapped[block_start:block_start + block_size], b"\n")
+                num_newlines = pablo.get_popcount(newline_ms)
+                # Skip straight past blocks that don't contain the next checkpoint. The
+                # checkpoints of a block are all found in a single pass over it.
+                ranks = range(rows_to_next - 1, num_newlines, every_n)
+                offsets.extend(block_start + posn + 1
+                               for posn in pablo.select_bits(newline_ms, ranks))
+                rows_to_next = rows_to_next + len(ranks) * every_n - num_newlines
+                num_rows += num_newlines
+        finally:
+            if file_size:
+                mapped.close()
+
+    row_index = RowIndex(every_n, num_rows, file_size, offsets)
+    write_row_index(row_index, index_path or index_path_for(path_to_file))
+    return row_index
+
+def write_row_index(row_index, index_path):
+    """Write row_index to the sidecar file at index_path."""
+    with open(index_path, 'wb') as f:
+        f.write(_HEADER.pack(INDEX_MAGIC, row_index.every_n, row_index.num_rows,
+                             row_index.file_size))
+        offsets = array('Q', row_index.offsets)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        f.write(offsets.tobytes())
+
+def load_row_index(index_path):
+    """Read the sidecar file at index_path. Returns a RowIndex."""
+    with open(index_path, 'rb') as f:
+        magic, every_n, num_rows, file_size = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a row index file: " + index_path)
+        offsets = array('Q')
+        offsets.frombytes(f.read())
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    return RowIndex(every_n, num_rows, file_size, offsets)
+
+def find_row_offset(row_index, byte_stream, row):
+    """Return the byte offset of the start of row within byte_stream.
+
+    Starts from the nearest indexed row at or before row and skips the remaining rows.
+    Returns len(byte_stream) if the file has row or fewer rows.
+    """
+    checkpoint = min(row // row_index.every_n, len(row_index.offsets) - 1)
+    offset = row_index.offsets[checkpoint]
+    for _ in range(row - checkpoint * row_index.every_n):
+        offset = byte_stream.find(b"\n", offset) + 1
+        if offset == 0:
+            return len(byte_stream)
+    return offset
+
+def transduce_row_range(pack_size, csv_column_names, path_to_file, start_row, stop_row,
+                        index_path=None, target_format=TransductionTarget.JSON):
+    """Transduce rows [start_row, stop_row) of path_to_file.
+
+    Args:
+        pack_size: See csv_json_transducer.main.
+        csv_column_names: See csv_json_transducer.main.
+        path_to_file (str): The CSV file to transduce rows from.
+        start_row (int): First row to transduce, counting from 0.
+        stop_row (int): Row after the last row to transduce. Clamped to the number of rows.
+        index_path (str): The sidecar index built by build_row_index. Defaults to
+            index_path_for(path_to_file).
+        target_format: The format we want to transduce the rows to.
+    Returns:
+        The transduced rows, e.g. a JSON array containing one object per row.
+    """
+    row_index = load_row_index(index_path or index_path_for(path_to_file))
+    with open(path_to_file, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < row_index.file_size:
+            raise ValueError("Input file is smaller than when it was indexed: " + path_to_file)
+        if start_row >= stop_row or file_size == 0:
+            csv_slice = b""
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                start = find_row_offset(row_index, mapped, start_row)
+                stop = find_row_offset(row_index, mapped, stop_row)
+                csv_slice = mapped[start:stop]
+
+    return csv_json_transducer.transduce_csv_str(pack_size, csv_column_names,
+                                                 csv_slice.decode('utf-8'), target_format)
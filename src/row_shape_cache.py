@@ -0,0 +1,55 @@
+"""
+Contains RowShapeCache, a bounded LRU cache of per-row output templates.
+
+Many input files are nearly fixed-width, so the same tuple of per-row field widths (the
+"row shape") repeats thousands of times. Converters use this cache to build the boilerplate
+bytes and PDEP mask of each distinct row shape once. Building the boilerplate byte stream and
+PDEP marker stream for a file then becomes a lookup plus a concatenation per row.
+"""
+from collections import OrderedDict, namedtuple
+import threading
+
+# boilerplate (str): The row's boilerplate, with a "_" placeholder for each field byte.
+# pdep_mask (str): The row's relative PDEP mask. One "0"/"1" character per UTF-8 byte of
+#     boilerplate, in reading order. "1" marks a byte that a field value is deposited into.
+RowTemplate = namedtuple("RowTemplate", ["boilerplate", "pdep_mask"])
+
+class RowShapeCache:
+    """Bounded least-recently-used mapping from a row shape key to a RowTemplate.
+
+    Safe to share between threads. Keys must identify everything the template depends on,
+    e.g. the column names as well as the per-row field widths.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build_template):
+        """Return the template for key, calling build_template() to create it on a miss."""
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        template = build_template()
+        with self._lock:
+            self._templates[key] = template
+            if len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)  # evict least recently used
+        return template
+
+    def clear(self):
+        """Remove all templates and reset the hit/miss counters."""
+        with self._lock:
+            self._templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._templates)
@@ -0,0 +1,121 @@
+"""
+Contains the functions used to search a file for several literal patterns at once.
+
+pablo.match compares a pattern against the data at a single marker position. Here each
+pattern is matched against every position of the file at once, bitap style, on the
+character class streams of the basis bit streams:
+    M_0 = CC(p_0)
+    M_j = Advance(M_{j-1}) & CC(p_j)
+M_{k-1} marks the last byte of every occurrence of the k byte pattern p. The character class
+streams are computed once per distinct byte and shared by all patterns.
+
+Matches are reported as byte offsets (of the first byte of each match) or as row numbers,
+counting from 0 for the first line of the file.
+"""
+import sys
+import os
+from bisect import bisect_left
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src import pablo
+from src import compression
+
+def encode_pattern(pattern):
+    """Return pattern (str or bytes) as UTF-8 bytes.
+
+    Raises:
+        ValueError: If pattern is empty.
+    """
+    pattern_bytes = pattern.encode('utf-8') if isinstance(pattern, str) else bytes(pattern)
+    if not pattern_bytes:
+        raise ValueError("Search patterns must not be empty.")
+    return pattern_bytes
+
+def match_ends(stream_set, patterns, whole_field=False, field_end_delims=(",", "\n")):
+    """Compute the match end marker stream of each pattern.
+
+    Args:
+        stream_set (StreamSet): The basis bit streams of the file.
+        patterns (iterable of str or bytes): The literal patterns to search for.
+        whole_field (boolean): Only match patterns that make up a whole field, i.e. that
+            start a field and are followed by a delimiter or the end of the file.
+        field_end_delims: The delimiters that end a field. Only used if whole_field.
+    Returns:
+        A dict that maps each pattern to its match end marker stream (int), which has a bit
+        set at the last byte of each match.
+    """
+    file_mask = (1 << stream_set.length) - 1
+    char_classes = {}
+    def char_class(byte_value):
+        if byte_value not in char_classes:
+            char_classes[byte_value] = stream_set.char_class(byte_value)
+        return char_classes[byte_value]
+
+    if whole_field:
+        delimiter_ms = 0
+        for delimiter in field_end_delims:
+            delimiter_ms |= char_class(ord(delimiter))
+        field_starts_ms = ((delimiter_ms << 1) | 1) & file_mask
+        # A match that ends at position e must be followed by a delimiter or EOF at e + 1
+        field_ends_ms = (delimiter_ms | (1 << stream_set.length)) >> 1
+
+    ends = {}
+    for pattern in patterns:
+        pattern_bytes = encode_pattern(pattern)
+        match_ms = char_class(pattern_bytes[0])
+        if whole_field:
+            match_ms &= field_starts_ms
+        for byte_value in pattern_bytes[1:]:
+            match_ms = (match_ms << 1) & char_class(byte_value)
+        if whole_field:
+            match_ms &= field_ends_ms
+        ends[pattern] = match_ms & file_mask
+    return ends
+
+def match_offsets(stream_set, patterns, whole_field=False):
+    """Return a dict that maps each pattern to the sorted byte offsets of its matches.
+
+    Offsets are those of the first byte of each match. Overlapping matches are all reported.
+    See match_ends for the arguments.
+    """
+    offsets = {}
+    for pattern, match_ms in match_ends(stream_set, patterns, whole_field).items():
+        length = len(encode_pattern(pattern))
+        offsets[pattern] = [end - length + 1
+                            for end in pablo.MarkerStream.from_bits(match_ms).positions]
+    return offsets
+
+def match_rows(stream_set, patterns, whole_field=False):
+    """Return a dict that maps each pattern to the sorted numbers of the rows it occurs in.
+
+    A match that spans rows is reported in the row it starts in. See match_ends for the
+    arguments.
+    """
+    newline_positions = pablo.MarkerStream.from_bits(stream_set.char_class(ord("\n")),
+                                                     stream_set.length).positions
+    rows = {}
+    for pattern, offsets in match_offsets(stream_set, patterns, whole_field).items():
+        # The row of an offset is the number of newlines before it
+        row_numbers = [bisect_left(newline_positions, offset) for offset in offsets]
+        rows[pattern] = sorted(set(row_numbers))
+    return rows
+
+def search_file(path_to_file, patterns, rows=True, whole_field=False):
+    """Search the (possibly compressed) file at path_to_file for each of patterns.
+
+    Args:
+        rows (boolean): Report row numbers rather than byte offsets.
+        Others: See match_ends.
+    Returns:
+        See match_rows or match_offsets.
+    """
+    stream_set = pablo.StreamSet.transpose_in(compression.read_file(path_to_file))
+    if rows:
+        return match_rows(stream_set, patterns, whole_field)
+    return match_offsets(stream_set, patterns, whole_field)
@@ -0,0 +1,391 @@
+"""
+Contains the template compiler used to build a Converter from a declarative format spec.
+
+A FormatSpec describes an output format by its boilerplate: the document prefix and
+suffix, the row prefix, suffix and separator, and the prefix, suffix and separator of each
+field, where the field prefix may contain the column name. The output of a file is
+    document_prefix + rows separated by row_separator + document_suffix
+(or empty_document if it has no rows), a row is
+    row_prefix + fields separated by field_separator + row_suffix
+and a field is
+    field_prefix (with "{name}" replaced by the column name) + value + field_suffix.
+
+compile_format precomputes, once per spec and column set, the boilerplate that sits
+between consecutive values of a row and its length in UTF-8 bytes. The boilerplate and
+relative PDEP mask of any row shape then follow from the field widths alone, and so do the
+per-field preceeding and following boilerplate byte counts. TemplateConverter is the
+Converter that uses them, so a new target format only needs a spec.
+
+Example:
+    spec = FormatSpec("<rows>\\n", "</rows>", "<rows/>", "  <row", "/>", "\\n",
+                      " {name}=\\"", "\\"", "")
+    converter = compile_converter(spec, ["id", "name"])
+"""
+import sys
+import os
+from functools import lru_cache
+from collections import namedtuple
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src.converter import Converter
+from src.row_shape_cache import RowShapeCache, RowTemplate
+from src import pablo
+
+# Row templates shared by every TemplateConverter, keyed by (spec, column names, row field
+# widths).
+ROW_SHAPE_CACHE = RowShapeCache()
+
+# Replaced by the column name in field_prefix.
+NAME_PLACEHOLDER = "{name}"
+
+# The boilerplate of an output format. See the module docstring.
+FormatSpec = namedtuple("FormatSpec", ["document_prefix", "document_suffix", "empty_document",
+                                       "row_prefix", "row_suffix", "row_separator",
+                                       "field_prefix", "field_suffix", "field_separator"])
+
+# The precomputed boilerplate of a spec for one column set.
+# gaps[i] (str): The boilerplate between value i - 1 (or the start of the row) and value i.
+# tail (str): The boilerplate between the last value and the end of the row.
+# gap_lens, tail_len: Their lengths in UTF-8 bytes.
+# field_prefix_lens, field_suffix_lens: The lengths of each field's prefix and suffix.
+# document_prefix_len, document_suffix_len, empty_document_len, row_separator_len,
+# row_prefix_len, row_suffix_len, field_separator_len: The lengths of the spec's pieces.
+CompiledFormat = namedtuple("CompiledFormat", [
+    "spec", "gaps", "tail", "gap_lens", "tail_len", "field_prefix_lens", "field_suffix_lens",
+    "document_prefix_len", "document_suffix_len", "empty_document_len", "row_separator_len",
+    "row_prefix_len", "row_suffix_len", "field_separator_len"])
+
+def byte_length(boilerplate):
+    """Return the length of boilerplate (str) in UTF-8 bytes."""
+    return len(boilerplate.encode('utf-8'))
+
+@lru_cache(maxsize=128)
+def compile_format(spec, column_names):
+    """Precompute the boilerplate of spec for a column set.
+
+    Converters created for the same spec and column set (e.g. when transducing a batch of
+    files that share a header) get the same cached result back, so the names are only
+    substituted and UTF-8 encoded once.
+
+    Args:
+        spec (FormatSpec): The output format.
+        column_names (tuple of str): The column names, in order.
+    Returns:
+        A CompiledFormat.
+    Raises:
+        ValueError: If there are no columns.
+    """
+    if not column_names:
+        raise ValueError("At least one column name is required.")
+    field_prefixes = [spec.field_prefix.replace(NAME_PLACEHOLDER, name) for name in column_names]
+    gaps = [spec.row_prefix + field_prefixes[0]]
+    for prefix in field_prefixes[1:]:
+        gaps.append(spec.field_suffix + spec.field_separator + prefix)
+    tail = spec.field_suffix + spec.row_suffix
+    return CompiledFormat(
+        spec, tuple(gaps), tail, tuple(byte_length(gap) for gap in gaps), byte_length(tail),
+        tuple(byte_length(prefix) for prefix in field_prefixes),
+        (byte_length(spec.field_suffix),) * len(column_names),
+        byte_length(spec.document_prefix), byte_length(spec.document_suffix),
+        byte_length(spec.empty_document), byte_length(spec.row_separator),
+        byte_length(spec.row_prefix), byte_length(spec.row_suffix),
+        byte_length(spec.field_separator))
+
+def compile_converter(spec, column_names, field_widths=None):
+    """Compile spec for column_names and return a TemplateConverter ready to transduce.
+
+    Args:
+        spec (FormatSpec): The output format.
+        column_names (list of str): The column names, in order.
+        field_widths (list of int): The field widths of the file to transduce. Can also be
+            set later, through the converter's field_widths property.
+    """
+    return TemplateConverter([] if field_widths is None else field_widths, column_names, spec)
+
+class TemplateConverter(Converter):
+    """Converts a set of extracted fields to the format described by a FormatSpec."""
+
+    def __init__(self, field_widths, column_names, spec):
+        self._column_names = column_names
+        self._num_fields_per_unit = len(column_names)
+        self._field_widths = field_widths
+        self._spec = spec
+        self._compiled = compile_format(spec, tuple(column_names))
+
+    # Boilerplate for abstract attribute implementation. Read-only.
+    @property
+    def num_fields_per_unit(self):
+        return self._num_fields_per_unit
+
+    @property
+    def field_widths(self):
+        return self._field_widths
+
+    @field_widths.setter
+    def field_widths(self, field_widths):
+        """Allows a converter to be reused for another file with the same column names."""
+        self._field_widths = field_widths
+
+    @property
+    def spec(self):
+        return self._spec
+
+    def verify_user_inputs(self, pack_size, byte_stream):
+        """Ensure that the user has provided a valid pack size
+        and that the input file they've provided contains valid
+        data."""
+        self.verify_pack_size(pack_size)
+        self.verify_byte_stream(byte_stream)
+
+    def verify_byte_stream(self, byte_stream):
+        """Check that each row of the input file is well formed.
+
+        byte_stream may also be the StreamSet of the input file.
+        """
+        if isinstance(byte_stream, pablo.StreamSet):
+            csv_stream_set = byte_stream
+        else:
+            csv_stream_set = pablo.StreamSet.transpose_in(byte_stream)
+        field_end_ms = csv_stream_set.char_class(ord(",")) | csv_stream_set.char_class(ord("\n"))
+        extracted_delim_stream = csv_stream_set.pext_all(field_end_ms).transpose_out()
+
+        count = 0
+        for delimiter in extracted_delim_stream:
+            if count == (self._num_fields_per_unit - 1) and delimiter != "\n":
+                raise ValueError("Input CSV file contains row missing a newline terminator.")
+            elif count == (self._num_fields_per_unit - 1): # found the newline
+                count = 0
+            else:
+                count += 1
+
+        # Check for incomplete rows
+        if count != 0:
+            raise ValueError("Input CSV file contains malformed row.")
+
+    def create_bpb_stream(self):
+        """Create boilerplate byte stream.
+
+        The boilerplate byte stream is a stream of boilerplate characters with
+        space added for values extracted from the input file (e.g. CSV values).
+        The input file values will be inserted into the stream later, at the empty
+        positions, by PDEP operations.
+
+        The boilerplate for each row only depends on the row's field widths, so we look it
+        up in ROW_SHAPE_CACHE by row shape and concatenate the rows. See get_row_template.
+        """
+        return self._create_bpb_stream(self.get_row_templates())
+
+    def _create_bpb_stream(self, templates):
+        rows = [template.boilerplate for template in templates]
+        if not rows:
+            return self._spec.empty_document
+        return self._spec.document_prefix + self._spec.row_separator.join(rows) + \
+            self._spec.document_suffix
+
+    def create_pdep_stream(self):
+        """Generate a bit mask stream for use with the PDEP operation.
+
+        Overrides the field-at-a-time Converter.create_pdep_stream. The relative PDEP
+        mask of each row is looked up in ROW_SHAPE_CACHE and the masks are concatenated,
+        separated by the boilerplate between rows.
+
+        Returns (int):
+            The pdep bit stream.
+
+        Examples:
+            See test_pdep_stream_gen.py
+        """
+        return self._create_pdep_stream(self.get_row_templates())
+
+    def _create_pdep_stream(self, templates):
+        row_masks = [template.pdep_mask for template in templates]
+        if not row_masks:
+            return 0
+        # document_prefix + rows joined by row_separator + document_suffix, in reading
+        # order. Reverse so that the start of the file ends up in the least significant bit
+        # position.
+        compiled = self._compiled
+        pdep_mask = "0" * compiled.document_prefix_len + \
+            ("0" * compiled.row_separator_len).join(row_masks) + \
+            "0" * compiled.document_suffix_len
+        return int(pdep_mask[::-1], 2)
+
+    def output_length(self, templates=None):
+        """Return the length in bytes of the transduced file.
+
+        Computed from the row templates (the PDEP mask of a row has a bit for each byte of
+        the row), so no output has to be built to size the output buffer.
+        """
+        if templates is None:
+            templates = self.get_row_templates()
+        compiled = self._compiled
+        if not templates:
+            return compiled.empty_document_len
+        return compiled.document_prefix_len + \
+            sum(len(template.pdep_mask) for template in templates) + \
+            compiled.row_separator_len * (len(templates) - 1) + compiled.document_suffix_len
+
+    def get_row_templates(self):
+        """Return the RowTemplate for each row of self.field_widths, in file order."""
+        # self.num_fields_per_unit == number CSV values per row in CSV file
+        if len(self.field_widths) % self.num_fields_per_unit != 0:
+            raise ValueError("Provided source fields cannot be cleanly packaged into rows.")
+
+        column_names = tuple(self._column_names)
+        templates = []
+        for row_start in range(0, len(self.field_widths), self.num_fields_per_unit):
+            row_widths = tuple(self.field_widths[row_start:row_start + self.num_fields_per_unit])
+            templates.append(ROW_SHAPE_CACHE.get((self._spec, column_names, row_widths),
+                                                 lambda: self.get_row_template(row_widths)))
+        return templates
+
+    def get_row_template(self, row_widths):
+        """Build the boilerplate and relative PDEP mask for a single row.
+
+        The boilerplate between the values is precomputed by compile_format, so only the
+        values' placeholders have to be filled in.
+
+        Example (JSON, pretty layout):
+            row_widths = (3,), field names = ["col1"]
+            boilerplate: "    {\\n        \\"col1\\": ___\\n    }"
+            pdep_mask:   "000000000000000000000011100000000" (reading order)
+        """
+        compiled = self._compiled
+        boilerplate = []
+        pdep_mask = []
+        for gap, gap_len, fw in zip(compiled.gaps, compiled.gap_lens, row_widths):
+            boilerplate.append(gap)
+            boilerplate.append("_" * fw)  # space for value
+            pdep_mask.append("0" * gap_len)
+            pdep_mask.append("1" * fw)
+        boilerplate.append(compiled.tail)
+        pdep_mask.append("0" * compiled.tail_len)
+        return RowTemplate("".join(boilerplate), "".join(pdep_mask))
+
+    def transduce_field(self, field_wrapper, field_type, starts_file, ends_file):
+        """Pad extracted field with the boilerplate of the format.
+
+        The amount of boilerplate padding we need to add depends on how many
+        boilerplate bytes were used to create the boilerplate byte stream in create_bpb_stream.
+
+        Args:
+            field_wrapper (BitStream): The field to transduce.
+            field_type: A scalar describing the type of the field to be transduced (i.e.
+                it's ordinality within the data unit it will belong to in the output).
+            starts_file (boolean): True if this is the first field in the file. Tells us
+                when to add the starting boilerplate syntax.
+            ends_file (boolean): True if this is the last field in the file. Tells us when
+                to add the ending boilerplate syntax.
+        Returns:
+            Number of boilerplate padding bytes added. Also, field_wrapper is "passed by
+            reference", so the changes we make to field_wrapper.value persist after
+            this function returns.
+        Example:
+            See test_csv_json_transducer.py
+
+        """
+        preceeding_boilerplate_bytes, following_boilerplate_bytes = \
+            self.get_preceeding_following_bpb(field_type, starts_file, ends_file)
+        field_wrapper.value = field_wrapper.value << preceeding_boilerplate_bytes
+        return preceeding_boilerplate_bytes + following_boilerplate_bytes
+
+    def get_preceeding_following_bpb(self, field_type, starts_file, ends_file):
+        """Get number boilerplate bytes following and preceeding the current field.
+
+        The counts are derived from the spec. For single-column rows every field is both
+        the first and the last field of its row, but only the first one starts the file
+        and only the last one ends it.
+        """
+        compiled = self._compiled
+        # Lengths are in UTF-8 bytes to handle Unicode characters in column names.
+        preceeding_boilerplate_bytes = compiled.field_prefix_lens[field_type]
+        following_boilerplate_bytes = compiled.field_suffix_lens[field_type]
+        if field_type == 0:
+            if starts_file:
+                preceeding_boilerplate_bytes += compiled.document_prefix_len
+            preceeding_boilerplate_bytes += compiled.row_prefix_len
+        if field_type == self._num_fields_per_unit - 1:
+            following_boilerplate_bytes += compiled.row_suffix_len
+            if ends_file:
+                following_boilerplate_bytes += compiled.document_suffix_len
+            else:
+                following_boilerplate_bytes += compiled.row_separator_len
+        else:
+            following_boilerplate_bytes += compiled.field_separator_len
+
+        return (preceeding_boilerplate_bytes, following_boilerplate_bytes)
+
+    def transduce(self, file_as_str, fields_pext_ms, return_extracted_bs=False,
+                  csv_stream_set=None):
+        """Transduce file_as_str to the output format.
+
+        Args:
+            file_as_str (str): The input file. Remember that in Python 3.x a str is a *Unicode*
+                str. It stores a sequence of Unicode codepoints.  Encode to a particular format
+                if you want to get a byte stream in a particular encoding.
+            fields_pext_ms: A marker stream that shows where in file_as_str the fields we want to
+                extract lie. A set bit in field_pext_ms corresponds to a byte we want to extract.
+            return_extracted_bs: A flag that can be enabled for debugging purposes if the user wants
+                to see what fields were extracted from the file.
+            csv_stream_set (StreamSet): The basis bit streams of file_as_str, if the caller
+                has already created them.
+
+        Returns:
+            output_byte_stream (str): The output file.
+        """
+        if csv_stream_set is None:
+            csv_stream_set = pablo.StreamSet.transpose_in(file_as_str)
+        bp_stream_set, extracted_stream_set = self.transduce_stream_set(
+            csv_stream_set, fields_pext_ms, self.get_row_templates())
+
+        # Combine the transduced parallel bit streams into the final output byte stream
+        output_byte_stream = bp_stream_set.transpose_out() # Unicode str in Python 3.x
+        if return_extracted_bs:
+            return output_byte_stream, extracted_stream_set
+        else:
+            return output_byte_stream
+
+    def transduce_into(self, buffer, fields_pext_ms, csv_stream_set, offset=0, templates=None):
+        """Transduce the file, writing the UTF-8 output directly into buffer.
+
+        Unlike transduce, the output is never decoded to a str, so it can be written out
+        without encoding it again.
+
+        Args:
+            buffer: A writable buffer with room for output_length() bytes at offset, e.g. a
+                bytearray(converter.output_length()).
+            fields_pext_ms: See transduce.
+            csv_stream_set (StreamSet): The basis bit streams of the input file.
+            offset (int): Where in buffer to write the output.
+            templates (list of RowTemplate): The row templates, if the caller has already
+                built them (e.g. to size buffer with output_length).
+        Returns:
+            The number of bytes written.
+        """
+        if templates is None:
+            templates = self.get_row_templates()
+        bp_stream_set, _ = self.transduce_stream_set(csv_stream_set, fields_pext_ms,
+                                                     templates)
+        return bp_stream_set.transpose_out_into(buffer, offset)
+
+    def transduce_stream_set(self, csv_stream_set, fields_pext_ms, templates):
+        """Return the basis bit streams of the output file and of the extracted fields."""
+        bp_byte_stream = self._create_bpb_stream(templates)
+        # Decompose the output byte stream template into parallel bit streams. Its length
+        # is its length in bytes, not characters, since the column names may be non-ASCII.
+        bp_stream_set = pablo.StreamSet.transpose_in(bp_byte_stream)
+        # Sparse (e.g. narrow values under long column names) if there's far more
+        # boilerplate than values, in which case it's deposited from its positions
+        pdep_marker_stream = pablo.MarkerStream.from_bits(self._create_pdep_stream(templates),
+                                                          bp_stream_set.length)
+
+        # Transduce. Extract bits from CSV bit streams and deposit in bp bit streams.
+        extracted_stream_set = csv_stream_set.pext_all(fields_pext_ms)
+        bp_stream_set.pdep_all(pdep_marker_stream, extracted_stream_set)
+        return bp_stream_set, extracted_stream_set
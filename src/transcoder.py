@@ -0,0 +1,185 @@
+"""
+Transcodes UTF-16LE and Latin-1 input to UTF-8 basis bit streams.
+
+The transcoder works on bit streams throughout, so its output can be fed straight into
+delimiter detection and field extraction without decoding the input to str and encoding
+it again.
+
+Each input code unit produces 1 to 3 UTF-8 bytes (a UTF-16 surrogate pair produces 4, 2
+per surrogate). We call the bytes produced by a code unit its slots, numbered from the
+last byte backwards: slot 0 is the last byte produced by the unit, slot 1 the one before
+it, and so on. For each slot we:
+    1. compute the 8 bit streams of the slot's byte for every code unit, with bitwise
+       operations on the code unit bit streams,
+    2. PEXT them with the class stream of the units that produce the slot, and
+    3. PDEP the result into the slot's positions in the output streams.
+The output length of each unit (and hence the slot positions) is computed from the code
+unit class streams.
+"""
+import sys
+import os
+
+# workaround to get the import statements below working properly.
+# see https://stackoverflow.com/questions/16981921/relative-imports-in-python-3
+PACKAGE_PARENT = '..'
+SCRIPT_DIR = os.path.dirname(os.path.realpath(os.path.join(os.getcwd(),
+                                                           os.path.expanduser(__file__))))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, PACKAGE_PARENT)))
+
+from src.transducer_target_enums import SourceFormats
+from src import pablo
+
+UTF16LE_BOM = b"\xff\xfe"
+
+def transcode_to_utf8(byte_stream, source_format):
+    """Transcode byte_stream from the encoding of source_format to UTF-8.
+
+    Args:
+        byte_stream (bytes): The input file.
+        source_format (SourceFormats): The format (and so the encoding) of byte_stream.
+    Returns:
+        A StreamSet holding the basis bit streams of the UTF-8 encoded input.
+    Raises:
+        ValueError: If byte_stream isn't valid in the source encoding.
+    """
+    if source_format == SourceFormats.CSV:
+        return pablo.StreamSet.transpose_in(byte_stream)
+    elif source_format == SourceFormats.CSV_LATIN1:
+        return transcode_latin1(byte_stream)
+    elif source_format == SourceFormats.CSV_UTF16LE:
+        return transcode_utf16le(byte_stream)
+    else:
+        raise ValueError("Unsupported source format specified:", source_format)
+
+def transcode_latin1(byte_stream):
+    """Transcode Latin-1 byte_stream to UTF-8.
+
+    Bytes below 0x80 are copied. Bytes from 0x80 up become the two byte sequence
+    110000xx 10xxxxxx.
+    """
+    units = pablo.StreamSet.transpose_in(byte_stream)
+    u = units.streams
+    all_units = (1 << units.length) - 1
+    high = u[7]
+    # slot 0: the last byte of every unit
+    last_byte = u[:6] + [u[6] & ~high, high]
+    # slot 1: the lead byte 110000xx of units from 0x80 up
+    lead_byte = [u[6], all_units, 0, 0, 0, 0, all_units, all_units]
+    return expand_units(units.length, [(all_units, last_byte), (high, lead_byte)])
+
+def transcode_utf16le(byte_stream):
+    """Transcode UTF-16LE byte_stream to UTF-8. A leading byte order mark is dropped.
+
+    Raises:
+        ValueError: If byte_stream has an odd length or contains an unpaired surrogate.
+    """
+    if byte_stream.startswith(UTF16LE_BOM):
+        byte_stream = byte_stream[len(UTF16LE_BOM):]
+    if len(byte_stream) % 2:
+        raise ValueError("UTF-16 input has an odd number of bytes.")
+
+    # Gather the low and high byte of each code unit into 16 code unit bit streams
+    byte_streams = pablo.StreamSet.transpose_in(byte_stream)
+    num_units = byte_streams.length // 2
+    low_bytes_ms = int("01" * num_units, 2) if num_units else 0
+    u = byte_streams.pext_all(low_bytes_ms).streams + \
+        byte_streams.pext_all(low_bytes_ms << 1).streams
+    all_units = (1 << num_units) - 1
+
+    # Code unit classes
+    ascii_units = all_units & ~(u[7] | u[8] | u[9] | u[10] | u[11] | u[12] | u[13] | u[14] | u[15])
+    surrogates = u[15] & u[14] & ~u[13] & u[12] & u[11]                  # D800-DFFF
+    high_surrogates = surrogates & ~u[10]
+    low_surrogates = surrogates & u[10]
+    two_byte = all_units & ~ascii_units & ~(u[11] | u[12] | u[13] | u[14] | u[15])
+    three_byte = all_units & ~ascii_units & ~two_byte & ~surrogates
+    unpaired = (high_surrogates & ~(low_surrogates >> 1)) | \
+        (low_surrogates & ~pablo.Advance(high_surrogates))
+    if unpaired:
+        raise ValueError("UTF-16 input contains an unpaired surrogate at offset:",
+                         2 * pablo.count_forward_zeroes(unpaired))
+
+    # A surrogate pair encodes U+10000 + (wwwwwwwwww xxxxxxxxxx) where the w bits are the
+    # low 10 bits of the high surrogate and the x bits the low 10 bits of the low surrogate.
+    # The top five bits of the code point are www w + 1; increment bit-parallel.
+    z0 = ~u[6]
+    z1 = u[7] ^ u[6]
+    carry = u[7] & u[6]
+    z2 = u[8] ^ carry
+    carry &= u[8]
+    z3 = u[9] ^ carry
+    z4 = u[9] & carry
+    # Bits 0 and 1 of the high surrogate, moved to the position of the low surrogate
+    w0 = pablo.Advance(u[0] & high_surrogates)
+    w1 = pablo.Advance(u[1] & high_surrogates)
+
+    not_high = all_units & ~high_surrogates
+    # slot 0: 0xxxxxxx (ascii), 10xxxxxx (others), 10zzwwww (high surrogate)
+    last_byte = [(u[0] & not_high) | (u[2] & high_surrogates),
+                 (u[1] & not_high) | (u[3] & high_surrogates),
+                 (u[2] & not_high) | (u[4] & high_surrogates),
+                 (u[3] & not_high) | (u[5] & high_surrogates),
+                 (u[4] & not_high) | (z0 & high_surrogates),
+                 (u[5] & not_high) | (z1 & high_surrogates),
+                 u[6] & ascii_units,
+                 all_units & ~ascii_units]
+    # slot 1: 110xxxxx (two byte), 10xxxxxx (three byte), 11110zzz (high surrogate),
+    # 10wwxxxx (low surrogate)
+    not_high_two_or_more = two_byte | three_byte | low_surrogates
+    second_last_byte = [(u[6] & not_high_two_or_more) | (z2 & high_surrogates),
+                        (u[7] & not_high_two_or_more) | (z3 & high_surrogates),
+                        (u[8] & not_high_two_or_more) | (z4 & high_surrogates),
+                        u[9] & not_high_two_or_more,
+                        (u[10] & (two_byte | three_byte)) | high_surrogates |
+                        (w0 & low_surrogates),
+                        (u[11] & three_byte) | high_surrogates | (w1 & low_surrogates),
+                        two_byte | high_surrogates,
+                        all_units & ~ascii_units]
+    # slot 2: 1110xxxx (three byte)
+    third_last_byte = [u[12] & three_byte, u[13] & three_byte, u[14] & three_byte,
+                       u[15] & three_byte, 0, three_byte, three_byte, three_byte]
+
+    return expand_units(num_units, [(all_units, last_byte),
+                                    (all_units & ~ascii_units, second_last_byte),
+                                    (three_byte, third_last_byte)])
+
+def expand_units(num_units, slots):
+    """Deposit the bytes produced by each code unit into UTF-8 output bit streams.
+
+    Args:
+        num_units (int): Number of code units in the input.
+        slots (list): For each slot (last byte first), a tuple (units_ms, byte_streams).
+            units_ms marks the units that produce the slot and byte_streams holds the 8
+            bit streams of the slot's byte for every code unit. Each unit must produce
+            every slot before its last one, i.e. units_ms of a slot is a subset of units_ms
+            of the slot before it.
+    Returns:
+        A StreamSet holding the basis bit streams of the UTF-8 output.
+    """
+    # Output length of each unit, one byte per unit
+    unit_lengths = 0
+    for units_ms, _ in slots:
+        unit_lengths += int.from_bytes(pablo.bits_to_bytes(units_ms, num_units), 'little')
+    unit_lengths = unit_lengths.to_bytes(num_units, 'little')
+
+    output = pablo.StreamSet(sum(unit_lengths))
+    for slot, (units_ms, byte_streams) in enumerate(slots):
+        slot_units = pablo.StreamSet(num_units, byte_streams).pext_all(units_ms)
+        output.pdep_all(create_slot_ms(unit_lengths, slot), slot_units)
+    return output
+
+def create_slot_ms(unit_lengths, slot):
+    """Create a marker stream of the output positions of slot for each unit.
+
+    Args:
+        unit_lengths (bytes): The output length of each code unit (1 to 4), in input order.
+        slot (int): The slot, counting back from the last byte produced by each unit.
+    Example:
+        unit_lengths = b"\\x01\\x02\\x03", slot = 1 -> 010010
+    """
+    # Write out the slots of each unit as "0"s, with a "1" for slot, in reading order
+    bits = unit_lengths
+    for length in range(1, 5):
+        pattern = "".join("1" if length - 1 - i == slot else "0" for i in range(length))
+        bits = bits.replace(bytes([length]), pattern.encode('ascii'))
+    return int(bits[::-1], 2) if bits else 0
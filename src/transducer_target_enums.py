@@ -15,7 +15,8 @@ is available at runtime, we can dynamically determine how much padding an
 extracted field requires.
 
 SourceFormats:
-Contains entry for each source format we support.
+Contains entry for each source format we support. CSV files are UTF-8 encoded. Files in
+the other encodings are transcoded to UTF-8 bit streams before they're transduced.
 """
 
 from enum import Enum
@@ -27,3 +28,5 @@ class TransductionTarget(Enum):
 class SourceFormats(Enum):
     """Enumerates the source formats we support."""
     CSV = 1
+    CSV_UTF16LE = 2
+    CSV_LATIN1 = 3